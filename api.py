@@ -0,0 +1,396 @@
+from datetime import datetime, timedelta
+import functools
+import gzip
+import hashlib
+import json
+import numpy as np
+from flask import Blueprint, Response, request
+from models.OpeningHoursIndex import parse_minutes
+
+
+API_VERSION = 1
+# Smaller bodies are sent as is, compressing them saves less than the headers cost
+MIN_GZIP_SIZE = 1024
+MAX_RADIUS_KM = 200
+MAX_CHEAPEST = 100
+
+
+class ApiError(Exception):
+    """
+    Error of a request, answered with its HTTP status and a JSON message.
+
+    Attributes:
+    - status (int): The HTTP status of the response.
+    - message (str): The description of the error.
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def to_list(values: np.ndarray) -> list:
+    """
+    Convert prices to a JSON friendly list, rounded to the tenth of a cent with None for the unknown prices.
+
+    Parameters:
+    - values (np.ndarray): The prices, NaN when unknown.
+
+    Returns:
+    - list: The prices.
+
+    >>> to_list(np.array([1.8589999, np.nan], dtype=np.float32))
+    [1.859, None]
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(values), None, np.round(values, 3)).tolist()
+
+
+def parse_date(name: str, default: datetime) -> datetime:
+    """
+    Read a date argument of the request.
+
+    Parameters:
+    - name (str): The name of the argument.
+    - default (datetime): The date to use when the argument is not given.
+
+    Returns:
+    - datetime: The date.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be a date in the format YYYY-MM-DD")
+
+
+def parse_number(name: str, default=None, minimum=None, maximum=None, kind=float):
+    """
+    Read a number argument of the request.
+
+    Parameters:
+    - name (str): The name of the argument.
+    - default (float or None): The number to use when the argument is not given, None if it is required.
+    - minimum (float or None): The smallest allowed value, None for no bound.
+    - maximum (float or None): The largest allowed value, None for no bound.
+    - kind (type): The type of the number, float or int.
+
+    Returns:
+    - float or int: The number.
+    """
+    value = request.args.get(name)
+    if value is None:
+        if default is None:
+            raise ApiError(400, f"'{name}' is required")
+        return default
+    try:
+        number = kind(value)
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be a number")
+    if not np.isfinite(number):
+        raise ApiError(400, f"'{name}' must be a finite number")
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        if maximum is None:
+            raise ApiError(400, f"'{name}' must be at least {minimum}")
+        if minimum is None:
+            raise ApiError(400, f"'{name}' must be at most {maximum}")
+        raise ApiError(400, f"'{name}' must be between {minimum} and {maximum}")
+    return number
+
+
+def parse_fuels(fuel_types: list, required: bool = False) -> list:
+    """
+    Read the fuel types of the request, given as repeated 'fuel' arguments.
+
+    Parameters:
+    - fuel_types (list[str]): The fuel types of the store.
+    - required (bool): True if at least one fuel type must be given.
+
+    Returns:
+    - list[str]: The requested fuel types, every fuel type of the store by default.
+    """
+    fuels = request.args.getlist("fuel")
+    if not fuels:
+        if required:
+            raise ApiError(400, "'fuel' is required")
+        return list(fuel_types)
+    unknown = [fuel for fuel in fuels if fuel not in fuel_types]
+    if unknown:
+        raise ApiError(400, f"Unknown fuel types: {', '.join(unknown)}, expected one of {', '.join(fuel_types)}")
+    return fuels
+
+
+def iter_days(data_store, start: datetime, end: datetime):
+    """
+    Iterate over the partitions of a store covering a range of days. Only these partitions are loaded.
+
+    Parameters:
+    - data_store (DataStore): The store.
+    - start (datetime): The first day.
+    - end (datetime): The last day, included.
+
+    Returns:
+    - generator: Yields the PriceCube of each partition and the indexes of its first and last days in the range.
+    """
+    for first_day, days_len, key in data_store.bounds:
+        first, last = max(start.toordinal() - first_day, 0), min(end.toordinal() - first_day, days_len - 1)
+        if first <= last:
+            yield data_store.partition(key), first, last
+
+
+def parse_brands(brand_index) -> list:
+    """
+    Read the brands of the request, given as repeated 'brand' arguments in any variant of case and spacing.
+
+    Parameters:
+    - brand_index (BrandIndex): The brand index of the partition.
+
+    Returns:
+    - list[int]: The codes of the brands, empty if none is given.
+    """
+    codes = [brand_index.code(name) for name in request.args.getlist("brand")]
+    unknown = [name for name, code in zip(request.args.getlist("brand"), codes) if code is None]
+    if unknown:
+        raise ApiError(404, f"Unknown brands: {', '.join(unknown)}")
+    return codes
+
+
+def station_details(cube, index: int) -> dict:
+    """
+    Returns the details of a station, as given in the responses.
+
+    Parameters:
+    - cube (PriceCube): The partition holding the station.
+    - index (int): The index of the station in the partition.
+
+    Returns:
+    - dict: The ID, name, address, postal code, city and coordinates of the station.
+    """
+    return {
+        "id": int(cube.ids[index]),
+        "name": cube.names[index],
+        "address": cube.addresses[index],
+        "postal_code": cube.postal_codes[index],
+        "city": cube.cities[index],
+        "latitude": float(cube.latitudes[index]),
+        "longitude": float(cube.longitudes[index]),
+    }
+
+
+def create_api(get_data_store) -> Blueprint:
+    """
+    Create the read-only JSON API, to mount on the Flask server of the Dash app.
+
+    Responses carry a weak ETag derived from the version of the store and the request, so a conditional request
+    (If-None-Match) on unchanged data is answered with a 304 without building the response, and bodies are
+    compressed with gzip for the clients accepting it.
+
+    Endpoints:
+    - GET /api/stations/<id>/prices?fuel=&start=&end=: Daily prices of a station, for every fuel by default,
+      over the last partition by default.
+    - GET /api/stats?fuel=&date= or ?fuel=&start=&end=: Daily aggregates (count, mean, percentiles...) of the
+      prices of each fuel.
+    - GET /api/departments?fuel=&department=&date=: Aggregates of the prices of each department on a day, for
+      every department by default.
+    - GET /api/events?fuel=&kind=&date=: Price anomalies of a day (see PriceEvents) and the number of price
+      increases and decreases of each fuel.
+    - GET /api/brands?fuel=&brand=&n=&date=: Number of stations and aggregates of the prices of each brand on a
+      day, for the N brands with the most stations (all by default) or the given brands.
+    - GET /api/cheapest?fuel=&lat=&lon=&radius_km=&n=&date=&open_at=&brand=: Cheapest stations of an area on a
+      day, of any brand by default.
+    Dates are in the format YYYY-MM-DD and default to the last day of the store.
+
+    Parameters:
+    - get_data_store (callable): Returns the current DataStore.
+
+    Returns:
+    - Blueprint: The API.
+    """
+    api = Blueprint("api", __name__, url_prefix="/api")
+
+    @api.errorhandler(ApiError)
+    def handle_error(error):
+        return Response(json.dumps({"error": error.message}), status=error.status, mimetype="application/json")
+
+    def cached(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            data_store = get_data_store()
+            key = f"{API_VERSION}|{data_store.version()}|{request.full_path}"
+            etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                body = json.dumps(view(data_store, *args, **kwargs), separators=(",", ":")).encode("utf-8")
+                response = Response(body, mimetype="application/json")
+                if len(body) >= MIN_GZIP_SIZE and "gzip" in request.accept_encodings:
+                    response.set_data(gzip.compress(body, compresslevel=6))
+                    response.headers["Content-Encoding"] = "gzip"
+            response.set_etag(etag, weak=True)
+            response.headers["Vary"] = "Accept-Encoding"
+            response.headers["Cache-Control"] = "no-cache"  # Clients may keep the response but must revalidate it
+            return response
+        return wrapper
+
+    @api.route("/stations/<int:station_id>/prices")
+    @cached
+    def station_prices(data_store, station_id):
+        start = parse_date("start", data_store.latest().start_date)
+        end = parse_date("end", data_store.max_date)
+        if end < start:
+            raise ApiError(400, "'end' must not be before 'start'")
+
+        details = None
+        fuels = None
+        prices = {}
+        for cube, first, last in iter_days(data_store, start, end):
+            fuels = fuels or parse_fuels(cube.fuel_types)
+            index = cube.station_index(station_id)
+            for fuel in fuels:
+                if index is None:
+                    values = [None] * (last - first + 1)
+                else:
+                    # Read from the change points, the prices of a station are spread over the whole cube
+                    values = to_list(cube.price_history.expand_range(fuel, first, last + 1, [index])[0])
+                prices.setdefault(fuel, []).extend(values)
+            if index is not None:
+                details = station_details(cube, index)
+        if details is None:
+            raise ApiError(404, f"Unknown station: {station_id}")
+
+        return dict(details, start_date=max(start, data_store.min_date).strftime("%Y-%m-%d"), prices=prices)
+
+    @api.route("/stats")
+    @cached
+    def stats(data_store):
+        # A single day by default, or a range from 'start' to 'end' (the last day of the store by default)
+        date = parse_date("date", data_store.max_date)
+        start = parse_date("start", date)
+        end = parse_date("end", data_store.max_date if "start" in request.args else date)
+        # Checked against the fuel types of the store even if no partition covers the range
+        fuels = parse_fuels(data_store.latest().fuel_types)
+        if end < start:
+            raise ApiError(400, "'end' must not be before 'start'")
+
+        dates = []
+        values = {}
+        for cube, first, last in iter_days(data_store, start, end):
+            dates.extend(cube.dates()[first:last + 1])
+            for fuel in fuels:
+                fuel_stats = values.setdefault(fuel, {})
+                for stat in cube.rollups.STATS:
+                    series = cube.rollups.series(stat, fuel)[first:last + 1]
+                    fuel_stats.setdefault(stat, []).extend(
+                        np.asarray(series, dtype=np.int64).tolist() if stat == "count" else to_list(series)
+                    )
+        return {"dates": dates, "fuels": values}
+
+    @api.route("/departments")
+    @cached
+    def departments(data_store):
+        date = parse_date("date", data_store.max_date)
+        cube, day_index = data_store.cube_for(date)
+        fuels = parse_fuels(cube.fuel_types)
+        rollups = cube.department_rollups
+        selected = request.args.getlist("department") or rollups.departments
+        unknown = [department for department in selected if department not in rollups.department_index]
+        if unknown:
+            raise ApiError(404, f"Unknown departments: {', '.join(unknown)}")
+
+        values = {}
+        for department in selected:
+            values[department] = {}
+            for fuel in fuels:
+                stats = rollups.values[rollups.department_index[department], day_index, cube.fuel_index(fuel)]
+                values[department][fuel] = dict(zip(rollups.STATS, [int(stats[0])] + to_list(stats[1:])))
+        return {"date": (cube.start_date + timedelta(days=day_index)).strftime("%Y-%m-%d"), "departments": values}
+
+    @api.route("/events")
+    @cached
+    def events(data_store):
+        date = parse_date("date", data_store.max_date)
+        cube, day_index = data_store.cube_for(date)
+        fuels = parse_fuels(cube.fuel_types)
+        kinds = request.args.getlist("kind") or cube.price_events.KINDS
+        unknown = [kind for kind in kinds if kind not in cube.price_events.KINDS]
+        if unknown:
+            raise ApiError(400, f"Unknown event kinds: {', '.join(unknown)}, expected one of {', '.join(cube.price_events.KINDS)}")
+
+        events = cube.price_events.on_day(day_index)
+        events = events[
+            np.isin(events["fuel"], [cube.fuel_index(fuel) for fuel in fuels])
+            & np.isin(events["kind"], [cube.price_events.KINDS.index(kind) for kind in kinds])
+        ]
+        changes = cube.price_events.changes[day_index]
+        return {
+            "date": (cube.start_date + timedelta(days=day_index)).strftime("%Y-%m-%d"),
+            "changes": {fuel: {"increases": int(changes[cube.fuel_index(fuel), 0]), "decreases": int(changes[cube.fuel_index(fuel), 1])} for fuel in fuels},
+            "events": [
+                dict(
+                    station_details(cube, int(event["station"])),
+                    kind=cube.price_events.KINDS[event["kind"]],
+                    fuel=cube.fuel_types[event["fuel"]],
+                    price=to_list([event["price"]])[0],
+                    reference=to_list([event["reference"]])[0],
+                    value=round(float(event["value"]), 4),
+                )
+                for event in events
+            ],
+        }
+
+    @api.route("/brands")
+    @cached
+    def brands(data_store):
+        date = parse_date("date", data_store.max_date)
+        cube, day_index = data_store.cube_for(date)
+        fuels = parse_fuels(cube.fuel_types)
+        brand_index = cube.brand_index
+        count = parse_number("n", len(brand_index), minimum=1, kind=int)
+        codes = parse_brands(brand_index) or range(min(count, len(brand_index)))
+
+        stats = {fuel: brand_index.stats(cube.prices_on(fuel, day_index)) for fuel in fuels}
+        values = {}
+        for code in codes:
+            values[brand_index.brands[code]] = {"stations": int(brand_index.counts[code])}
+            for fuel in fuels:
+                brand_stats = stats[fuel][code]
+                values[brand_index.brands[code]][fuel] = dict(zip(brand_index.STATS, [int(brand_stats[0])] + to_list(brand_stats[1:])))
+        return {"date": (cube.start_date + timedelta(days=day_index)).strftime("%Y-%m-%d"), "brands": values}
+
+    @api.route("/cheapest")
+    @cached
+    def cheapest(data_store):
+        date = parse_date("date", data_store.max_date)
+        latitude = parse_number("lat", minimum=-90, maximum=90)
+        longitude = parse_number("lon", minimum=-180, maximum=180)
+        radius_km = parse_number("radius_km", 10.0, minimum=0, maximum=MAX_RADIUS_KM)
+        count = parse_number("n", 5, minimum=1, maximum=MAX_CHEAPEST, kind=int)
+
+        cube, day_index = data_store.cube_for(date)
+        # The requested date clamped to the days of the store, whose opening hours apply
+        date = cube.start_date + timedelta(days=day_index)
+        fuel = parse_fuels(cube.fuel_types, required=True)[0]
+        prices = cube.prices_on(fuel, day_index)
+        if "open_at" in request.args:
+            minute = parse_minutes(request.args["open_at"])
+            if minute is None:
+                raise ApiError(400, "'open_at' must be a time in the format HH:MM")
+            prices = np.where(cube.opening_hours_index.open_at(date.isoweekday(), minute), prices, np.nan)
+        codes = parse_brands(cube.brand_index)
+        if codes:
+            prices = np.where(np.isin(cube.brand_index.codes, codes), prices, np.nan)
+
+        indexes, distances = cube.spatial_index.cheapest(latitude, longitude, radius_km, prices, count)
+        return {
+            "date": date.strftime("%Y-%m-%d"),
+            "fuel": fuel,
+            "stations": [
+                dict(station_details(cube, index), price=to_list(prices[index:index + 1])[0], distance_km=round(float(distance), 3))
+                for index, distance in zip(indexes.tolist(), distances)
+            ],
+        }
+
+    return api
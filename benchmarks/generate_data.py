@@ -0,0 +1,180 @@
+"""
+Generator of synthetic PrixCarburants yearly archives, in the schema of https://donnees.roulez-eco.fr/opendata/annee/<year>.
+
+Usage:
+    python -m benchmarks.generate_data --stations 10000 --years 2022 2023 --changes-per-month 4 --output bench_data
+
+Every archive holds a single PrixCarburants_annuel_<year>.xml file, encoded in ISO-8859-1 like the real files,
+and is written as it is generated so memory does not depend on the number of stations. The same seed always
+gives the same stations, and a station keeps its ID, location and hours from one year to the next.
+"""
+import argparse
+from datetime import datetime, timedelta
+import os
+import random
+import zipfile
+
+
+FUEL_PRICES = {"Gazole": 1.85, "SP95": 1.90, "E85": 1.10, "E10": 1.85, "SP98": 1.95, "GPLc": 0.99}
+DAY_NAMES = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+SERVICES = ["Laverie", "Boutique alimentaire", "Station de gonflage", "Lavage automatique", "DAB (Distributeur automatique de billets)", "Vente de gaz domestique (Butane, Propane)"]
+# (postal code prefix, latitude, longitude) of some departments, stations are spread around them
+DEPARTMENTS = [
+    ("75", 48.857, 2.352), ("93", 48.910, 2.480), ("13", 43.297, 5.370), ("69", 45.764, 4.836),
+    ("31", 43.605, 1.444), ("33", 44.838, -0.579), ("59", 50.629, 3.057), ("44", 47.218, -1.554),
+    ("67", 48.573, 7.752), ("35", 48.117, -1.678), ("01", 46.205, 5.226), ("29", 48.390, -4.486),
+    ("20", 41.919, 8.739), ("20", 42.697, 9.450), ("971", 16.241, -61.533), ("974", -20.882, 55.450),
+]
+
+
+def generate_station(number: int, seed: int) -> dict:
+    """
+    Draw the details of a station that do not change over the years.
+
+    Parameters:
+    - number (int): The number of the station.
+    - seed (int): The seed of the dataset.
+
+    Returns:
+    - dict: The ID, location, address, hours, services and fuels of the station.
+    """
+    rng = random.Random(f"{seed}-{number}")
+    prefix, latitude, longitude = rng.choice(DEPARTMENTS)
+    postal_code = (prefix + f"{rng.randrange(0, 1000):03d}")[:5]
+
+    hours = None
+    if rng.random() < 0.9:
+        opening, closing = rng.choice([(360, 1320), (420, 1230), (480, 1140), (0, 1439), (1320, 360)])
+        hours = [None if day == 6 and rng.random() < 0.3 else (opening, closing) for day in range(7)]
+
+    return {
+        "id": int(postal_code[:2]) * 1000000 + number,  # Station IDs start with their department
+        "number": number,
+        "latitude": latitude + rng.gauss(0, 0.3),
+        "longitude": longitude + rng.gauss(0, 0.3),
+        "postal_code": postal_code,
+        "pop": rng.choice("RA"),
+        "address": f"{rng.randrange(1, 300)} RUE DE LA STATION {number}",
+        "city": f"VILLE {prefix}-{number % 97}",
+        "always_open": rng.random() < 0.4,
+        "hours": hours,
+        "services": rng.sample(SERVICES, rng.randrange(0, len(SERVICES))),
+        "fuels": [fuel for fuel in FUEL_PRICES if rng.random() < (0.95 if fuel in ("Gazole", "SP95", "E10") else 0.4)],
+        "offset": rng.gauss(0, 0.05),
+    }
+
+
+def format_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}.{minutes % 60:02d}"
+
+
+def station_xml(station: dict, year: int, changes_per_month: float, seed: int) -> str:
+    """
+    Write the <pdv> element of a station for a year.
+
+    Parameters:
+    - station (dict): The station, see generate_station.
+    - year (int): The year of the prices.
+    - changes_per_month (float): The average number of price changes per fuel and month.
+    - seed (int): The seed of the dataset.
+
+    Returns:
+    - str: The XML element.
+    """
+    rng = random.Random(f"{seed}-{station['number']}-{year}")
+    lines = [
+        f'<pdv id="{station["id"]}" latitude="{int(station["latitude"] * 100000)}" '
+        f'longitude="{int(station["longitude"] * 100000)}" cp="{station["postal_code"]}" pop="{station["pop"]}">',
+        f"<adresse>{station['address']}</adresse>",
+        f"<ville>{station['city']}</ville>",
+    ]
+
+    if station["hours"] is not None:
+        lines.append('<horaires automate-24-24="1">' if station["always_open"] else '<horaires automate-24-24="">')
+        for day, hours in enumerate(station["hours"]):
+            if hours is None:
+                lines.append(f'<jour id="{day + 1}" nom="{DAY_NAMES[day]}" ferme="1"/>')
+            else:
+                lines.append(
+                    f'<jour id="{day + 1}" nom="{DAY_NAMES[day]}" ferme="">'
+                    f'<horaire ouverture="{format_time(hours[0])}" fermeture="{format_time(hours[1])}"/></jour>'
+                )
+        lines.append("</horaires>")
+
+    lines.append("<services>" + "".join(f"<service>{service}</service>" for service in station["services"]) + "</services>")
+
+    start = datetime(year, 1, 1)
+    end = datetime(year + 1, 1, 1)
+    mean_interval = 30.0 / max(changes_per_month, 0.01)
+    for fuel_id, fuel in enumerate(FUEL_PRICES, start=1):
+        if fuel not in station["fuels"]:
+            continue
+        price = FUEL_PRICES[fuel] + station["offset"]
+        date = start + timedelta(days=rng.uniform(0, min(mean_interval, 20)), seconds=rng.randrange(6 * 3600, 22 * 3600))
+        while date < end:
+            lines.append(f'<prix nom="{fuel}" id="{fuel_id}" maj="{date.strftime("%Y-%m-%dT%H:%M:%S")}" valeur="{max(price, 0.5):.3f}"/>')
+            price += rng.gauss(0, 0.02)
+            date += timedelta(days=rng.expovariate(1 / mean_interval))
+        if rng.random() < 0.05:
+            lines.append(f'<rupture id="{fuel_id}" nom="{fuel}" debut="{year}-06-01 00:00:00" fin="" type="temporaire"/>')
+
+    lines.append("</pdv>")
+    return "\n".join(lines)
+
+
+def generate_year(path: str, year: int, stations: int, changes_per_month: float = 4.0, seed: int = 0) -> str:
+    """
+    Write the archive of a year.
+
+    Parameters:
+    - path (str): The path of the zip archive.
+    - year (int): The year of the prices.
+    - stations (int): The number of stations.
+    - changes_per_month (float): The average number of price changes per fuel and month.
+    - seed (int): The seed of the dataset.
+
+    Returns:
+    - str: The path of the archive.
+    """
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(f"PrixCarburants_annuel_{year}.xml", "w", force_zip64=True) as xml_file:
+            xml_file.write(b'<?xml version="1.0" encoding="ISO-8859-1" standalone="yes"?>\n<pdv_liste>\n')
+            for number in range(stations):
+                station = generate_station(number, seed)
+                xml_file.write((station_xml(station, year, changes_per_month, seed) + "\n").encode("iso-8859-1"))
+            xml_file.write(b"</pdv_liste>\n")
+    return path
+
+
+def generate(directory: str, stations: int, years: list, changes_per_month: float = 4.0, seed: int = 0) -> list:
+    """
+    Write the archives of several years, named like the downloaded ones.
+
+    Parameters:
+    - directory (str): The directory of the archives.
+    - stations (int): The number of stations.
+    - years (list[int]): The years to generate.
+    - changes_per_month (float): The average number of price changes per fuel and month.
+    - seed (int): The seed of the dataset.
+
+    Returns:
+    - list[str]: The paths of the archives.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return [
+        generate_year(os.path.join(directory, f"PrixCarburants_annuel_{year}.zip"), year, stations, changes_per_month, seed)
+        for year in years
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic PrixCarburants yearly archives.")
+    parser.add_argument("--stations", type=int, default=10000, help="Number of stations")
+    parser.add_argument("--years", type=int, nargs="+", default=[2023], help="Years to generate")
+    parser.add_argument("--changes-per-month", type=float, default=4.0, help="Average number of price changes per fuel and month")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_data", help="Directory of the archives")
+    args = parser.parse_args()
+
+    for path in generate(args.output, args.stations, args.years, args.changes_per_month, args.seed):
+        print(path)
@@ -0,0 +1,355 @@
+"""
+End-to-end benchmark suite of the ingestion and of the Dash callbacks, on synthetic data.
+
+Usage:
+    python -m benchmarks.run --sizes 10000 50000 200000 --output benchmarks/results.json
+    python -m benchmarks.run --sizes 10000 --compare benchmarks/results.json
+
+For every number of stations, a synthetic year is generated (see benchmarks/generate_data.py) and the station
+names are served by a local NameStubServer. Every stage runs in a fresh process, so its wall time, CPU time and
+memory are not affected by the previous ones, and every measure records the highest resident memory reached while
+it ran (see Metrics.stage). The results are written as JSON, and --compare
+prints the ratios against a previous results file to spot regressions between versions.
+
+The workers stage serves a page load from worker processes forked after the data is loaded, like
+`gunicorn wsgi:server`, records the memory private to each worker and fails if the workers do not share most of
+the memory of the process they were forked from. Run with several --sizes, the suite also fails if the private
+memory of the workers grows with the number of stations (see check_worker_growth).
+"""
+import argparse
+import concurrent.futures
+import gc
+import json
+import multiprocessing
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import time
+import zipfile
+from datetime import datetime
+
+from benchmarks.generate_data import generate_year
+from instrumentation import current_rss, metrics, private_rss
+from name_stub_server import NameStubServer
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = [10000, 50000, 200000]
+YEAR = 2023
+WORKERS = 2
+# A worker must share at least this fraction of the memory of the process it was forked from, and its private
+# memory must stay below the other fraction, or the preloaded store is not shared (a worker without gc.freeze or
+# loading the store again measures about 0.6 and 0.25)
+MIN_SHARED_FRACTION = 0.75
+MAX_PRIVATE_FRACTION = 0.2
+# With several sizes, the private memory of the workers at the largest size must stay below this multiple of the
+# one at the smallest size
+MAX_PRIVATE_GROWTH = 1.25
+
+
+def measure(stage: str, function, count=len) -> tuple:
+    """
+    Run a function and measure it.
+
+    Parameters:
+    - stage (str): The name of the stage.
+    - function (callable): The function to run, without arguments.
+    - count (callable or None): Returns the number of items processed from the result of the function.
+
+    Returns:
+    - tuple: The result of the function and the measures as a dict, with the ingestion stages run inside it.
+    """
+    metrics.reset()
+    rss_before = current_rss()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    # Measured as an outer stage for its memory, the time of a stage excludes that of the stages run inside it
+    with metrics.stage(stage):
+        result = function()
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    stages = metrics.snapshot()["stages"]
+    return result, {
+        "stage": stage,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "rss_before_kb": rss_before,
+        "max_rss_kb": stages.pop(stage)["max_rss_kb"],
+        "items": count(result) if count is not None else None,
+        "stages": stages,
+    }
+
+
+def serve_requests(worker: int, fuel: str, date: str) -> dict:
+    """
+    Answer the requests of a page load in a worker forked from a process that imported main.py, like a worker of
+    `gunicorn wsgi:server`, and measure the memory it does not share with the other processes.
+
+    Parameters:
+    - worker (int): The number of the worker.
+    - fuel (str): The selected fuel type.
+    - date (str): The selected date.
+
+    Returns:
+    - dict: The measures of the worker.
+    """
+    import main
+    _, record = measure(f"worker:{worker}", lambda: [
+        main.update_heatmap(fuel, date, "all", "12:00"),
+        main.update_histogram(fuel, date),
+        main.update_piechart(date),
+        main.update_markersmap(fuel, date, *main.DEFAULT_CENTER, main.DEFAULT_RADIUS_KM, "all", "12:00"),
+    ], count=len)
+    # A long running worker collects its oldest objects sooner or later, which writes to every object not frozen
+    gc.collect()
+    record["rss_kb"] = current_rss()
+    record["private_rss_kb"] = private_rss()
+    record["shared_rss_kb"] = record["rss_kb"] - record["private_rss_kb"] if record["private_rss_kb"] is not None else None
+    return record
+
+
+def run_stage(stage: str, workdir: str, names_url: str) -> list:
+    """
+    Run a stage of the suite, in the working directory of a dataset. Called in a fresh process.
+
+    Parameters:
+    - stage (str): The name of the stage.
+    - workdir (str): The directory of the dataset, where the outputs are written.
+    - names_url (str): The URL template of the station name stub.
+
+    Returns:
+    - list[dict]: The measures of the stage.
+    """
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT_DIR)
+    os.environ["TQDM_DISABLE"] = "1"
+    import get_datas
+    from name_cache import NameCache
+    from name_fetcher import NameFetcher
+
+    archive = f"PrixCarburants_annuel_{YEAR}.zip"
+    fetcher = NameFetcher(names_url)
+
+    if stage == "parse_data":
+        # Cold name cache: every name is requested from the stub
+        if os.path.exists("names.sqlite"):
+            os.remove("names.sqlite")
+        with NameCache("names.sqlite") as name_cache:
+            gas_stations, record = measure(stage, lambda: get_datas.parse_data(
+                f"PrixCarburants_annuel_{YEAR}.xml", fetcher=fetcher, name_cache=name_cache
+            ))
+        with open("stations.pickle", "wb") as outfile:
+            pickle.dump(gas_stations, outfile)
+        return [record]
+
+    if stage == "iter_stations":
+        with NameCache("names.sqlite") as name_cache:
+            _, record = measure(stage, lambda: sum(
+                1 for _ in get_datas.iter_stations(archive, fetcher=fetcher, name_cache=name_cache)
+            ), count=lambda count: count)
+        return [record]
+
+    if stage in ("create_json", "create_json_compact", "create_store"):
+        with open("stations.pickle", "rb") as infile:
+            gas_stations = pickle.load(infile)
+        if stage == "create_store":
+            _, record = measure(stage, lambda: get_datas.create_store(gas_stations, YEAR, "graph_data/store"), count=None)
+        else:
+            _, record = measure(stage, lambda: get_datas.create_json(gas_stations, YEAR, compact=stage == "create_json_compact"), count=None)
+        record["items"] = len(gas_stations)
+        return [record]
+
+    if stage == "main_load":
+        main, record = measure(stage, lambda: __import__("main"), count=lambda main: len(main.data_store.latest()))
+        return [record]
+
+    if stage == "callbacks":
+        import main
+        date = main.data_store.max_date.strftime("%Y-%m-%d")
+        fuel = main.fuel_types[0]
+        latitude, longitude = main.DEFAULT_CENTER
+        callbacks = {
+            "piechartNameStations": lambda: main.get_piechart(15),
+            "piechartPriceStations": lambda: main.update_piechart(date),
+            "histogram": lambda: main.update_histogram(fuel, date),
+            "departments": lambda: main.update_departments(fuel, date),
+            "events": lambda: main.update_events(fuel, date),
+            "heatmap": lambda: main.update_heatmap(fuel, date, "all", "12:00"),
+            "heatmap_stations": lambda: main.update_heatmap(fuel, date, "all", "12:00", "stations"),
+            "heatmap_open": lambda: main.update_heatmap(fuel, date, "open", "12:00"),
+            "markersmap": lambda: main.update_markersmap(fuel, date, latitude, longitude, main.DEFAULT_RADIUS_KM, "all", "12:00"),
+        }
+        records = []
+        for name, callback in callbacks.items():
+            main.figure_cache.invalidate()
+            for temperature in ("cold", "warm"):
+                _, record = measure(f"callback:{name}:{temperature}", callback, count=None)
+                records.append(record)
+        return records
+
+    if stage == "workers":
+        import main
+        _, record = measure("workers:preload", lambda: main.data_store.preload(), count=None)
+        gc.freeze()
+        record["items"] = len(main.data_store.latest())
+        record["private_rss_kb"] = private_rss()
+        records = [record]
+        date = main.data_store.max_date.strftime("%Y-%m-%d")
+        context = multiprocessing.get_context("fork")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=WORKERS, mp_context=context) as executor:
+            workers = list(executor.map(serve_requests, range(WORKERS), [main.fuel_types[0]] * WORKERS, [date] * WORKERS))
+
+        # Check that the workers share the preloaded store instead of holding their own copy
+        for worker in workers:
+            if worker["private_rss_kb"] is None or not record["private_rss_kb"]:
+                continue  # smaps_rollup is only available on Linux
+            worker["shared_fraction"] = round(worker["shared_rss_kb"] / record["private_rss_kb"], 3)
+            worker["private_fraction"] = round(worker["private_rss_kb"] / record["private_rss_kb"], 3)
+            if worker["shared_fraction"] < MIN_SHARED_FRACTION or worker["private_fraction"] > MAX_PRIVATE_FRACTION:
+                raise AssertionError(
+                    f"{worker['stage']} does not share the preloaded store: {worker['shared_fraction']:.0%} of the memory of the "
+                    f"master is shared (at least {MIN_SHARED_FRACTION:.0%}) and its private memory is {worker['private_fraction']:.0%} "
+                    f"of it (at most {MAX_PRIVATE_FRACTION:.0%})"
+                )
+        return records + workers
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+STAGES = ["parse_data", "iter_stations", "create_json", "create_json_compact", "create_store", "main_load", "callbacks", "workers"]
+
+
+def prepare_dataset(directory: str, stations: int, changes_per_month: float, seed: int) -> str:
+    """
+    Generate the dataset of a number of stations, unless it already exists.
+
+    Parameters:
+    - directory (str): The root directory of the datasets.
+    - stations (int): The number of stations.
+    - changes_per_month (float): The average number of price changes per fuel and month.
+    - seed (int): The seed of the dataset.
+
+    Returns:
+    - str: The working directory of the dataset.
+    """
+    workdir = os.path.abspath(os.path.join(directory, f"{stations}_{changes_per_month}_{seed}"))
+    os.makedirs(workdir, exist_ok=True)
+    archive = os.path.join(workdir, f"PrixCarburants_annuel_{YEAR}.zip")
+    if not os.path.exists(archive):
+        generate_year(archive + ".tmp", YEAR, stations, changes_per_month, seed)
+        os.replace(archive + ".tmp", archive)
+        with zipfile.ZipFile(archive) as zip_file:
+            zip_file.extractall(workdir)
+    return workdir
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_mb(kilobytes) -> str:
+    return f"{kilobytes / 1024:.1f}" if kilobytes is not None else "-"
+
+
+def check_worker_growth(records: list) -> None:
+    """
+    Check that the private memory of the workers does not grow with the number of stations.
+
+    Parameters:
+    - records (list): The records of the run, of every size.
+
+    Raises:
+    - AssertionError: If the workers at the largest size hold more than MAX_PRIVATE_GROWTH times the private memory
+      of the workers at the smallest size.
+    """
+    private = {}
+    for record in records:
+        if record["stage"].startswith("worker:") and record.get("private_rss_kb"):
+            private[record["stations"]] = max(private.get(record["stations"], 0), record["private_rss_kb"])
+    if len(private) < 2:
+        return
+    smallest, largest = min(private), max(private)
+    print(f"Worker private memory: {format_mb(private[smallest])} MB at {smallest} stations, "
+          f"{format_mb(private[largest])} MB at {largest} stations")
+    if private[largest] > private[smallest] * MAX_PRIVATE_GROWTH:
+        raise AssertionError(
+            f"The private memory of the workers grows with the number of stations: {format_mb(private[largest])} MB at "
+            f"{largest} stations against {format_mb(private[smallest])} MB at {smallest} (at most x{MAX_PRIVATE_GROWTH})"
+        )
+
+
+def compare(results: dict, previous: dict) -> None:
+    """
+    Print the ratios of the wall times and highest memory of two results files, for the stages they share.
+
+    Parameters:
+    - results (dict): The new results.
+    - previous (dict): The previous results.
+    """
+    previous_records = {(record["stations"], record["stage"]): record for record in previous["results"]}
+    print(f"{'stations':>9} {'stage':<42} {'wall':>8} {'ratio':>6} {'max MB':>8} {'ratio':>6}")
+    for record in results["results"]:
+        old = previous_records.get((record["stations"], record["stage"]))
+        if old is None:
+            continue
+        wall_ratio = record["wall_seconds"] / old["wall_seconds"] if old["wall_seconds"] else float("nan")
+        # Results written before the per stage memory give the peak of the process instead
+        old_rss = old.get("max_rss_kb", old.get("peak_rss_kb"))
+        rss_ratio = record["max_rss_kb"] / old_rss if record["max_rss_kb"] and old_rss else float("nan")
+        print(f"{record['stations']:>9} {record['stage']:<42} {record['wall_seconds']:>8.3f} {wall_ratio:>6.2f} "
+              f"{format_mb(record['max_rss_kb']):>8} {rss_ratio:>6.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion and the Dash callbacks on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of stations")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES, help="Stages to run, in order")
+    parser.add_argument("--changes-per-month", type=float, default=4.0, help="Average number of price changes per fuel and month")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="bench_data", help="Directory of the generated datasets, reused between runs")
+    parser.add_argument("--name-latency", type=float, default=0.0, help="Delay in seconds of every name stub response")
+    parser.add_argument("--output", default="benchmarks/results.json", help="Results file")
+    parser.add_argument("--compare", help="Previous results file to compare with")
+    args = parser.parse_args()
+
+    server = NameStubServer(("127.0.0.1", 0), latency=args.name_latency, nameless_every=50)
+    server.start()
+
+    results = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {"changes_per_month": args.changes_per_month, "seed": args.seed, "year": YEAR},
+        "results": [],
+    }
+    context = multiprocessing.get_context("spawn")
+    for stations in args.sizes:
+        workdir = prepare_dataset(args.data_dir, stations, args.changes_per_month, args.seed)
+        for stage in args.stages:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                records = executor.submit(run_stage, stage, workdir, server.url).result()
+            for record in records:
+                record["stations"] = stations
+                results["results"].append(record)
+                private = f" {record['private_rss_kb'] / 1024:>8.1f} MB private" if record.get("private_rss_kb") is not None else ""
+                print(f"{stations:>9} {record['stage']:<42} {record['wall_seconds']:>8.3f}s {format_mb(record['max_rss_kb']):>8} MB{private}")
+
+    server.shutdown()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as outfile:
+        json.dump(results, outfile, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as infile:
+            compare(results, json.load(infile))
+
+    check_worker_growth(results["results"])
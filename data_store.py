@@ -0,0 +1,853 @@
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from models.DepartmentRollups import DepartmentRollups
+from models.PriceCube import PriceCube
+from models.PriceEvents import EVENTS_DTYPE, PriceEvents
+from models.RollupTable import RollupTable
+
+
+STORE_VERSION = 2
+METADATA_FILE = "metadata.json"
+# Sub-directory of a partition holding the copy being updated, see PartitionUpdate
+STAGING_DIR = ".staging"
+
+# Fixed-width columns: file name -> dtype
+NUMERIC_COLUMNS = {
+    "ids": np.int64,
+    "latitudes": np.float64,
+    "longitudes": np.float64,
+    "is_always_open": np.bool_,
+}
+# Variable-width columns, saved as an offsets array and a UTF-8 blob
+STRING_COLUMNS = ["names", "addresses", "postal_codes", "cities", "opening_hours"]
+PRICES_DTYPE = np.float32
+ROLLUPS_DTYPE = np.float64
+# Files written in place by apply_price_changes and refresh_rollups, and by append_stations, see PartitionUpdate
+PRICE_FILES = ["prices.bin", "rollups.bin", "department_rollups.bin"]
+STATION_FILES = ["prices.bin"] + [f"{column}.bin" for column in NUMERIC_COLUMNS] + [
+    f"{column}.{extension}" for column in STRING_COLUMNS for extension in ("txt", "idx")
+]
+# A partition being swapped in by PartitionUpdate.commit is opened again after this delay, see open_partition
+OPEN_RETRIES = 5
+OPEN_RETRY_DELAY = 0.2
+
+
+class StoreWriter:
+    """
+    Write a binary data store one gas station at a time.
+
+    The store is a directory holding raw little-endian arrays (prices shaped (stations, days, fuels) and one
+    array per numeric column), a string table per text column and a small metadata.json file describing
+    their shapes. The prices are appended to disk as they come, so memory does not depend on the number of
+    stations. The per (day, fuel) and per (department, day, fuel) rollups and the price events are computed on close and the metadata file is
+    written last, a store without it is incomplete.
+
+    Attributes:
+    - directory (str): The directory of the store.
+    - fuel_types (list[str]): The fuel types, in the order of the last axis of the prices.
+    - start_date (datetime): The date of the first day of the prices.
+    - days_len (int): The number of days of the prices.
+    - last_day (int): The index of the last day with data, the prices after it being forward-filled (-1 if none).
+
+    Methods:
+    - append(self, station: dict, prices: np.ndarray): Append a gas station and its prices shaped (days, fuels).
+    - close(self): Write the columns and the metadata of the store.
+    """
+
+    def __init__(self, directory: str, fuel_types: list, start_date: datetime, days_len: int, last_day: int = None):
+        self.directory = directory
+        self.fuel_types = list(fuel_types)
+        self.start_date = start_date
+        self.days_len = days_len
+        self.last_day = days_len - 1 if last_day is None else last_day
+        self.stations_len = 0
+        self.columns = {column: [] for column in list(NUMERIC_COLUMNS) + STRING_COLUMNS}
+
+        os.makedirs(directory, exist_ok=True)
+        # Remove the metadata first so that readers never see a half written store as complete
+        if os.path.exists(os.path.join(directory, METADATA_FILE)):
+            os.remove(os.path.join(directory, METADATA_FILE))
+        # Unlink the files of the previous store instead of truncating them: a server still memory mapping them
+        # keeps reading the previous data until it reloads the store
+        for name in os.listdir(directory):
+            if name.endswith((".bin", ".txt", ".idx")):
+                os.remove(os.path.join(directory, name))
+        self.prices_file = open(os.path.join(directory, "prices.bin"), "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.prices_file.close()
+
+    def append(self, station: dict, prices: np.ndarray) -> None:
+        """
+        Append a gas station to the store.
+
+        Parameters:
+        - station (dict): The details of the station, with a key per column of the store.
+        - prices (np.ndarray): The daily prices of the station, shaped (days, fuels).
+        """
+        self.prices_file.write(np.ascontiguousarray(prices, dtype="<f4").tobytes())
+        for column, values in self.columns.items():
+            values.append(station.get(column))
+        self.stations_len += 1
+
+    def close(self) -> None:
+        """
+        Write the columns and the metadata of the store.
+        """
+        self.prices_file.close()
+
+        for column, dtype in NUMERIC_COLUMNS.items():
+            np.asarray(self.columns[column], dtype=np.dtype(dtype).newbyteorder("<")).tofile(
+                os.path.join(self.directory, f"{column}.bin")
+            )
+
+        for column in STRING_COLUMNS:
+            write_strings(self.directory, column, self.columns[column])
+
+        prices = open_array(
+            os.path.join(self.directory, "prices.bin"), PRICES_DTYPE,
+            (self.stations_len, self.days_len, len(self.fuel_types))
+        )
+        write_rollups(self.directory, RollupTable.from_prices(prices, self.fuel_types))
+        department_rollups = DepartmentRollups.from_prices(prices, self.fuel_types, self.columns["postal_codes"])
+        write_department_rollups(self.directory, department_rollups)
+        station_departments, _ = DepartmentRollups.departments_of(self.columns["postal_codes"])
+        price_events = PriceEvents.detect(
+            prices, self.fuel_types, department_rollups.values[..., DepartmentRollups.STATS.index("p50")], station_departments
+        )
+        write_events(self.directory, price_events)
+
+        write_metadata(self.directory, {
+            "version": STORE_VERSION,
+            "stations": self.stations_len,
+            "days": self.days_len,
+            "last_day": self.last_day,
+            "start_date": self.start_date.strftime("%Y-%m-%d"),
+            "fuel_types": self.fuel_types,
+            "departments": department_rollups.departments,
+            "events": len(price_events),
+        })
+
+
+def write_metadata(directory: str, metadata: dict) -> None:
+    """
+    Atomically write the metadata file of a store.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - metadata (dict): The metadata to write.
+    """
+    temp_file = os.path.join(directory, METADATA_FILE + ".tmp")
+    with open(temp_file, "w") as outfile:
+        json.dump(metadata, outfile)
+    os.replace(temp_file, os.path.join(directory, METADATA_FILE))
+
+
+def read_metadata(directory: str) -> dict:
+    """
+    Read the metadata file of a store.
+
+    Parameters:
+    - directory (str): The directory of the store.
+
+    Returns:
+    - dict: The metadata of the store.
+    """
+    with open(os.path.join(directory, METADATA_FILE)) as infile:
+        metadata = json.load(infile)
+    if metadata.get("version") != STORE_VERSION:
+        raise ValueError(f"Unsupported data store version: {metadata.get('version')}")
+    return metadata
+
+
+def write_strings(directory: str, column: str, values: list) -> None:
+    """
+    Write a string table: the UTF-8 encoded values back to back and the offsets of each value.
+
+    None values are stored as an offset of -1.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - column (str): The name of the column.
+    - values (list): The values, dicts are stored as JSON.
+    """
+    offsets = np.empty(len(values) + 1, dtype="<i8")
+    offsets[0] = 0
+    with open(os.path.join(directory, f"{column}.txt"), "wb") as outfile:
+        position = 0
+        for i, value in enumerate(values):
+            if value is None:
+                offsets[i + 1] = -1
+                continue
+            if not isinstance(value, str):
+                value = json.dumps(value)
+            encoded = value.encode("utf-8")
+            outfile.write(encoded)
+            position += len(encoded)
+            offsets[i + 1] = position
+    offsets.tofile(os.path.join(directory, f"{column}.idx"))
+
+
+def append_strings(directory: str, column: str, values: list, stations_len: int) -> None:
+    """
+    Append values to a string table written by write_strings.
+
+    The files are first truncated to `stations_len` values, dropping what an interrupted update may have left.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - column (str): The name of the column.
+    - values (list): The values to append, dicts are stored as JSON.
+    - stations_len (int): The number of values currently in the table.
+    """
+    index_file = os.path.join(directory, f"{column}.idx")
+    offsets = np.fromfile(index_file, dtype="<i8", count=stations_len + 1)
+    known = offsets[offsets >= 0]
+    position = int(known[-1]) if len(known) else 0
+
+    new_offsets = np.empty(len(values), dtype="<i8")
+    with open(os.path.join(directory, f"{column}.txt"), "r+b") as outfile:
+        outfile.truncate(position)
+        outfile.seek(position)
+        for i, value in enumerate(values):
+            if value is None:
+                new_offsets[i] = -1
+                continue
+            if not isinstance(value, str):
+                value = json.dumps(value)
+            encoded = value.encode("utf-8")
+            outfile.write(encoded)
+            position += len(encoded)
+            new_offsets[i] = position
+
+    with open(index_file, "r+b") as outfile:
+        outfile.truncate(offsets.nbytes)
+        outfile.seek(offsets.nbytes)
+        outfile.write(new_offsets.tobytes())
+
+
+def read_strings(directory: str, column: str, decode_json: bool = False) -> np.ndarray:
+    """
+    Read a string table written by write_strings.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - column (str): The name of the column.
+    - decode_json (bool): True if the values are JSON documents.
+
+    Returns:
+    - np.ndarray: The values, as an object array.
+    """
+    offsets = np.fromfile(os.path.join(directory, f"{column}.idx"), dtype="<i8")
+    with open(os.path.join(directory, f"{column}.txt"), "rb") as infile:
+        blob = infile.read()
+
+    values = np.empty(len(offsets) - 1, dtype=object)
+    start = 0
+    for i in range(len(values)):
+        end = offsets[i + 1]
+        if end < 0:
+            continue  # None, the next value starts where the previous one ended
+        value = blob[start:end].decode("utf-8")
+        values[i] = json.loads(value) if decode_json else value
+        start = end
+    return values
+
+
+def open_array(path: str, dtype, shape: tuple, mode: str = "r") -> np.ndarray:
+    """
+    Memory map a raw array file.
+
+    Parameters:
+    - path (str): The path of the file.
+    - dtype: The dtype of the values.
+    - shape (tuple): The shape of the array.
+    - mode (str): The numpy.memmap mode, 'r' for read only or 'r+' to update in place.
+
+    Returns:
+    - np.ndarray: The memory mapped array (an empty array if the shape has no values).
+    """
+    dtype = np.dtype(dtype).newbyteorder("<")
+    if int(np.prod(shape)) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+
+def write_rollups(directory: str, rollups: RollupTable) -> None:
+    """
+    Write the rollups file of a store.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - rollups (RollupTable): The aggregates of the prices of the store.
+    """
+    np.asarray(rollups.values, dtype=np.dtype(ROLLUPS_DTYPE).newbyteorder("<")).tofile(
+        os.path.join(directory, "rollups.bin")
+    )
+
+
+def write_department_rollups(directory: str, department_rollups: DepartmentRollups) -> None:
+    """
+    Write the department rollups file of a store. Its departments are listed in the metadata.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - department_rollups (DepartmentRollups): The per department aggregates of the prices of the store.
+    """
+    np.asarray(department_rollups.values, dtype=np.dtype(ROLLUPS_DTYPE).newbyteorder("<")).tofile(
+        os.path.join(directory, "department_rollups.bin")
+    )
+
+
+def write_events(directory: str, price_events: PriceEvents) -> None:
+    """
+    Write the price events files of a store: the events and the daily counts of price changes. The number of events
+    is given in the metadata.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - price_events (PriceEvents): The price changes and anomalies of the store.
+    """
+    for name in ("events.bin", "changes.bin"):
+        # Unlink the previous files, which may be memory mapped by readers
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+    np.asarray(price_events.events, dtype=EVENTS_DTYPE).tofile(os.path.join(directory, "events.bin"))
+    np.asarray(price_events.changes, dtype="<i8").tofile(os.path.join(directory, "changes.bin"))
+
+
+def refresh_rollups(directory: str, first_day: int = 0, stations: np.ndarray = None) -> None:
+    """
+    Compute again, in place, the rollups of a store from a day onwards, and detect its price events again.
+
+    The department rollups are computed again for every day when new stations add departments. Given the stations
+    whose prices changed, only the events that the changes may affect are detected again.
+
+    The files are updated in place, so the store must not be open by readers: update the copy of a PartitionUpdate.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - first_day (int): The index of the first day whose prices changed.
+    - stations (np.ndarray or None): The indexes of the stations whose prices changed, None to detect every event.
+    """
+    cube = load_cube(directory, mode="r+")
+    cube.rollups.update(cube.prices, first_day)
+    if isinstance(cube.rollups.values, np.memmap):
+        cube.rollups.values.flush()
+    else:
+        write_rollups(directory, cube.rollups)
+
+    metadata = read_metadata(directory)
+    _, departments = DepartmentRollups.departments_of(cube.postal_codes)
+    if departments == cube.department_rollups.departments and isinstance(cube.department_rollups.values, np.memmap):
+        cube.department_rollups.update(cube.prices, cube.postal_codes, first_day)
+        cube.department_rollups.values.flush()
+    else:
+        department_rollups = DepartmentRollups.from_prices(cube.prices, cube.fuel_types, cube.postal_codes)
+        # Unlink the previous file, which may be memory mapped by readers
+        if os.path.exists(os.path.join(directory, "department_rollups.bin")):
+            os.remove(os.path.join(directory, "department_rollups.bin"))
+        write_department_rollups(directory, department_rollups)
+        metadata["departments"] = department_rollups.departments
+        cube.department_rollups = department_rollups
+        stations = None
+
+    # Stores written before the price events detect every event
+    price_events = cube.detect_events(stations if "events" in metadata else None, first_day)
+    write_events(directory, price_events)
+    metadata["events"] = len(price_events)
+
+    # Rewrite the metadata so that readers watching it see that the data changed
+    write_metadata(directory, metadata)
+
+
+def load_cube(directory: str, mode: str = "r") -> PriceCube:
+    """
+    Open a binary data store as a PriceCube.
+
+    The prices and coordinates are memory mapped, so opening the store is near-instant and every process
+    reading it shares the same page cache.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - mode (str): The numpy.memmap mode, 'r' for read only or 'r+' to update in place.
+
+    Returns:
+    - PriceCube: The data of the store.
+    """
+    metadata = read_metadata(directory)
+    stations_len = metadata["stations"]
+    fuel_types = metadata["fuel_types"]
+
+    columns = {
+        column: open_array(os.path.join(directory, f"{column}.bin"), dtype, (stations_len,), mode)
+        for column, dtype in NUMERIC_COLUMNS.items()
+    }
+    for column in STRING_COLUMNS:
+        columns[column] = read_strings(directory, column, decode_json=column == "opening_hours")
+
+    rollups_file = os.path.join(directory, "rollups.bin")
+    rollups = None
+    if os.path.exists(rollups_file):
+        rollups = RollupTable(fuel_types, open_array(
+            rollups_file, ROLLUPS_DTYPE, (metadata["days"], len(fuel_types), len(RollupTable.STATS)), mode
+        ))
+
+    # Stores written before the department rollups compute them when loaded
+    department_rollups_file = os.path.join(directory, "department_rollups.bin")
+    department_rollups = None
+    if os.path.exists(department_rollups_file) and "departments" in metadata:
+        departments = metadata["departments"]
+        department_rollups = DepartmentRollups(fuel_types, departments, open_array(
+            department_rollups_file, ROLLUPS_DTYPE,
+            (len(departments), metadata["days"], len(fuel_types), len(RollupTable.STATS)), mode
+        ))
+
+    # Stores written before the price events detect them on first use
+    price_events = None
+    if os.path.exists(os.path.join(directory, "events.bin")) and "events" in metadata:
+        price_events = PriceEvents(
+            fuel_types,
+            open_array(os.path.join(directory, "events.bin"), EVENTS_DTYPE, (metadata["events"],)),
+            open_array(os.path.join(directory, "changes.bin"), "<i8", (metadata["days"], len(fuel_types), 2)),
+        )
+
+    return PriceCube(
+        fuel_types=fuel_types,
+        start_date=datetime.strptime(metadata["start_date"], "%Y-%m-%d"),
+        prices=open_array(
+            os.path.join(directory, "prices.bin"), PRICES_DTYPE, (stations_len, metadata["days"], len(fuel_types)), mode
+        ),
+        rollups=rollups,
+        department_rollups=department_rollups,
+        price_events=price_events,
+        **columns,
+    )
+
+
+def open_partition(directory: str, retries: int = OPEN_RETRIES, delay: float = OPEN_RETRY_DELAY) -> PriceCube:
+    """
+    Open a partition of a store for reading, waiting for an update being swapped in to complete.
+
+    PartitionUpdate.commit removes the metadata, replaces the files one by one and writes the metadata last: a
+    partition opened meanwhile has no metadata, or files of both versions. The partition is opened again until
+    its metadata is present and unchanged from before its files were opened to after.
+
+    Parameters:
+    - directory (str): The directory of the partition.
+    - retries (int): The number of attempts.
+    - delay (float): Seconds between two attempts.
+
+    Returns:
+    - PriceCube: The data of the partition.
+    """
+    metadata_file = os.path.join(directory, METADATA_FILE)
+    for attempt in range(retries):
+        try:
+            before = os.stat(metadata_file)
+            cube = load_cube(directory)
+            after = os.stat(metadata_file)
+            if (before.st_ino, before.st_mtime_ns) == (after.st_ino, after.st_mtime_ns):
+                return cube
+        except (FileNotFoundError, ValueError):
+            # No metadata, or files shorter than the metadata they were opened with
+            if attempt == retries - 1:
+                raise
+        time.sleep(delay)
+    raise RuntimeError(f"The partition {directory} changed while it was opened {retries} times")
+
+
+def append_stations(directory: str, stations: list, prices: list) -> None:
+    """
+    Append new gas stations to a store without rewriting the existing data.
+
+    The files are updated in place, so the store must not be open by readers: update the copy of a PartitionUpdate.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - stations (list[dict]): The details of the stations, with a key per column of the store.
+    - prices (list[np.ndarray]): The daily prices of each station, shaped (days, fuels).
+    """
+    if not stations:
+        return
+
+    metadata = read_metadata(directory)
+    stations_len = metadata["stations"]
+    row_size = metadata["days"] * len(metadata["fuel_types"]) * np.dtype(PRICES_DTYPE).itemsize
+
+    def append_bytes(file_name, expected_size, data):
+        with open(os.path.join(directory, file_name), "r+b") as outfile:
+            # Drop what an interrupted update may have left after the last complete station
+            outfile.truncate(expected_size)
+            outfile.seek(expected_size)
+            outfile.write(data)
+
+    append_bytes(
+        "prices.bin", stations_len * row_size,
+        b"".join(np.ascontiguousarray(row, dtype="<f4").tobytes() for row in prices)
+    )
+    for column, dtype in NUMERIC_COLUMNS.items():
+        dtype = np.dtype(dtype).newbyteorder("<")
+        append_bytes(
+            f"{column}.bin", stations_len * dtype.itemsize,
+            np.asarray([station.get(column) for station in stations], dtype=dtype).tobytes()
+        )
+    for column in STRING_COLUMNS:
+        append_strings(directory, column, [station.get(column) for station in stations], stations_len)
+
+    metadata["stations"] = stations_len + len(stations)
+    write_metadata(directory, metadata)
+
+
+def apply_price_changes(directory: str, changes: list) -> tuple:
+    """
+    Apply price changes to the stations of a store, in place.
+
+    Each change sets the price of a fuel from its day until the end of the day axis, so the changes must be
+    given in chronological order. Changes of unknown stations or fuels, or outside the day axis, are ignored.
+    The last day with data of the metadata is moved to the day of the last change. The rollups are not updated,
+    see refresh_rollups. The prices are updated in place, so the store must not be
+    open by readers: update the copy of a PartitionUpdate.
+
+    Parameters:
+    - directory (str): The directory of the store.
+    - changes (list[tuple]): The changes as (station ID, fuel type, date, price) tuples.
+
+    Returns:
+    - tuple: The number of changes applied, the index of the first day changed (None if nothing changed) and the
+      indexes of the changed stations.
+    """
+    cube = load_cube(directory, mode="r+")
+    if not changes or len(cube) == 0:
+        return 0, None, np.empty(0, dtype=np.int64)
+
+    order = np.argsort(cube.ids, kind="stable")
+    sorted_ids = cube.ids[order]
+    change_ids = np.array([change[0] for change in changes], dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_ids, change_ids), len(sorted_ids) - 1)
+    found = sorted_ids[positions] == change_ids
+    rows = order[positions]
+
+    applied = 0
+    first_day = None
+    changed = set()
+    for (station_id, fuel_type, date, price), row, is_found in zip(changes, rows, found):
+        day_index = cube.day_index(date)
+        if not is_found or fuel_type not in cube.fuel_types or not 0 <= day_index < cube.days_len:
+            continue
+        cube.prices[row, day_index:, cube.fuel_index(fuel_type)] = price
+        applied += 1
+        first_day = day_index if first_day is None else min(first_day, day_index)
+        changed.add(int(row))
+
+    cube.prices.flush()
+
+    # The prices after the last change are forward-filled until the next update
+    change_days = [day_index for day_index in (cube.day_index(change[2]) for change in changes) if 0 <= day_index < cube.days_len]
+    metadata = read_metadata(directory)
+    if change_days and max(change_days) > metadata.get("last_day", -1):
+        metadata["last_day"] = max(change_days)
+        write_metadata(directory, metadata)
+    return applied, first_day, np.array(sorted(changed), dtype=np.int64)
+
+
+class PartitionUpdate:
+    """
+    Update a partition on a private copy of its files, swapped in once complete.
+
+    Servers memory map the files of a partition, so its files are never modified where they are: the files to
+    write in place (PRICE_FILES for price changes, plus STATION_FILES for new stations) are copied to a staging
+    sub-directory, which append_stations, apply_price_changes and refresh_rollups update, and the others are only
+    hard linked there, at no I/O cost, as they are replaced by new files when written. The updated files are then
+    moved over those of the partition with os.replace. As with StoreWriter, the metadata is removed first and
+    written last, so the partition is only seen as complete once every file is swapped (see open_partition).
+    Readers holding the partition keep the previous files until they reload it.
+
+    Attributes:
+    - directory (str): The directory of the partition.
+    - staging (str): The directory of the copy to update.
+    - modified (set): The names of the files copied, None to copy every file.
+
+    Methods:
+    - commit(self): Move the updated files over those of the partition.
+    - discard(self): Remove the copy, leaving the partition unchanged.
+    """
+
+    def __init__(self, directory: str, modified: list = None):
+        self.directory = directory
+        self.staging = os.path.join(directory, STAGING_DIR)
+        self.modified = set(modified) if modified is not None else None
+
+        # Drop what an interrupted update may have left
+        if os.path.exists(self.staging):
+            shutil.rmtree(self.staging)
+        os.makedirs(self.staging)
+        for name in os.listdir(directory):
+            source, target = os.path.join(directory, name), os.path.join(self.staging, name)
+            if not os.path.isfile(source) or name.endswith(".tmp"):
+                continue
+            if self.modified is None or name in self.modified:
+                shutil.copyfile(source, target)
+                continue
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)  # File systems without hard links
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not os.path.exists(self.staging):
+            return
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def commit(self) -> None:
+        """
+        Move the updated files over those of the partition, the metadata last.
+        """
+        os.remove(os.path.join(self.directory, METADATA_FILE))
+        for name in os.listdir(self.staging):
+            staged, target = os.path.join(self.staging, name), os.path.join(self.directory, name)
+            if name == METADATA_FILE:
+                continue
+            if os.path.exists(target) and os.path.samefile(staged, target):
+                os.remove(staged)  # Unchanged, still linked to the file of the partition
+            else:
+                os.replace(staged, target)
+        os.replace(os.path.join(self.staging, METADATA_FILE), os.path.join(self.directory, METADATA_FILE))
+        os.rmdir(self.staging)
+
+    def discard(self) -> None:
+        """
+        Remove the copy, leaving the partition unchanged.
+        """
+        shutil.rmtree(self.staging)
+
+
+def partition_directory(directory: str, year: int) -> str:
+    """
+    Returns the directory of the partition of a year.
+
+    Parameters:
+    - directory (str): The root directory of the store.
+    - year (int): The year of the partition.
+
+    Returns:
+    - str: The directory of the partition.
+    """
+    return os.path.join(directory, str(year))
+
+
+def roll_over_partition(source_directory: str, directory: str, start_date: datetime, days_len: int) -> None:
+    """
+    Create a new partition holding the stations of a previous one, with their last known prices as initial prices.
+
+    Parameters:
+    - source_directory (str): The directory of the previous partition.
+    - directory (str): The directory of the new partition.
+    - start_date (datetime): The date of the first day of the new partition.
+    - days_len (int): The number of days of the new partition.
+    """
+    source = load_cube(source_directory)
+    # No day has data until the first update of the new partition
+    with StoreWriter(directory, source.fuel_types, start_date, days_len, last_day=-1) as writer:
+        for i in range(len(source)):
+            station = {column: getattr(source, column)[i] for column in list(NUMERIC_COLUMNS) + STRING_COLUMNS}
+            writer.append(station, np.broadcast_to(source.prices[i, -1, :], (days_len, len(source.fuel_types))))
+
+
+class DataStore:
+    """
+    Multi-year data store, partitioned by year, whose partitions are loaded lazily.
+
+    Each partition is a binary store in its own `<year>` sub-directory. Only the metadata of the partitions is
+    read when the store is opened, to index the dates they cover up to their last day with data (the prices of
+    a year being forward-filled to its end); a partition is memory mapped the first time
+    one of its dates is requested and the least recently used partitions are released beyond `max_partitions`.
+    A directory holding a single binary store (no year sub-directories) is used as a single partition.
+
+    Attributes:
+    - directory (str): The root directory of the store.
+    - max_partitions (int): Maximum number of partitions kept loaded.
+
+    Methods:
+    - from_cube(cls, cube: PriceCube): Build a store holding a single in-memory partition.
+    - locate(self, date: datetime): Returns the partition and the day offset of a date.
+    - partition(self, key): Returns the PriceCube of a partition, loading it if needed.
+    - cube_for(self, date: datetime): Returns the PriceCube holding a date and the index of the date in it.
+    - latest(self): Returns the PriceCube of the most recent partition with data.
+    - preload(self): Load the most recent partitions and build their indexes.
+    - version(self): Returns a value that changes whenever a partition is written.
+    """
+
+    def __init__(self, directory: str = None, max_partitions: int = 2):
+        self.directory = directory
+        self.max_partitions = max_partitions
+        self.loaded = OrderedDict()
+        self.lock = threading.Lock()
+        self.loaders = {}
+        self.bounds = []  # Sorted (first day ordinal, days with data, key) of every partition with data
+        self.metadata_files = []
+
+        if directory is None:
+            return
+        if os.path.exists(os.path.join(directory, METADATA_FILE)):
+            self._add(directory, read_metadata(directory))
+        elif os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                partition = os.path.join(directory, name)
+                if name.isdigit() and os.path.exists(os.path.join(partition, METADATA_FILE)):
+                    self._add(partition, read_metadata(partition))
+
+    def _add(self, partition: str, metadata: dict) -> None:
+        start_date = datetime.strptime(metadata["start_date"], "%Y-%m-%d")
+        key = start_date.year
+        self.metadata_files.append(os.path.join(partition, METADATA_FILE))
+        # Stores written before the last day have data for every day
+        days_len = metadata.get("last_day", metadata["days"] - 1) + 1
+        if days_len <= 0:
+            return
+        self.loaders[key] = lambda: open_partition(partition)
+        self.bounds.append((start_date.toordinal(), days_len, key))
+        self.bounds.sort()
+
+    @classmethod
+    def from_cube(cls, cube: PriceCube):
+        """
+        Build a store holding a single in-memory partition.
+
+        Parameters:
+        - cube (PriceCube): The data of the partition.
+
+        Returns:
+        - DataStore: The store.
+        """
+        store = cls()
+        key = cube.start_date.year
+        store.loaders[key] = lambda: cube
+        store.bounds.append((cube.start_date.toordinal(), cube.days_len, key))
+        return store
+
+    def __len__(self):
+        return len(self.bounds)
+
+    @property
+    def keys(self) -> list:
+        return [key for _, _, key in self.bounds]
+
+    @property
+    def min_date(self) -> datetime:
+        return datetime.fromordinal(self.bounds[0][0])
+
+    @property
+    def max_date(self) -> datetime:
+        first_day, days_len, _ = self.bounds[-1]
+        return datetime.fromordinal(first_day) + timedelta(days=days_len - 1)
+
+    def locate(self, date: datetime) -> tuple:
+        """
+        Returns the partition and the day offset of a date.
+
+        Dates before the first partition or after the last one are clamped to the closest day.
+
+        Parameters:
+        - date (datetime): The date.
+
+        Returns:
+        - tuple: The key of the partition and the index of the date in it.
+        """
+        ordinal = date.toordinal()
+        position = max(bisect_right(self.bounds, (ordinal, float("inf"))) - 1, 0)
+        first_day, days_len, key = self.bounds[position]
+        return key, min(max(ordinal - first_day, 0), days_len - 1)
+
+    def partition(self, key):
+        """
+        Returns the PriceCube of a partition, loading it if needed.
+
+        Parameters:
+        - key: The key (year) of the partition.
+
+        Returns:
+        - PriceCube: The data of the partition.
+        """
+        with self.lock:
+            if key in self.loaded:
+                self.loaded.move_to_end(key)
+                return self.loaded[key]
+
+            cube = self.loaders[key]()
+            self.loaded[key] = cube
+            # Callbacks still using an evicted partition keep their own reference to it
+            while len(self.loaded) > self.max_partitions:
+                self.loaded.popitem(last=False)
+            return cube
+
+    def cube_for(self, date: datetime) -> tuple:
+        """
+        Returns the PriceCube holding a date and the index of the date in it.
+
+        Parameters:
+        - date (datetime): The date.
+
+        Returns:
+        - tuple: The PriceCube and the day index of the date.
+        """
+        key, day_index = self.locate(date)
+        return self.partition(key), day_index
+
+    def latest(self) -> PriceCube:
+        """
+        Returns the PriceCube of the most recent partition with data.
+
+        Returns:
+        - PriceCube: The data of the partition.
+        """
+        return self.partition(self.bounds[-1][2])
+
+    def preload(self) -> list:
+        """
+        Load the most recent partitions, up to `max_partitions`, and build their indexes.
+
+        Called in the master process of a multi-worker server before it forks, so that the workers share the
+        loaded partitions (copy-on-write) instead of each loading and indexing its own copy.
+
+        Returns:
+        - list: The keys of the loaded partitions.
+        """
+        keys = self.keys[-self.max_partitions:]
+        for key in keys:
+            self.partition(key).build_indexes()
+        return keys
+
+    def version(self) -> tuple:
+        """
+        Returns a value that changes whenever a partition is written, based on the metadata files.
+
+        Returns:
+        - tuple: The modification times of the metadata files.
+        """
+        version = []
+        for metadata_file in self.metadata_files:
+            try:
+                version.append(os.stat(metadata_file).st_mtime_ns)
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+import functools
+import json
+import threading
+import time
+
+
+class FigureCache:
+    """
+    Bounded LRU cache of serialized Dash figures, keyed by callback name and inputs.
+
+    Figures are stored as JSON strings, so their size is known and cached values cannot be mutated by a caller.
+    The cache is bounded by a number of entries and optionally by a total size in bytes, entries can expire after
+    a time to live, and the whole cache is dropped when the version of the underlying dataset changes.
+
+    Attributes:
+    - max_entries (int): Maximum number of cached figures.
+    - max_bytes (int or None): Maximum total size of the cached figures in bytes, None for no limit.
+    - ttl (float or None): Time to live of an entry in seconds, None for no expiration.
+    - version (callable or None): Returns the current version of the dataset, compared on every lookup.
+    - hits (int): Number of lookups answered from the cache.
+    - misses (int): Number of lookups that had to build the figure.
+
+    Methods:
+    - get(self, key): Returns the cached figure of a key, or None.
+    - put(self, key, figure, generation: int = None): Cache a figure.
+    - invalidate(self): Drop every cached figure.
+    - memoize(self, name: str): Decorator caching the figures returned by a callback.
+    - stats(self): Returns the counters of the cache.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = None, ttl: float = None, version=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = version
+        self.entries = OrderedDict()  # key -> (expires_at, serialized figure)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+        self.current_version = None  # Read on the first lookup
+
+    def _check_version(self):
+        if self.version is None:
+            return
+        version = self.version()
+        if version != self.current_version:
+            if self.current_version is not None:
+                self._clear()
+            self.current_version = version
+
+    def _clear(self):
+        self.entries.clear()
+        self.size = 0
+        self.invalidations += 1
+
+    def _remove(self, key):
+        _, serialized = self.entries.pop(key)
+        self.size -= len(serialized)
+
+    def get(self, key):
+        """
+        Returns the cached figure of a key.
+
+        Parameters:
+        - key: The key of the figure.
+
+        Returns:
+        - dict or None: The figure, or None if it is not cached or expired.
+        """
+        with self.lock:
+            self._check_version()
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            serialized = entry[1]
+        return json.loads(serialized)
+
+    def put(self, key, figure, generation: int = None) -> None:
+        """
+        Cache a figure.
+
+        Parameters:
+        - key: The key of the figure.
+        - figure (plotly.graph_objects.Figure or dict): The figure.
+        - generation (int or None): The value of `invalidations` when the figure started being built; the figure
+          is not cached if the cache was invalidated since, as it may have been built from the previous data.
+        """
+        serialized = figure.to_json() if hasattr(figure, "to_json") else json.dumps(figure)
+        if self.max_bytes is not None and len(serialized) > self.max_bytes:
+            return
+
+        with self.lock:
+            if generation is not None and generation != self.invalidations:
+                return
+            if key in self.entries:
+                self._remove(key)
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self.entries[key] = (expires_at, serialized)
+            self.size += len(serialized)
+            while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.size > self.max_bytes):
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self) -> None:
+        """
+        Drop every cached figure.
+        """
+        with self.lock:
+            self._clear()
+
+    def memoize(self, name: str):
+        """
+        Decorator caching the figures returned by a callback, keyed by `name` and the callback arguments.
+
+        Parameters:
+        - name (str): The name of the callback.
+
+        Returns:
+        - callable: The decorator.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args):
+                key = (name,) + args
+                figure = self.get(key)
+                if figure is None:
+                    generation = self.invalidations
+                    figure = function(*args)
+                    self.put(key, figure, generation)
+                return figure
+            return wrapper
+        return decorator
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the cache.
+
+        Returns:
+        - dict: The number of hits, misses, invalidations, entries and bytes.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
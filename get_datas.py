@@ -1,41 +1,76 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
-import re
 import xml.etree.cElementTree as ET
 import zipfile
-from tqdm import tqdm
+from collections import deque
 import concurrent.futures
+import itertools
+import logging
+from tqdm import tqdm
 import requests
 from models.GasStation import GasStation
 from models.HoursRange import HoursRange
 from models.OpeningHours import OpeningHours
-import json
+from data_store import DataStore, PartitionUpdate, StoreWriter, append_stations, apply_price_changes, load_cube, partition_directory, refresh_rollups, roll_over_partition, METADATA_FILE, PRICE_FILES, STATION_FILES
+from name_cache import NameCache
+from name_fetcher import NAME_URL, NameFetcher
+from instrumentation import metrics
+from json_writer import JsonWriter
+import numpy as np
 
 
 GRAPH_DIR = "graph_data/"
+STORE_DIR = os.path.join(GRAPH_DIR, "store")
+NAME_CACHE_FILE = os.path.join(GRAPH_DIR, "names.sqlite")
+FUEL_TYPES = ["Gazole", "SP95", "E85", "E10", "SP98", "GPLc"]
+YEAR = 2023
 # Use a session to keep the connection alive and speed up the requests
 session = requests.Session()
-pattern = re.compile(r'<strong>(.*?)</strong>', re.DOTALL)
 
-def download_file() -> None:
+def get_year_bounds(year):
+    """
+    Returns the first day and the number of days of a year.
+
+    Parameters:
+    - year (int): The year.
+
+    Returns:
+    - tuple: The date of the first day and the number of days.
+
+    >>> get_year_bounds(2024)
+    (datetime.datetime(2024, 1, 1, 0, 0), 366)
+    """
+    start_date = datetime(year, 1, 1)
+    return start_date, (datetime(year + 1, 1, 1) - start_date).days
+
+def download_file(year=YEAR, extract=True) -> None:
     """
     Download the XML file from the government website and save it to disk.
 
+    Parameters:
+    - year (int): The year of the data.
+    - extract (bool): If False, keep the zip archive as is instead of extracting it.
+
     Returns:
-    - str: The file name of the downloaded XML file.
+    - str: The file name of the downloaded XML file (or of the zip archive if extract is False).
     """
     
-    file_name_zip = "PrixCarburants_annuel_2023.zip"
-    file_name_xml = "PrixCarburants_annuel_2023.xml"
-    url = "https://donnees.roulez-eco.fr/opendata/annee/2023"
+    file_name_zip = f"PrixCarburants_annuel_{year}.zip"
+    file_name_xml = f"PrixCarburants_annuel_{year}.xml"
+    url = f"https://donnees.roulez-eco.fr/opendata/annee/{year}"
     print("Downloading the file")
-    response = session.get(url)
+    with metrics.stage("download") as stage:
+        response = session.get(url)
+        if response.status_code == 200:
+            with open(file_name_zip, 'wb') as f:
+                f.write(response.content)
+            stage["items"] = len(response.content)  # Bytes downloaded
     if response.status_code == 200:
-        with open(file_name_zip, 'wb') as f:
-            f.write(response.content)
-        
+        if not extract:
+            return file_name_zip
+
         # Extract the contents of the zip file
-        with zipfile.ZipFile(file_name_zip, 'r') as zip_ref:
+        with metrics.stage("unzip"), zipfile.ZipFile(file_name_zip, 'r') as zip_ref:
             zip_ref.extractall()
         
         os.remove(file_name_zip)
@@ -43,41 +78,62 @@ def download_file() -> None:
         raise Exception("Error while downloading the file")
     return file_name_xml
 
-def get_name_station(id) -> str or None:
+def download_daily_file(date=None) -> str:
     """
-    Retrieve the name of a gas station using its ID.
+    Download the zip archive of the price changes of a day from the government website.
 
     Parameters:
-    - id (str): The ID of the gas station.
+    - date (datetime or None): The day, or None for the instant file holding the latest prices.
 
     Returns:
-    - str or None: The name of the gas station, or None if not found.
+    - str: The file name of the downloaded zip archive.
     """
     
-    try:
-        response = session.get(f"https://www.prix-carburants.gouv.fr/map/recuperer_infos_pdv/{id}", headers={"x-requested-with": "XMLHttpRequest"})
-        if response.status_code == 200:
-            html_content = response.text
-            
-            match = pattern.search(html_content)
-
-            if match:
-                strong_text = match.group(1)
-                return strong_text
-    except:
-        return None
+    if date is None:
+        file_name_zip = "PrixCarburants_instantane.zip"
+        url = "https://donnees.roulez-eco.fr/opendata/instantane"
+    else:
+        file_name_zip = f"PrixCarburants_quotidien_{date.strftime('%Y%m%d')}.zip"
+        url = f"https://donnees.roulez-eco.fr/opendata/jour/{date.strftime('%Y%m%d')}"
+    print("Downloading the file")
+    with metrics.stage("download") as stage:
+        response = session.get(url)
+        if response.status_code != 200:
+            raise Exception("Error while downloading the file")
+        with open(file_name_zip, 'wb') as f:
+            f.write(response.content)
+        stage["items"] = len(response.content)  # Bytes downloaded
+    return file_name_zip
 
-def get_station_name(station_id):
+def get_station_names(station_ids, fetcher, name_cache=None, refresh=False, progress=False):
     """
-    Wrapper function for retrieving the name of a gas station.
+    Retrieve the names of several gas stations, using the name cache when one is given.
+
+    Only the stations missing from the cache or whose entry expired are requested, unless refresh is True.
+    Stations whose request failed get a None name and are not cached, so they are requested again next time.
 
     Parameters:
-    - station_id (str): The ID of the gas station.
+    - station_ids (list[int]): The IDs of the gas stations.
+    - fetcher (NameFetcher): The asynchronous fetcher running the requests.
+    - name_cache (NameCache or None): The persistent cache of the names.
+    - refresh (bool): True to request every station again, ignoring the cache.
+    - progress (bool): True to display a progress bar of the requests.
 
     Returns:
-    - Tuple: A tuple containing the station ID and its name.
+    - list: A list of tuples containing the station ID and its name, in the order of station_ids.
     """
-    return station_id, get_name_station(station_id)
+    
+    with metrics.stage("name_fetch") as stage:
+        names = {} if name_cache is None or refresh else name_cache.get_many(station_ids)
+        to_fetch = [station_id for station_id in station_ids if station_id not in names]
+        stage["items"] = len(to_fetch)  # Names requested, the cached ones are free
+
+        fetched, _ = fetcher.fetch_names(to_fetch, progress=progress)
+
+        if name_cache is not None and fetched:
+            name_cache.set_many(fetched)
+    names.update(fetched)
+    return [(station_id, names.get(station_id)) for station_id in station_ids]
 
 def get_coordinate(angle: str, isLongitude: bool) -> float:
     """
@@ -109,20 +165,92 @@ def get_coordinate(angle: str, isLongitude: bool) -> float:
     return round(float(angle)/factor,5)
 
 
-def parse_data(file_name) -> None:
+def parse_station(pdv, station_id, name) -> GasStation or None:
+    """
+    Build a GasStation object from a <pdv> XML element.
+
+    Parameters:
+    - pdv (xml.etree.ElementTree.Element): The <pdv> element of the station.
+    - station_id (int): The ID of the gas station.
+    - name (str or None): The name of the gas station.
+
+    Returns:
+    - GasStation or None: The parsed gas station, or None if the element is incomplete.
+    """
+    
+    try:
+        address = pdv.find("adresse").text
+        latitude = get_coordinate(pdv.get("latitude"), 2)
+        longitude = get_coordinate(pdv.get("longitude"), 1)
+        postal_code = pdv.get("cp")
+        city = pdv.find("ville").text
+        opening_hours = None
+        is_always_open = False
+    except:
+        return None
+
+    horaires_element = pdv.find("horaires")
+    if horaires_element is not None:
+        is_always_open = horaires_element.get("automate-24-24") == "1"
+        days = {}
+        for day in horaires_element:
+            day_id = int(day.get("id"))
+            if day.get("ferme") == "1" or day.find("horaire") is None:
+                hours_range = None  # Closed on this day
+            else:
+                # Assuming that the format is HH:MM-HH:MM
+                opening_time = day.find("horaire").get("ouverture")
+                closing_time = day.find("horaire").get("fermeture")
+
+                start_time = datetime.strptime(opening_time, "%H.%M").time()
+                end_time = datetime.strptime(closing_time, "%H.%M").time()
+                hours_range = HoursRange(hour_start=start_time, hour_end=end_time)
+
+            days[day_id] = hours_range
+
+        opening_hours = OpeningHours(days)
+
+    gas_station = GasStation(
+        id=station_id,
+        name=name,
+        address=address,
+        latitude=latitude,
+        longitude=longitude,
+        postal_code=postal_code,
+        city=city,
+        is_always_open=is_always_open,
+        opening_hours=opening_hours,
+    )
+
+    # Parse fuel prices
+    for prix_element in pdv.findall("prix"):
+        if prix_element.attrib:
+            fuel_type = prix_element.get("nom")
+            price = float(prix_element.get("valeur"))
+            update_date = datetime.strptime(prix_element.get("maj"), "%Y-%m-%dT%H:%M:%S").toordinal()
+            gas_station.add_price(fuel_type, update_date, price)
+
+    return gas_station
+
+def parse_data(file_name, fetcher=None, name_cache=None, refresh_names=False) -> None:
     """
     Parse the XML file and extract information about gas stations.
 
     Parameters:
     - file_name (str): The name of the XML file.
+    - fetcher (NameFetcher or None): The fetcher of the station names, a default one if None.
+    - name_cache (NameCache or None): The persistent cache of the station names.
+    - refresh_names (bool): True to request every station name again, ignoring the cache.
 
     Returns:
     - list: List of GasStation objects.
     """
     
     print("Loading the file into memory")
-    tree = ET.parse(file_name)
-    root = tree.getroot()
+    with metrics.stage("xml_parse") as stage:
+        tree = ET.parse(file_name)
+        root = tree.getroot()
+        stage["items"] = len(root)
     print("Send API request for each station name")
     gas_stations = []
     count = 0
@@ -130,71 +258,14 @@ def parse_data(file_name) -> None:
     maxx = 99999 # For debug if needed
     station_ids = station_ids[:maxx]
     
-    with concurrent.futures.ThreadPoolExecutor(150) as executor:
-        station_names = list(tqdm(executor.map(get_station_name, station_ids), total=len(station_ids)))
+    station_names = get_station_names(station_ids, fetcher or NameFetcher(), name_cache, refresh_names, progress=True)
     
-    with tqdm(total=len(station_names), desc="Processing gas stations") as pbar:
+    with metrics.stage("model_build") as stage, tqdm(total=len(station_names), desc="Processing gas stations") as pbar:
         for pdv, (station_id, name) in zip(root, station_names):
-            try:
-                address = pdv.find("adresse").text
-                latitude = get_coordinate(pdv.get("latitude"), 2)
-                longitude = get_coordinate(pdv.get("longitude"), 1)
-                postal_code = pdv.get("cp")
-                city = pdv.find("ville").text
-                opening_hours = None
-                is_always_open = False
-                gas_price_history = {}
-            except:
+            gas_station = parse_station(pdv, station_id, name)
+            if gas_station is None:
                 continue
 
-            horaires_element = pdv.find("horaires")
-            if horaires_element is not None:
-                always_open = "automate-24-24" in horaires_element.attrib
-                days = {}
-                for day in horaires_element:
-                    day_id = int(day.get("id"))
-                    if day.get("ferme") == "1" or day.find("horaire") is None:
-                        hours_range = None  # Closed on this day
-                    else:
-                        # Assuming that the format is HH:MM-HH:MM
-                        opening_time = day.find("horaire").get("ouverture")
-                        closing_time = day.find("horaire").get("fermeture")
-
-                        start_time = datetime.strptime(opening_time, "%H.%M").time()
-                        end_time = datetime.strptime(closing_time, "%H.%M").time()
-                        hours_range = HoursRange(hour_start=start_time, hour_end=end_time)
-
-                    days[day_id] = hours_range
-
-                opening_hours = OpeningHours(days)
-
-            is_always_open = always_open
-
-            # Parse fuel prices
-            for prix_element in pdv.findall("prix"):
-                if prix_element.attrib:
-                    fuel_type = prix_element.get("nom")
-                    price = float(prix_element.get("valeur"))
-                    update_date = str(datetime.strptime(prix_element.get("maj"), "%Y-%m-%dT%H:%M:%S").strftime("%Y-%m-%d"))
-
-                    if fuel_type not in gas_price_history:
-                        gas_price_history[fuel_type] = {}
-
-                    gas_price_history[fuel_type][update_date] = price
-
-            gas_station = GasStation(
-                id=station_id,
-                name=name,
-                address=address,
-                latitude=latitude,
-                longitude=longitude,
-                postal_code=postal_code,
-                city=city,
-                is_always_open=is_always_open,
-                opening_hours=opening_hours,
-                gas_price_history=gas_price_history,
-            )
-
             gas_stations.append(gas_station)
 
             # For debug if needed
@@ -203,79 +274,460 @@ def parse_data(file_name) -> None:
                 break
             
             pbar.update(1) 
+        stage["items"] = len(gas_stations)
 
     return gas_stations
 
-def create_json(gas_stations):
+def iter_pdv_elements(file_name):
+    """
+    Incrementally read the <pdv> elements of a PrixCarburants zip archive.
+
+    The XML file is streamed straight out of the archive (nothing is extracted to disk)
+    and every element is detached from the document root once yielded, so memory stays
+    flat whatever the size of the file. The consumer is expected to call `clear()` on
+    each element once it has been processed.
+
+    Parameters:
+    - file_name (str): The name of the zip archive (or of an already extracted XML file).
+
+    Returns:
+    - generator: Yields xml.etree.ElementTree.Element objects, one per <pdv>.
+    """
+    
+    if zipfile.is_zipfile(file_name):
+        archive = zipfile.ZipFile(file_name, 'r')
+        xml_name = next(name for name in archive.namelist() if name.lower().endswith(".xml"))
+        xml_file = archive.open(xml_name)
+    else:
+        archive = None
+        xml_file = open(file_name, 'rb')
+
+    try:
+        root = None
+        for event, element in ET.iterparse(xml_file, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = element
+                continue
+
+            if element.tag == "pdv":
+                yield element
+                # Drop the reference held by the root so the element can be freed
+                root.clear()
+    finally:
+        xml_file.close()
+        if archive is not None:
+            archive.close()
+
+def iter_stations(file_name, batch_size=1000, fetcher=None, name_cache=None, refresh_names=False):
+    """
+    Stream the gas stations of a PrixCarburants archive.
+
+    Stations are read in batches of `batch_size` <pdv> elements: the names of a batch are
+    fetched concurrently, then the batch is turned into GasStation objects and yielded
+    before the next one is read.
+
+    Parameters:
+    - file_name (str): The name of the zip archive (or of an already extracted XML file).
+    - batch_size (int): Number of <pdv> elements held in memory at once.
+    - fetcher (NameFetcher or None): The fetcher of the station names, a default one if None.
+    - name_cache (NameCache or None): The persistent cache of the station names.
+    - refresh_names (bool): True to request every station name again, ignoring the cache.
+
+    Returns:
+    - generator: Yields GasStation objects in file order.
+    """
+    
+    fetcher = fetcher or NameFetcher()
+
+    def process_batch(batch):
+        station_ids = [station_id for station_id, _ in batch]
+        station_names = get_station_names(station_ids, fetcher, name_cache, refresh_names)
+        gas_stations = []
+        with metrics.stage("model_build", items=len(batch)):
+            for (station_id, pdv), (_, name) in zip(batch, station_names):
+                gas_station = parse_station(pdv, station_id, name)
+                pdv.clear()
+                if gas_station is not None:
+                    gas_stations.append(gas_station)
+        return gas_stations
+
+    pdv_elements = iter_pdv_elements(file_name)
+    with tqdm(desc="Streaming gas stations") as pbar:
+        while True:
+            # The stages are closed before yielding, so the time of the consumer is not counted in them
+            with metrics.stage("xml_parse") as stage:
+                batch = [(int(pdv.get("id")), pdv) for pdv in itertools.islice(pdv_elements, batch_size)]
+                stage["items"] = len(batch)
+            if not batch:
+                break
+            yield from process_batch(batch)
+            pbar.update(len(batch))
+
+def parse_station_chunk(chunk):
+    """
+    Parse a chunk of serialized <pdv> elements, in a worker process.
+
+    Parameters:
+    - chunk (list[bytes]): The <pdv> elements serialized as XML.
+
+    Returns:
+    - list: The GasStation objects (without name), None for the incomplete elements.
+    """
+    
+    stations = []
+    for data in chunk:
+        pdv = ET.fromstring(data)
+        stations.append(parse_station(pdv, int(pdv.get("id")), None))
+    return stations
+
+def parse_stations_parallel(file_name, workers=None, chunk_size=500, fetcher=None, name_cache=None, refresh_names=False):
+    """
+    Parse the gas stations of a PrixCarburants file across a pool of processes.
+
+    The <pdv> elements are read incrementally and sent to the workers in chunks of `chunk_size`. A bounded
+    number of chunks is in flight at a time and the results are collected in submission order, so the
+    stations are yielded in file order whatever the number of workers. Names are fetched per chunk.
+
+    Parameters:
+    - file_name (str): The name of the zip archive (or of an already extracted XML file).
+    - workers (int or None): Number of worker processes, the number of CPUs if None.
+    - chunk_size (int): Number of <pdv> elements sent to a worker at once.
+    - fetcher (NameFetcher or None): The fetcher of the station names, a default one if None.
+    - name_cache (NameCache or None): The persistent cache of the station names.
+    - refresh_names (bool): True to request every station name again, ignoring the cache.
+
+    Returns:
+    - generator: Yields GasStation objects in file order.
+    """
+    
+    fetcher = fetcher or NameFetcher()
+
+    def chunks():
+        pdv_elements = iter_pdv_elements(file_name)
+        while True:
+            with metrics.stage("xml_parse") as stage:
+                chunk = []
+                for pdv in itertools.islice(pdv_elements, chunk_size):
+                    chunk.append(ET.tostring(pdv))
+                    pdv.clear()
+                stage["items"] = len(chunk)
+            if not chunk:
+                return
+            yield chunk
+
+    def with_names(stations):
+        stations = [gas_station for gas_station in stations if gas_station is not None]
+        station_names = get_station_names([gas_station.id for gas_station in stations], fetcher, name_cache, refresh_names)
+        for gas_station, (_, name) in zip(stations, station_names):
+            gas_station.name = name
+        return stations
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = 2 * workers
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        in_flight = deque()
+        with tqdm(desc="Processing gas stations") as pbar:
+            for chunk in chunks():
+                in_flight.append(executor.submit(parse_station_chunk, chunk))
+                if len(in_flight) >= max_in_flight:
+                    # Only the wait for the workers is measured, their CPU time is not in this process
+                    with metrics.stage("model_build") as stage:
+                        stations = in_flight.popleft().result()
+                        stage["items"] = len(stations)
+                    pbar.update(len(stations))
+                    yield from with_names(stations)
+
+            while in_flight:
+                with metrics.stage("model_build") as stage:
+                    stations = in_flight.popleft().result()
+                    stage["items"] = len(stations)
+                pbar.update(len(stations))
+                yield from with_names(stations)
+
+def create_json(gas_stations, year=YEAR, compact=False, compress=False):
     """
     Create a JSON file from the information about gas stations.
 
+    The prices are given for every day of the year, forward-filled from each change (0 before the first known
+    price). In compact mode, only the (day index, price) change points of each fuel are written instead. The first
+    day and number of days of the date axis are given at the top level, with the list of dates for daily prices.
+    The stations are written one at a time (see JsonWriter), so memory does not depend on their number.
+
     Parameters:
-    - gas_stations (list): List of GasStation objects.
+    - gas_stations (iterable): List or generator of GasStation objects.
+    - year (int): The year of the data.
+    - compact (bool): True to write the change points instead of the daily prices.
+    - compress (bool): True to write a gzip compressed data.json.gz file.
+
+    Returns:
+    - str: The path of the JSON file.
     """
     
-    current_datetime = datetime.now()
-    date_strings = [(current_datetime - timedelta(days=day_number)).strftime("%Y-%m-%d") for day_number in range(365, 0, -1)]
-    result_json = {"stations": []}
-    with tqdm(total=len(gas_stations), desc="Saving to JSON gas stations") as pbar:
-        for gas_station in gas_stations:
-            
-            station_json = {
-                "id": gas_station.id,
-                "name": gas_station.name,
-                "address": gas_station.address,
-                "latitude": gas_station.latitude,
-                "longitude": gas_station.longitude,
-                "postal_code": gas_station.postal_code,
-                "city": gas_station.city,
-                "is_always_open": gas_station.is_always_open,
-                "opening_hours": gas_station.opening_hours.serialize() if gas_station.opening_hours else None,  # Serialize the OpeningHours object
-                "carburants": {},
-                "opening_dates": date_strings,
-            }
-
-            for fuel_type, price_history in gas_station.gas_price_history.items():
-                station_json["carburants"][fuel_type] = []
-
-                for date_key in date_strings:
-
-                    # Check if the date is in the price history
-                    if date_key in price_history:
-                        price = price_history[date_key]
-                    else:
-                        # If the date is not in the history, use the previous value or 0 if there is no previous value
-                        price = station_json["carburants"][fuel_type][-1] if station_json["carburants"][fuel_type] else 0
-
-                    station_json["carburants"][fuel_type].append(price)
-
-            result_json["stations"].append(station_json)
-            pbar.update(1)
-
-    # Check if the folder exist
-    if not os.path.exists(GRAPH_DIR):
-        os.makedirs(GRAPH_DIR)
-
-    # Save to file
-    with open(os.path.join(GRAPH_DIR, 'data.json'), 'w') as outfile:
-        json.dump(result_json, outfile)
+    start_date, days_len = get_year_bounds(year)
+    file_name = json_file_name(compress)
+    total = len(gas_stations) if hasattr(gas_stations, '__len__') else None
+    # The time spent reading a generator of stations is counted in its own stages
+    with metrics.stage("serialize_json") as stage, JsonWriter(file_name, start_date, days_len, compact) as writer:
+        for gas_station in tqdm(gas_stations, total=total, desc="Saving to JSON gas stations"):
+            writer.append(gas_station)
+        stage["items"] = writer.stations_len
+    return file_name
+
+def json_file_name(compress=False, year=None):
+    """
+    Returns the path of the JSON export.
 
+    Parameters:
+    - compress (bool): True for the gzip compressed file.
+    - year (int or None): The year of the data, to export several years to their own files.
+
+    Returns:
+    - str: The path of data.json or data.json.gz, data_<year>.json(.gz) for a given year.
+    """
+    
+    name = f'data_{year}.json' if year is not None else 'data.json'
+    return os.path.join(GRAPH_DIR, name + '.gz' if compress else name)
+
+
+def get_price_row(gas_station, fuel_types, start_date, days_len):
+    """
+    Build the daily prices of a gas station, forward-filling each price until the next change.
+
+    Parameters:
+    - gas_station (GasStation): The gas station.
+    - fuel_types (list[str]): The fuel types, in the order of the columns.
+    - start_date (datetime): The date of the first day.
+    - days_len (int): The number of days.
+
+    Returns:
+    - np.ndarray: The prices shaped (days, fuels), NaN when no price is known yet.
+    """
+    
+    prices = np.full((days_len, len(fuel_types)), np.nan, dtype=np.float32)
+    start_ordinal = start_date.toordinal()
+    for fuel_type in gas_station.prices:
+        if fuel_type not in fuel_types:
+            continue
+        column = fuel_types.index(fuel_type)
+        for day, price in zip(*gas_station.price_changes(fuel_type)):
+            day_index = day - start_ordinal
+            if day_index < days_len:
+                # A change before the first day sets the initial price
+                prices[max(day_index, 0):, column] = price
+    return prices
+
+def create_store(gas_stations, year=YEAR, directory=STORE_DIR, fuel_types=FUEL_TYPES):
+    """
+    Create the partition of a year of the binary data store read by main.py from the information about gas stations.
+
+    Parameters:
+    - gas_stations (iterable): List or generator of GasStation objects.
+    - year (int): The year of the data.
+    - directory (str): The root directory of the store.
+    - fuel_types (list[str]): The fuel types to store.
+    """
+    
+    start_date, days_len = get_year_bounds(year)
+    total = len(gas_stations) if hasattr(gas_stations, '__len__') else None
+    last_ordinal = start_date.toordinal() - 1
+    with metrics.stage("serialize") as stage, StoreWriter(partition_directory(directory, year), fuel_types, start_date, days_len) as writer:
+        for gas_station in tqdm(gas_stations, total=total, desc="Saving to the data store"):
+            writer.append(station_to_row(gas_station), get_price_row(gas_station, fuel_types, start_date, days_len))
+            last_ordinal = max([last_ordinal] + [max(days) for days, _ in gas_station.prices.values() if len(days)])
+        # The prices after the last change of the file are forward-filled to the end of the year
+        writer.last_day = min(last_ordinal - start_date.toordinal(), days_len - 1)
+        stage["items"] = writer.stations_len
+
+def station_to_row(gas_station):
+    """
+    Convert a GasStation object to the columns of the data store.
+
+    Parameters:
+    - gas_station (GasStation): The gas station.
+
+    Returns:
+    - dict: The details of the station, with a key per column of the store.
+    """
+    
+    return {
+        "ids": gas_station.id,
+        "names": gas_station.name,
+        "addresses": gas_station.address,
+        "latitudes": gas_station.latitude,
+        "longitudes": gas_station.longitude,
+        "postal_codes": gas_station.postal_code,
+        "cities": gas_station.city,
+        "is_always_open": gas_station.is_always_open,
+        "opening_hours": gas_station.opening_hours.serialize() if gas_station.opening_hours else None,
+    }
+
+def create_partition(year, directory=STORE_DIR):
+    """
+    Create the partition of a year from the most recent earlier partition, or an empty one if there is none.
+
+    Parameters:
+    - year (int): The year of the partition.
+    - directory (str): The root directory of the store.
+    """
+    
+    start_date, days_len = get_year_bounds(year)
+    previous_years = [key for key in DataStore(directory).keys if key < year]
+    if previous_years:
+        roll_over_partition(partition_directory(directory, previous_years[-1]), partition_directory(directory, year), start_date, days_len)
+    else:
+        with StoreWriter(partition_directory(directory, year), FUEL_TYPES, start_date, days_len, last_day=-1):
+            pass
+
+def update_store(file_name, directory=STORE_DIR, fetcher=None, name_cache=None):
+    """
+    Merge a daily (or instant) price file into an existing data store.
+
+    Only the price changes of the file are written in the partition of their year, and the stations missing from
+    a partition are appended to it, on a copy of the partition swapped in once complete (see PartitionUpdate). The
+    partition of a new year is created from the previous one when its first changes come in.
+
+    Parameters:
+    - file_name (str): The name of the zip archive (or XML file) in the PrixCarburants schema.
+    - directory (str): The root directory of the store.
+    - fetcher (NameFetcher or None): The fetcher of the names of the new stations, a default one if None.
+    - name_cache (NameCache or None): The persistent cache of the station names.
+
+    Returns:
+    - tuple: The number of price changes applied and the number of stations added.
+    """
+    
+    gas_stations = []
+    changes = {}
+    with metrics.stage("model_build") as stage:
+        for pdv in tqdm(iter_pdv_elements(file_name), desc="Reading the price changes"):
+            gas_station = parse_station(pdv, int(pdv.get("id")), None)
+            pdv.clear()
+            if gas_station is None:
+                continue
+            gas_stations.append(gas_station)
+            for fuel_type in gas_station.prices:
+                for day, price in zip(*gas_station.price_changes(fuel_type)):
+                    date = datetime.fromordinal(day)
+                    changes.setdefault(date.year, []).append((gas_station.id, fuel_type, date, price))
+        stage["items"] = len(gas_stations)
+
+    applied = 0
+    added = {}
+    for year in sorted(changes):
+        partition = partition_directory(directory, year)
+        if not os.path.exists(os.path.join(partition, METADATA_FILE)):
+            create_partition(year, directory)
+
+        cube = load_cube(partition)
+        known_ids = set(cube.ids.tolist())
+        year_ids = {change[0] for change in changes[year]}
+        new_stations = [gas_station for gas_station in gas_stations if gas_station.id in year_ids and gas_station.id not in known_ids]
+
+        if new_stations:
+            missing = [gas_station.id for gas_station in new_stations if gas_station.id not in added]
+            added.update(get_station_names(missing, fetcher or NameFetcher(), name_cache))
+            for gas_station in new_stations:
+                gas_station.name = added[gas_station.id]
+
+        # The partition is updated on a copy of the files to write, swapped in once its rollups are written: a
+        # server reading it sees either the previous or the new data
+        modified = PRICE_FILES + STATION_FILES if new_stations else PRICE_FILES
+        with metrics.stage("serialize", items=len(changes[year])), PartitionUpdate(partition, modified) as update:
+            price_rows = [get_price_row(gas_station, cube.fuel_types, cube.start_date, cube.days_len) for gas_station in new_stations]
+            if new_stations:
+                append_stations(update.staging, [station_to_row(gas_station) for gas_station in new_stations], price_rows)
+            year_applied, first_day, changed = apply_price_changes(update.staging, changes[year])
+            applied += year_applied
+
+            # Price changes change the aggregates from their day onwards, and new stations from their first price,
+            # as they have no price before it
+            for row, prices in enumerate(price_rows, start=len(cube)):
+                priced_days = np.flatnonzero(~np.isnan(prices).all(axis=1))
+                if len(priced_days):
+                    first_day = int(priced_days[0]) if first_day is None else min(first_day, int(priced_days[0]))
+                    changed = np.union1d(changed, [row])
+            if first_day is None and new_stations:
+                # Stations without a price of a known fuel only change the departments
+                first_day = cube.days_len - 1
+            if first_day is not None:
+                refresh_rollups(update.staging, first_day, changed)
+            else:
+                update.discard()
+    return applied, len(added)
 
 if __name__ == "__main__":
     """
     Main block for executing the download, parsing, and JSON creation process.
     """
     
+    import argparse
     import doctest
     doctest.testmod()
+
+    parser = argparse.ArgumentParser(description="Download and prepare the gas stations data.")
+    parser.add_argument("--year", type=int, nargs="+", default=[YEAR], help="Years of the data to download")
+    parser.add_argument("--stream", action="store_true", help="Stream the stations straight from the zip archive instead of loading the whole XML file")
+    parser.add_argument("--workers", type=int, default=0, help="Parse the stations with this many processes (0 to parse in the main process)")
+    parser.add_argument("--json", action="store_true", help="Also export the data to graph_data/data.json (data_<year>.json for each of several years)")
+    parser.add_argument("--json-compact", action="store_true", help="Write only the price changes of each fuel in data.json instead of the daily prices")
+    parser.add_argument("--json-gzip", action="store_true", help="Compress the JSON export with gzip, to graph_data/data.json.gz")
+    parser.add_argument("--refresh-names", action="store_true", help="Request every station name again instead of only the missing or expired ones")
+    parser.add_argument("--no-name-cache", action="store_true", help="Do not use the persistent station name cache")
+    parser.add_argument("--daily", type=lambda value: datetime.strptime(value, "%Y-%m-%d"), metavar="YYYY-MM-DD", help="Merge the price changes of this day into the existing data store")
+    parser.add_argument("--instant", action="store_true", help="Merge the latest price changes into the existing data store")
+    parser.add_argument("--names-url", default=NAME_URL, help="URL template of the station name endpoint, with an {id} placeholder")
+    parser.add_argument("--metrics-log", metavar="FILE", help="Append the measures of every stage to this file, as JSON lines")
+    parser.add_argument("--concurrency", type=int, default=50, help="Maximum number of station name requests in flight")
+    parser.add_argument("--rate", type=float, default=None, help="Maximum number of station name requests per second")
+    parser.add_argument("--retries", type=int, default=3, help="Maximum number of retries of a failed station name request")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Timeout in seconds of a station name request")
+    args = parser.parse_args()
+
+    if args.metrics_log:
+        # One JSON line per completed stage
+        metrics_handler = logging.FileHandler(args.metrics_log)
+        metrics_handler.setFormatter(logging.Formatter("%(message)s"))
+        logging.getLogger("carburenta.metrics").addHandler(metrics_handler)
+        logging.getLogger("carburenta.metrics").setLevel(logging.INFO)
     
     from time import perf_counter
     debut = perf_counter()
     
-    file_name = download_file()
-    gas_stations = parse_data(file_name)
-    create_json(gas_stations)
+    name_cache = None if args.no_name_cache else NameCache(NAME_CACHE_FILE)
+    fetcher = NameFetcher(args.names_url, concurrency=args.concurrency, rate=args.rate, retries=args.retries, timeout=args.timeout)
+
+    if args.daily or args.instant:
+        file_name = download_daily_file(None if args.instant else args.daily)
+        applied, added = update_store(file_name, fetcher=fetcher, name_cache=name_cache)
+        os.remove(file_name)
+        print(f"{applied} price changes applied, {added} stations added")
+    else:
+        for year in args.year:
+            if args.workers:
+                file_name = download_file(year, extract=not args.stream)
+                gas_stations = parse_stations_parallel(file_name, args.workers, fetcher=fetcher, name_cache=name_cache, refresh_names=args.refresh_names)
+            elif args.stream:
+                file_name = download_file(year, extract=False)
+                gas_stations = iter_stations(file_name, fetcher=fetcher, name_cache=name_cache, refresh_names=args.refresh_names)
+            else:
+                file_name = download_file(year)
+                gas_stations = parse_data(file_name, fetcher=fetcher, name_cache=name_cache, refresh_names=args.refresh_names)
+
+            if args.json:
+                # Write the JSON file in the same pass as the store, without keeping the stations in memory. Each
+                # year has its own file when there are several
+                json_file = json_file_name(args.json_gzip, year if len(args.year) > 1 else None)
+                with JsonWriter(json_file, *get_year_bounds(year), compact=args.json_compact) as json_writer:
+                    create_store(json_writer.write_through(gas_stations), year)
+            else:
+                create_store(gas_stations, year)
+
+    if name_cache is not None:
+        name_cache.close()
+    print(f"Station names: {fetcher.stats}")
+    print(metrics.format_stages())
 
     fin = perf_counter()
     print(f"Temps d'exécution : {fin - debut}s")
     
-    
\ No newline at end of file
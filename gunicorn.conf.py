@@ -0,0 +1,40 @@
+# Settings of `gunicorn wsgi:server`, every value can be overridden on the command line
+import multiprocessing
+import os
+import time
+
+
+bind = os.environ.get("BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("THREADS", 2))
+# Load the app and its data once in the master process, the workers share it
+preload_app = True
+timeout = 60
+
+
+def when_ready(server):
+    # The workers do not watch the store: a worker reloading it after the fork would hold its own copy of the new
+    # partitions instead of sharing them. The master only checks the store from a thread and sends itself HUP when
+    # it is written; on_reload then loads it before the new workers are forked.
+    import signal
+    import threading
+    from main import store_watcher
+
+    def watch():
+        signalled = None
+        while True:
+            time.sleep(store_watcher.interval)
+            state = store_watcher.pending()
+            if state is not None and state != signalled:
+                signalled = state
+                os.kill(os.getpid(), signal.SIGHUP)
+
+    threading.Thread(target=watch, name="store-watcher", daemon=True).start()
+
+
+def on_reload(server):
+    # Called in the master on HUP, before it forks the new workers: load the new store here so that they share it
+    import gc
+    from main import store_watcher
+    store_watcher.check()
+    gc.freeze()
@@ -0,0 +1,374 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+logger = logging.getLogger("carburenta.metrics")
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def current_rss() -> int:
+    """
+    Returns the resident memory of the process in kilobytes, or None if it cannot be read.
+    """
+    try:
+        with open("/proc/self/statm") as infile:
+            return int(infile.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def private_rss() -> int:
+    """
+    Returns the resident memory of the process that is not shared with other processes in kilobytes, or None if it
+    cannot be read. Pages of memory mapped files and pages inherited from a fork and not written since are shared.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as infile:
+            return sum(int(line.split()[1]) for line in infile if line.startswith(("Private_Clean:", "Private_Dirty:")))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss() -> int:
+    """
+    Returns the peak resident memory of the process in kilobytes, or None if it cannot be read.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # Bytes on macOS, kilobytes on Linux
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak resident memory tracked by the kernel to the current one, see peak_rss_since_reset. Only
+    available on Linux, peak_rss (the peak of the whole life of the process) is not affected.
+
+    Returns:
+    - bool: True if the peak was reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as outfile:
+            outfile.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_since_reset() -> int:
+    """
+    Returns the peak resident memory of the process since the last reset_peak_rss in kilobytes, or None if it
+    cannot be read.
+    """
+    try:
+        with open("/proc/self/status") as infile:
+            for line in infile:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def max_known(*values):
+    """
+    Returns the largest of values that may be None.
+
+    >>> max_known(None, 3, 2), max_known(None, None)
+    (3, None)
+    """
+    known = [value for value in values if value is not None]
+    return max(known) if known else None
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies with fixed buckets.
+
+    Attributes:
+    - counts (list[int]): The number of observations of each bucket of LATENCY_BUCKETS, plus the unbounded one.
+    - count (int): The number of observations.
+    - total (float): The sum of the observations in seconds.
+    - maximum (float): The largest observation in seconds.
+
+    Methods:
+    - observe(self, seconds: float): Add an observation.
+    - quantile(self, q: float): Returns the upper bound of the bucket holding a quantile.
+    - to_dict(self): Returns the histogram as a dict.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """
+        Add an observation.
+
+        Parameters:
+        - seconds (float): The latency in seconds.
+        """
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the upper bound of the bucket holding a quantile, the largest observation for the last bucket.
+
+        Parameters:
+        - q (float): The quantile, between 0 and 1.
+
+        Returns:
+        - float or None: The upper bound in seconds, None without observations.
+
+        >>> histogram = LatencyHistogram()
+        >>> for seconds in (0.003, 0.02, 0.02, 0.3):
+        ...     histogram.observe(seconds)
+        >>> histogram.quantile(0.5), histogram.quantile(1.0)
+        (0.025, 0.5)
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.maximum
+        return self.maximum
+
+    def to_dict(self) -> dict:
+        """
+        Returns the histogram as a dict.
+
+        Returns:
+        - dict: The buckets (upper bound in seconds -> count, 'inf' for the last one), count, sum, max and quantiles.
+        """
+        return {
+            "buckets": {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ("inf",), self.counts)},
+            "count": self.count,
+            "sum_seconds": round(self.total, 6),
+            "max_seconds": round(self.maximum, 6),
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+        }
+
+
+class Metrics:
+    """
+    Registry of the timings of the stages of the ingestion and of the latencies of the Dash callbacks.
+
+    A stage records its wall time, CPU time, item count and the highest resident memory of the process while it
+    ran (on Linux, the peak tracked by the kernel is reset when a stage starts); a stage entered several times
+    accumulates, keeping the highest memory of its runs. Stages may be nested, the time spent in an inner stage is only
+    counted in the inner one, so the stages of a generator pipeline (reading, name requests, parsing, writing)
+    are measured separately even though they interleave. The memory of an outer stage includes that of its inner
+    stages, and being that of the whole process, it also counts what other threads allocate meanwhile. Every
+    completed stage is also logged as a JSON line
+    on the 'carburenta.metrics' logger.
+
+    Attributes:
+    - stages (dict): The totals of each stage, by name.
+    - callbacks (dict[str, LatencyHistogram]): The latencies of each callback, by name.
+
+    Methods:
+    - stage(self, name: str, items: int = None): Context manager measuring a stage.
+    - observe(self, name: str, seconds: float): Add a latency to the histogram of a callback.
+    - timed(self, name: str): Decorator measuring the latency of a callback.
+    - snapshot(self): Returns every measure as a dict.
+    - format_stages(self): Returns the stages as a text table.
+    - render_prometheus(self, gauges: dict = None): Returns the measures in the Prometheus text format.
+    - reset(self): Drop every measure.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.callbacks = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def _stack(self) -> list:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def stage(self, name: str, items: int = None):
+        """
+        Context manager measuring a stage.
+
+        The yielded dict holds the item count of the stage in 'items', which can be set once it is known.
+        A stage must not be left open across a `yield` of a generator.
+
+        Parameters:
+        - name (str): The name of the stage.
+        - items (int or None): The number of items processed, if known beforehand.
+        """
+        stack = self._stack()
+        wall, cpu = time.perf_counter(), time.process_time()
+        if stack:
+            stack[-1]["wall"] += wall - stack[-1]["wall_resumed"]
+            stack[-1]["cpu"] += cpu - stack[-1]["cpu_resumed"]
+            # Keep the peak of the outer stage so far, before resetting it for this one
+            stack[-1]["max_rss"] = max_known(stack[-1]["max_rss"], peak_rss_since_reset())
+        running = {"wall": 0.0, "cpu": 0.0, "wall_resumed": wall, "cpu_resumed": cpu, "items": items, "max_rss": None}
+        running["tracked"] = reset_peak_rss()
+        stack.append(running)
+        try:
+            yield running
+        finally:
+            wall, cpu = time.perf_counter(), time.process_time()
+            running["wall"] += wall - running["wall_resumed"]
+            running["cpu"] += cpu - running["cpu_resumed"]
+            stack.pop()
+            if stack:
+                stack[-1]["wall_resumed"], stack[-1]["cpu_resumed"] = wall, cpu
+            # Without a reset, the peak of the kernel may come from before the stage
+            max_rss = max_known(running["max_rss"], peak_rss_since_reset()) if running["tracked"] else None
+            self._record(name, running["wall"], running["cpu"], running["items"], max_rss)
+
+    def _record(self, name: str, wall: float, cpu: float, items: int, max_rss: int) -> None:
+        with self.lock:
+            totals = self.stages.setdefault(name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "items": 0, "max_rss_kb": None})
+            totals["calls"] += 1
+            totals["wall_seconds"] += wall
+            totals["cpu_seconds"] += cpu
+            totals["items"] += items or 0
+            totals["max_rss_kb"] = max_known(totals["max_rss_kb"], max_rss)
+        logger.info(json.dumps({
+            "event": "stage", "stage": name, "wall_seconds": round(wall, 6), "cpu_seconds": round(cpu, 6),
+            "items": items, "max_rss_kb": max_rss,
+        }))
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Add a latency to the histogram of a callback.
+
+        Parameters:
+        - name (str): The name of the callback.
+        - seconds (float): The latency in seconds.
+        """
+        with self.lock:
+            self.callbacks.setdefault(name, LatencyHistogram()).observe(seconds)
+
+    def timed(self, name: str):
+        """
+        Decorator measuring the latency of a callback.
+
+        Parameters:
+        - name (str): The name of the callback.
+
+        Returns:
+        - callable: The decorator.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict:
+        """
+        Returns every measure as a dict.
+
+        Returns:
+        - dict: The stages, the callback histograms and the current and peak resident memory in kilobytes.
+        """
+        with self.lock:
+            return {
+                "stages": {
+                    name: dict(totals, wall_seconds=round(totals["wall_seconds"], 6), cpu_seconds=round(totals["cpu_seconds"], 6))
+                    for name, totals in self.stages.items()
+                },
+                "callbacks": {name: histogram.to_dict() for name, histogram in self.callbacks.items()},
+                "rss_kb": current_rss(),
+                "peak_rss_kb": peak_rss(),
+            }
+
+    def format_stages(self) -> str:
+        """
+        Returns the stages as a text table.
+
+        Returns:
+        - str: One line per stage with its wall time, CPU time, item count and highest memory.
+        """
+        lines = [f"{'stage':<16} {'wall (s)':>10} {'cpu (s)':>10} {'items':>10} {'max RSS (MB)':>13}"]
+        for name, totals in self.snapshot()["stages"].items():
+            max_rss = f"{totals['max_rss_kb'] / 1024:.1f}" if totals["max_rss_kb"] is not None else "-"
+            lines.append(f"{name:<16} {totals['wall_seconds']:>10.3f} {totals['cpu_seconds']:>10.3f} {totals['items']:>10} {max_rss:>13}")
+        return "\n".join(lines)
+
+    def render_prometheus(self, gauges: dict = None) -> str:
+        """
+        Returns the measures in the Prometheus text format.
+
+        Parameters:
+        - gauges (dict or None): Additional values by group, e.g. {'figure_cache': {'hits': 3}} gives a
+          carburenta_figure_cache_hits gauge.
+
+        Returns:
+        - str: The measures.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for field, kind in (("calls", "counter"), ("wall_seconds", "counter"), ("cpu_seconds", "counter"), ("items", "counter"), ("max_rss_kb", "gauge")):
+            lines.append(f"# TYPE carburenta_stage_{field} {kind}")
+            for name, totals in snapshot["stages"].items():
+                if totals[field] is not None:
+                    lines.append(f'carburenta_stage_{field}{{stage="{name}"}} {totals[field]}')
+
+        lines.append("# TYPE carburenta_callback_latency_seconds histogram")
+        for name, histogram in snapshot["callbacks"].items():
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == "inf" else bound
+                lines.append(f'carburenta_callback_latency_seconds_bucket{{callback="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'carburenta_callback_latency_seconds_sum{{callback="{name}"}} {histogram["sum_seconds"]}')
+            lines.append(f'carburenta_callback_latency_seconds_count{{callback="{name}"}} {histogram["count"]}')
+
+        for field in ("rss_kb", "peak_rss_kb"):
+            if snapshot[field] is not None:
+                lines.append(f"# TYPE carburenta_process_{field} gauge")
+                lines.append(f"carburenta_process_{field} {snapshot[field]}")
+
+        for group, values in (gauges or {}).items():
+            for field, value in values.items():
+                lines.append(f"# TYPE carburenta_{group}_{field} gauge")
+                lines.append(f"carburenta_{group}_{field} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """
+        Drop every measure.
+        """
+        with self.lock:
+            self.stages.clear()
+            self.callbacks.clear()
+
+
+# Registry of the process, shared by get_datas.py and main.py
+metrics = Metrics()
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+import gzip
+import json
+import os
+import numpy as np
+from models.PriceHistory import PriceHistory
+
+
+def station_to_json(gas_station, start_date: datetime, days_len: int, compact: bool = False) -> dict:
+    """
+    Convert a GasStation object to its entry in data.json.
+
+    Parameters:
+    - gas_station (GasStation): The gas station.
+    - start_date (datetime): The date of the first day.
+    - days_len (int): The number of days.
+    - compact (bool): True to give the change points of each fuel instead of the daily prices.
+
+    Returns:
+    - dict: The details of the station and its prices, by fuel type.
+    """
+    station_json = {
+        "id": gas_station.id,
+        "name": gas_station.name,
+        "address": gas_station.address,
+        "latitude": gas_station.latitude,
+        "longitude": gas_station.longitude,
+        "postal_code": gas_station.postal_code,
+        "city": gas_station.city,
+        "is_always_open": gas_station.is_always_open,
+        "opening_hours": gas_station.opening_hours.serialize() if gas_station.opening_hours else None,  # Serialize the OpeningHours object
+        "carburants": {},
+    }
+
+    for fuel_type in gas_station.prices:
+        days, prices = PriceHistory.change_points(*gas_station.price_changes(fuel_type), start_date, days_len)
+
+        if compact:
+            station_json["carburants"][fuel_type] = {"days": days.tolist(), "prices": prices.tolist()}
+        else:
+            # Each price holds until the next change, 0 if there is no previous value
+            daily_prices = [0] * (days[0] if len(days) else days_len)
+            for day_index, next_day, price in zip(days, np.append(days[1:], days_len), prices.tolist()):
+                daily_prices.extend([price] * int(next_day - day_index))
+            station_json["carburants"][fuel_type] = daily_prices
+    return station_json
+
+
+class JsonWriter:
+    """
+    Write a data.json file one gas station at a time.
+
+    The date axis is written once at the top level (first day, number of days and, for daily prices, the list of
+    dates), then each station is serialized as it comes, so memory does not depend on the number of stations. The
+    file is written under a temporary name and renamed when closed, readers never see a partial file. A file name
+    ending with '.gz' is compressed with gzip.
+
+    Attributes:
+    - file_name (str): The path of the JSON file.
+    - start_date (datetime): The date of the first day.
+    - days_len (int): The number of days.
+    - compact (bool): True to write the change points of each fuel instead of the daily prices.
+    - stations_len (int): The number of stations written.
+
+    Methods:
+    - append(self, gas_station): Write a gas station.
+    - write_through(self, gas_stations): Write the gas stations of an iterable while yielding them.
+    - close(self): End the file and move it to its name.
+    """
+
+    def __init__(self, file_name: str, start_date: datetime, days_len: int, compact: bool = False):
+        self.file_name = file_name
+        self.start_date = start_date
+        self.days_len = days_len
+        self.compact = compact
+        self.stations_len = 0
+
+        directory = os.path.dirname(file_name)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.temp_file = file_name + ".tmp"
+        if file_name.endswith(".gz"):
+            self.outfile = gzip.open(self.temp_file, "wt", encoding="utf-8", compresslevel=6)
+        else:
+            self.outfile = open(self.temp_file, "w", encoding="utf-8")
+
+        self.outfile.write(f'{{"start_date": {json.dumps(start_date.strftime("%Y-%m-%d"))}, "days": {days_len}, ')
+        if not compact:
+            dates = [(start_date + timedelta(days=day_number)).strftime("%Y-%m-%d") for day_number in range(days_len)]
+            self.outfile.write(f'"dates": {json.dumps(dates)}, ')
+        self.outfile.write('"stations": [')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.outfile.close()
+            os.remove(self.temp_file)
+
+    def append(self, gas_station) -> None:
+        """
+        Write a gas station.
+
+        Parameters:
+        - gas_station (GasStation): The gas station.
+        """
+        if self.stations_len:
+            self.outfile.write(",")
+        self.outfile.write("\n" + json.dumps(station_to_json(gas_station, self.start_date, self.days_len, self.compact)))
+        self.stations_len += 1
+
+    def write_through(self, gas_stations):
+        """
+        Write the gas stations of an iterable while yielding them, to write the file in the same pass as another
+        output.
+
+        Parameters:
+        - gas_stations (iterable): List or generator of GasStation objects.
+
+        Returns:
+        - generator: Yields the gas stations once written.
+        """
+        for gas_station in gas_stations:
+            self.append(gas_station)
+            yield gas_station
+
+    def close(self) -> None:
+        """
+        End the file and move it to its name.
+        """
+        self.outfile.write("\n]}\n")
+        self.outfile.close()
+        os.replace(self.temp_file, self.file_name)
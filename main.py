@@ -1,11 +1,42 @@
-from datetime import timedelta, datetime
-from dash import Dash, html, dcc, callback, Output, Input
+from datetime import datetime
+import hashlib
+import os
+from dash import Dash, html, dcc, callback, ctx, Output, Input, Patch, State
+from dash.exceptions import MissingCallbackContextException
+from flask import Response, jsonify, request
 import plotly.express as px
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+from models.GridBins import GridBins, cell_size_for_zoom
+from models.OpeningHoursIndex import parse_minutes
+from models.PriceCube import PriceCube
+from api import create_api
+from data_store import DataStore
+from figure_cache import FigureCache
+from instrumentation import metrics
+from store_watcher import StoreWatcher
+
+STORE_DIR = "graph_data/store"
 
 app = Dash(__name__)
 
+# Figures already built for the same inputs, dropped when the data store is written
+figure_cache = FigureCache(max_entries=512, max_bytes=256 * 1024 * 1024, ttl=3600, version=lambda: data_store.version())
+
+@app.server.route('/metrics')
+def get_metrics():
+    """
+    Expose the latencies of the callbacks, the counters of the figure cache and the memory of the process.
+
+    Returns:
+    - Response: The measures in the Prometheus text format, or as JSON with '?format=json'.
+    """
+    
+    if request.args.get('format') == 'json':
+        return jsonify(dict(metrics.snapshot(), figure_cache=figure_cache.stats()))
+    return Response(metrics.render_prometheus({'figure_cache': figure_cache.stats()}), mimetype='text/plain; version=0.0.4')
+
 def get_piechart(selected_stations):
     """
     Generate a pie chart displaying the distribution of stations by brand.
@@ -17,35 +48,11 @@ def get_piechart(selected_stations):
     - fig: Plotly figure object representing the pie chart.
     """
     
-    station_names = {}
+    # The brands are numbered by decreasing number of stations, the top X are the first X of the index
+    brands, counts = data_store.latest().brand_index.top(selected_stations)
+    df = pd.DataFrame({'name': brands, 'count': counts})
 
-    for station in heatmap_dataframe['stations']:
-        if station['name'] in station_names:
-            station_names[station['name']] += 1
-        else:
-            station_names[station['name']] = 1
-
-    df = pd.DataFrame(
-        {
-            'name': list(station_names.keys()),
-            'count': list(station_names.values())
-        }
-    )
-    
-    # Sort the dataframe by count in descending order
-    df = df.sort_values(by='count', ascending=False)
-    
-
-    # Limit the dataframe to the top X rows
-    df = df.head(selected_stations)
-
-    df['hover_text'] = (
-        'Nom de la marque: ' + df['name'] +
-        '<br>Nombre de stations: ' + df['count'].astype(str)
-    )
-
-    fig = px.pie(df, names='name', values='count', title='Distribution des stations par marque',
-                 hover_data=['hover_text'], hover_name='name')
+    fig = px.pie(df, names='name', values='count', title='Distribution des stations par marque')
 
     # Update the hover template
     fig.update_traces(
@@ -57,6 +64,8 @@ def get_piechart(selected_stations):
     Output('piechartNameStations', 'figure'),
     [Input('stations-dropdown', 'value')]
 )
+@metrics.timed('piechartNameStations')
+@figure_cache.memoize('piechartNameStations')
 def update_piechart(selected_stations):
     """
     Update the pie chart based on the selected number of top stations.
@@ -74,6 +83,8 @@ def update_piechart(selected_stations):
     Output('piechartPriceStations', 'figure'),
     [Input('date-picker', 'date')]
 )
+@metrics.timed('piechartPriceStations')
+@figure_cache.memoize('piechartPriceStations')
 def update_piechart(selected_date):
     """
     Update the pie chart based on the selected date.
@@ -86,23 +97,14 @@ def update_piechart(selected_date):
     """
     
     selected_date = datetime.strptime(selected_date, "%Y-%m-%d")
-    selected_price_index = (selected_date - datetime(2023, 1, 1)).days
+    price_cube, selected_price_index = data_store.cube_for(selected_date)
 
-    gas_average_prices = [0] * len(fuel_types)
-    stations_lens = [0] * len(fuel_types)
-
-    for station in heatmap_dataframe['stations']:
-        for i in range(len(fuel_types)):
-            if fuel_types[i] in station['carburants']:
-                stations_lens[i] += 1
-                gas_average_prices[i] += station['carburants'][fuel_types[i]][selected_price_index]
-
-    for i in range(len(fuel_types)):
-        gas_average_prices[i] /= stations_lens[i]
+    # Average of every fuel over the stations with a known price on this day, precomputed at ingest
+    gas_average_prices = price_cube.rollups.day('mean', selected_price_index)
 
     df = pd.DataFrame(
         {
-            'carburant': fuel_types,
+            'carburant': price_cube.fuel_types,
             'prix': gas_average_prices
         }
     )
@@ -110,38 +112,26 @@ def update_piechart(selected_date):
     fig = px.pie(df, values='prix', names='carburant', title=f'Prix moyen des carburants le {selected_date.strftime("%Y-%m-%d")}')
     return fig
 
-@app.callback(
-    Output('histogram', 'figure'),
-    [Input('fuel-dropdown', 'value')]
-)
-def update_histogram(selected_fuel):
+@figure_cache.memoize('histogram')
+def get_histogram(selected_fuel, partition):
     """
-    Update the histogram based on the selected fuel type.
+    Generate the histogram of the daily average prices of a fuel over a year partition.
 
     Parameters:
     - selected_fuel (str): Selected fuel type.
+    - partition (int): Key (year) of the partition of the data store.
 
     Returns:
-    - fig: Plotly figure object representing the updated histogram.
+    - fig: Plotly figure object representing the histogram.
     """
     
-    # create a histogram of average values for each day
-    prices_len = len(heatmap_dataframe['stations'][0]['carburants'][selected_fuel])
-    average_prices = [0] * prices_len
-    stations_len = 0
-
-    for station in heatmap_dataframe['stations']:
-        if selected_fuel in station['carburants']:
-            stations_len += 1
-            for i in range(prices_len):
-                average_prices[i] += station['carburants'][selected_fuel][i]
+    price_cube = data_store.partition(partition)
 
-    for i in range(prices_len):
-        average_prices[i] /= stations_len
+    # create a histogram of average values for each day
+    average_prices = price_cube.rollups.series('mean', selected_fuel)
 
     # Convert the day index to date
-    start_date = datetime(2023, 1, 1)  # Assuming the data starts on January 1, 2023
-    date_labels = [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(prices_len)]
+    date_labels = price_cube.dates()
 
     df = pd.DataFrame(
         {
@@ -151,137 +141,468 @@ def update_histogram(selected_fuel):
     )
 
     fig = px.bar(df, x="date", y="price",
-                 title=f'Histogramme des prix du {selected_fuel}',
+                 title=f'Histogramme des prix du {selected_fuel} en {price_cube.start_date.year}',
                  labels={'price': 'Prix moyen (€)', 'date': 'Date'})
 
     return fig
 
-# Define callback to update the heatmap based on dropdown and slider values
 @app.callback(
-    Output('heatmap', 'figure'),
+    Output('histogram', 'figure'),
     [Input('fuel-dropdown', 'value'), Input('date-picker', 'date')]
 )
-def update_heatmap(selected_fuel, selected_date):
+@metrics.timed('histogram')
+def update_histogram(selected_fuel, selected_date):
     """
-    Update the heatmap based on the selected fuel type and date.
+    Update the histogram based on the selected fuel type, over the year of the selected date.
 
     Parameters:
     - selected_fuel (str): Selected fuel type.
     - selected_date (str): Selected date in the format 'YYYY-MM-DD'.
 
     Returns:
-    - fig: Plotly figure object representing the updated heatmap.
+    - fig: Plotly figure object representing the updated histogram.
     """
     
-    # Convert the selected date to the corresponding index
-    selected_date = datetime.strptime(selected_date, "%Y-%m-%d")
-    selected_price_index = (selected_date - datetime(2023, 1, 1)).days
+    # The histogram only depends on the year of the date, cache it per partition
+    partition, _ = data_store.locate(datetime.strptime(selected_date, "%Y-%m-%d"))
+    return get_histogram(selected_fuel, partition)
+
+@app.callback(
+    Output('events', 'figure'),
+    [Input('fuel-dropdown', 'value'), Input('date-picker', 'date')]
+)
+@metrics.timed('events')
+def update_events(selected_fuel, selected_date):
+    """
+    Update the timeline of the price changes and anomalies, over the year of the selected date.
+
+    Parameters:
+    - selected_fuel (str): Selected fuel type.
+    - selected_date (str): Selected date in the format 'YYYY-MM-DD'.
+
+    Returns:
+    - fig: Plotly figure object representing the daily number of price increases, decreases and anomalies.
+    """
     
-    # Display the least expensive stations on a density heatmap
-    # This is a density heatmap, so you can't adjust the color according to price.
-    # We don't show all the stations because the map is too similar on any given day.
+    partition, _ = data_store.locate(datetime.strptime(selected_date, "%Y-%m-%d"))
+    return get_events(selected_fuel, partition)
+
+@figure_cache.memoize('events')
+def get_events(selected_fuel, partition):
+    """
+    Generate the timeline of the price changes and anomalies of a fuel over a year partition.
+
+    Parameters:
+    - selected_fuel (str): Selected fuel type.
+    - partition (int): Key (year) of the partition of the data store.
+
+    Returns:
+    - fig: Plotly figure object representing the timeline.
+    """
     
-    average_price = 0.0
-    stations_len = 0
+    price_cube = data_store.partition(partition)
+    price_events = price_cube.price_events
+    changes = price_events.changes[:, price_cube.fuel_index(selected_fuel)]
 
-    for station in heatmap_dataframe['stations']:
-        if selected_fuel in station['carburants']:
-            stations_len += 1
-            average_price += station['carburants'][selected_fuel][selected_price_index]
+    df = pd.DataFrame({'date': price_cube.dates(), 'Hausses': changes[:, 0], 'Baisses': -changes[:, 1]})
+    for kind, label in (('JUMP', 'Sauts de prix'), ('NEIGHBORHOOD', 'Prix anormaux du département'), ('INVALID', 'Prix impossibles')):
+        df[label] = price_events.daily_counts(kind, selected_fuel)
 
-    average_price /= stations_len
+    fig = px.bar(df, x='date', y=['Hausses', 'Baisses'],
+                 title=f'Changements et anomalies des prix du {selected_fuel} en {price_cube.start_date.year}',
+                 labels={'value': 'Nombre de changements', 'date': 'Date', 'variable': ''})
+    for label in ('Sauts de prix', 'Prix anormaux du département', 'Prix impossibles'):
+        fig.add_trace(go.Scatter(x=df['date'], y=df[label], name=label, mode='lines', yaxis='y2'))
+    fig.update_layout(barmode='relative', yaxis2=dict(title="Nombre d'anomalies", overlaying='y', side='right'))
 
-    stations = []
+    return fig
 
-    for station in heatmap_dataframe['stations']:
-        if selected_fuel in station['carburants']:
-            if station['carburants'][selected_fuel][selected_price_index] <= average_price:
-                stations.append(station)
+@app.callback(
+    Output('departments', 'figure'),
+    [Input('fuel-dropdown', 'value'), Input('date-picker', 'date')]
+)
+@metrics.timed('departments')
+@figure_cache.memoize('departments')
+def update_departments(selected_fuel, selected_date):
+    """
+    Update the comparison of the prices of the departments, for the selected fuel type and date.
 
-    # Create a dataframe like a CSV with latitude, longitude, price, and opening_hours columns for each station
-    df = pd.DataFrame({
-        'latitude': [station['latitude'] for station in stations],
-        'longitude': [station['longitude'] for station in stations],
-        'price': [station['carburants'][selected_fuel][selected_price_index] for station in stations],
-        'opening_hours': [
-            f"{hours['hour_start']} - {hours['hour_end']}" if isinstance(hours, dict) and 'hour_start' in hours and 'hour_end' in hours else 'Non disponible'
-            for hours in [station.get('opening_hours', {}) for station in stations]
-        ],
-        'id': [station['id'] for station in stations],
-        'name': [station['name'] for station in stations],  # Add the station name
-        'address': [station.get('address', 'Non disponible') for station in stations],  # Add the address
-        'postal_code': [station.get('postal_code', 'Non disponible') for station in stations],  # Add the postal code
-        'city': [station.get('city', 'Non disponible') for station in stations],  # Add the city
-    })   
-    df = df.query('price != 0')  # Remove stations with no price
+    Parameters:
+    - selected_fuel (str): Selected fuel type.
+    - selected_date (str): Selected date in the format 'YYYY-MM-DD'.
+
+    Returns:
+    - fig: Plotly figure object representing the median price of each department, from the 10th to the 90th percentile.
+    """
     
-    # Update the figure using Plotly Express
-    hover_text = (
-        'Nom de la station: ' + df['name'] +
-        '<br>Adresse: ' + df['address'] +
-        '<br>Code postal: ' + df['postal_code'] +
-        '<br>Ville: ' + df['city'] +
-        '<br>Horaires d\'ouverture: ' + df['opening_hours'].apply(lambda x: f"{x['hour_start']} - {x['hour_end']}" if isinstance(x, dict) and 'hour_start' in x and 'hour_end' in x else 'Non disponible') +
-        '<br>Prix du carburant: ' + df['price'].astype(str)
-    )
+    selected_date = datetime.strptime(selected_date, "%Y-%m-%d")
+    price_cube, selected_price_index = data_store.cube_for(selected_date)
+    department_rollups = price_cube.department_rollups
+
+    df = pd.DataFrame({
+        'department': department_rollups.departments,
+        'count': department_rollups.day('count', selected_fuel, selected_price_index),
+        'median': department_rollups.day('p50', selected_fuel, selected_price_index),
+        'p10': department_rollups.day('p10', selected_fuel, selected_price_index),
+        'p90': department_rollups.day('p90', selected_fuel, selected_price_index),
+    }).dropna(subset=['median']).sort_values(by='median')
+
+    fig = px.scatter(df, x='department', y='median',
+                     error_y=df['p90'] - df['median'], error_y_minus=df['median'] - df['p10'],
+                     hover_data={'count': True, 'p10': ':.3f', 'p90': ':.3f'},
+                     title=f'Prix médian du {selected_fuel} par département (du 10e au 90e centile)',
+                     labels={'department': 'Département', 'median': 'Prix médian (€)', 'count': 'Nombre de stations'})
+    fig.update_xaxes(type='category')
 
-    fig = px.density_mapbox(df,
-                            lat='latitude',
-                            lon='longitude',
-                            z='price',
-                            radius=6,
-                            center=dict(lat=46.939, lon=2.945),
-                            zoom=4,
-                            mapbox_style="open-street-map",
-                            title=f'Moitié des stations avec le prix du {selected_fuel} le plus bas',
-                            hover_name='id',
-                            labels={'price': 'Prix moyen (€)'},
-                            hover_data={'latitude': False, 'longitude': False, 'price': True, 'id': True,
-                                        'name': True, 'opening_hours': True, 'address': True,
-                                        'postal_code': True, 'city': True, 'opening_hours': True},
-                            custom_data=['latitude', 'longitude']
-                            )
     return fig
 
+def get_open_stations(price_cube, selected_date, open_filter, open_time):
+    """
+    Select the stations open on the weekday of the selected date at the selected time.
+
+    Parameters:
+    - price_cube (PriceCube): The data of the partition of the selected date.
+    - selected_date (datetime): Selected date.
+    - open_filter (str): 'open' to keep only the open stations, 'all' to keep every station.
+    - open_time (str): Selected time in the format 'HH:MM'.
+
+    Returns:
+    - np.ndarray: A boolean mask, True for the stations to display.
+    """
+    
+    minute = parse_minutes(open_time)
+    if open_filter != 'open' or minute is None:
+        return np.ones(len(price_cube), dtype=bool)
+    return price_cube.opening_hours_index.open_at(selected_date.isoweekday(), minute)
+
+def only_date_changed():
+    """
+    Returns whether the running callback was triggered by the date picker alone.
+
+    Returns:
+    - bool: True if only the date changed, False otherwise or outside of a callback.
+    """
+    
+    try:
+        return set(ctx.triggered_prop_ids) == {'date-picker.date'}
+    except MissingCallbackContextException:
+        return False
+
+def points_key(latitudes, longitudes):
+    """
+    Returns a short fingerprint of the locations of the points of a trace.
+
+    Parameters:
+    - latitudes (np.ndarray): Latitudes of the points.
+    - longitudes (np.ndarray): Longitudes of the points.
+
+    Returns:
+    - str: The fingerprint.
+    """
+    
+    digest = hashlib.sha1(np.asarray(latitudes, dtype=np.float64).tobytes())
+    digest.update(np.asarray(longitudes, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+def patch_figure(figure, fields):
+    """
+    Build a partial update of a figure already displayed, replacing only some fields of its traces.
+
+    Parameters:
+    - figure (plotly.graph_objects.Figure or dict): The new figure.
+    - fields (dict): The fields to replace by trace index, e.g. {0: ['marker.color', 'text']}.
+
+    Returns:
+    - Patch: The partial update.
+    """
+    
+    data = (figure.to_dict() if hasattr(figure, 'to_dict') else figure)['data']
+    patch = Patch()
+    for index, paths in fields.items():
+        for path in paths:
+            *parents, name = path.split('.')
+            value, target = data[index], patch['data'][index]
+            for parent in parents:
+                value, target = value.get(parent, {}), target[parent]
+            target[name] = value.get(name)
+    return patch
+
+def figure_points(figure):
+    """
+    Returns the fingerprint of the points of a figure built by get_heatmap or get_markersmap.
+
+    Parameters:
+    - figure (plotly.graph_objects.Figure or dict): The figure.
+
+    Returns:
+    - str: The fingerprint, stored in the meta of its layout.
+    """
+    
+    layout = figure.layout.to_plotly_json() if hasattr(figure, 'layout') else figure['layout']
+    return layout['meta']['points']
+
+def get_map_view(relayout_data):
+    """
+    Extract the zoom level and the visible area of a map from its relayoutData.
+
+    Parameters:
+    - relayout_data (dict or None): The relayoutData of the map graph.
+
+    Returns:
+    - tuple: The zoom level and the (south, west, north, east) bounds of the view, None before the first move.
+    """
+    
+    relayout_data = relayout_data or {}
+    zoom = relayout_data.get('mapbox.zoom', HEATMAP_ZOOM)
+    coordinates = (relayout_data.get('mapbox._derived') or {}).get('coordinates')
+    if not coordinates:
+        return zoom, None
+    longitudes, latitudes = zip(*coordinates)
+    return zoom, (min(latitudes), min(longitudes), max(latitudes), max(longitudes))
+
+# Define callback to update the heatmap based on dropdown and slider values
 @app.callback(
-    Output('markersmap', 'figure'),
-    [Input('fuel-dropdown', 'value'), Input('date-picker', 'date')]
+    [Output('heatmap', 'figure'), Output('heatmap-points', 'data')],
+    [Input('fuel-dropdown', 'value'), Input('date-picker', 'date'),
+     Input('open-filter', 'value'), Input('open-time', 'value'),
+     Input('heatmap-mode', 'value'), Input('heatmap', 'relayoutData')],
+    [State('heatmap-points', 'data')]
 )
-def update_markersmap(selected_fuel, selected_date):
+@metrics.timed('heatmap')
+def update_heatmap(selected_fuel, selected_date, open_filter, open_time, heatmap_mode='cells', relayout_data=None, displayed_points=None):
     """
-    Update the scatter map based on the selected fuel type and date.
+    Update the heatmap based on the selected fuel type, date, opening time and on the view of the map.
 
     Parameters:
     - selected_fuel (str): Selected fuel type.
     - selected_date (str): Selected date in the format 'YYYY-MM-DD'.
+    - open_filter (str): 'open' to keep only the stations open at `open_time`, 'all' to keep every station.
+    - open_time (str): Selected time in the format 'HH:MM'.
+    - heatmap_mode (str): 'cells' to aggregate the stations per zone until zoomed in, 'stations' to show them all.
+    - relayout_data (dict or None): The relayoutData of the heatmap, giving its zoom level and visible area.
+    - displayed_points (str or None): The fingerprint of the points of the displayed heatmap.
 
     Returns:
-    - fig: Plotly figure object representing the updated scatter map.
+    - tuple: The updated heatmap, as a Plotly figure or as a partial update when only the date changed, and the
+      fingerprint of its points.
     """
     
+    if heatmap_mode != 'cells':
+        zoom, bounds = None, None
+    else:
+        zoom, bounds = get_heatmap_view(relayout_data)
+    fig = get_heatmap(selected_fuel, selected_date, open_filter, open_time, zoom, bounds)
+    points = figure_points(fig)
+
+    # Scrubbing through the dates keeps the layout of the map, only the values of its points are sent
+    if only_date_changed():
+        fields = ['z', 'customdata', 'hovertext']
+        if points != displayed_points:
+            fields += ['lat', 'lon']
+        return patch_figure(fig, {0: fields}), points
+    return fig, points
+
+def get_heatmap_view(relayout_data):
+    """
+    Returns the zoom level and the area of the heatmap to aggregate, rounded so that close views share their figure.
+
+    Parameters:
+    - relayout_data (dict or None): The relayoutData of the heatmap.
+
+    Returns:
+    - tuple: The zoom level, at most DETAIL_ZOOM, and the (south, west, north, east) bounds, None for every station.
+    """
+    
+    zoom, bounds = get_map_view(relayout_data)
+    zoom = int(np.clip(np.floor(zoom), 0, DETAIL_ZOOM))
+    if bounds is not None:
+        # Round the view outwards, with a margin, so that small moves are served from the figure cache
+        step = cell_size_for_zoom(zoom, HEATMAP_CELL_PIXELS) * 8
+        south, west, north, east = bounds
+        bounds = tuple(float(value) for value in (
+            np.floor(south / step) * step - step, np.floor(west / step) * step - step,
+            np.ceil(north / step) * step + step, np.ceil(east / step) * step + step,
+        ))
+    return zoom, bounds
+
+@figure_cache.memoize('heatmap')
+def get_heatmap(selected_fuel, selected_date, open_filter, open_time, zoom, bounds):
+    """
+    Generate the heatmap of the least expensive stations, aggregated into zones below DETAIL_ZOOM.
+
+    Parameters:
+    - selected_fuel (str): Selected fuel type.
+    - selected_date (str): Selected date in the format 'YYYY-MM-DD'.
+    - open_filter (str): 'open' to keep only the stations open at `open_time`, 'all' to keep every station.
+    - open_time (str): Selected time in the format 'HH:MM'.
+    - zoom (int or None): Zoom level setting the size of the zones, None to show every station.
+    - bounds (tuple or None): The (south, west, north, east) area to show, None for every station.
+
+    Returns:
+    - fig: Plotly figure object representing the heatmap.
+    """
+    
+    # Convert the selected date to the corresponding index
     selected_date = datetime.strptime(selected_date, "%Y-%m-%d")
-    selected_price_index = (selected_date - datetime(2023, 1, 1)).days
+    price_cube, selected_price_index = data_store.cube_for(selected_date)
+    
+    # Display the least expensive stations on a density heatmap
+    # This is a density heatmap, so you can't adjust the color according to price.
+    # We don't show all the stations because the map is too similar on any given day.
+    
+    prices = price_cube.prices_on(selected_fuel, selected_price_index)
+    average_price = price_cube.rollups.get('mean', selected_fuel, selected_price_index)
+
+    # Stations without a known price are NaN and never pass the comparison
+    selected = (prices <= average_price) & get_open_stations(price_cube, selected_date, open_filter, open_time)
+    if bounds is not None:
+        in_view = np.zeros(len(price_cube), dtype=bool)
+        in_view[price_cube.spatial_index.bbox(*bounds)] = True
+        selected &= in_view
+    stations = np.flatnonzero(selected)
+
+    title = f'Moitié des stations avec le prix du {selected_fuel} le plus bas'
+    if zoom is not None and zoom < DETAIL_ZOOM:
+        # One point per zone of the grid, so the size of the figure does not depend on the number of stations
+        center_latitude = (bounds[0] + bounds[2]) / 2 if bounds is not None else HEATMAP_CENTER[0]
+        bins = GridBins.from_points(
+            price_cube.latitudes[stations], price_cube.longitudes[stations], prices[stations],
+            cell_size_for_zoom(zoom, HEATMAP_CELL_PIXELS), np.cos(np.radians(center_latitude))
+        )
+        df = pd.DataFrame({
+            'latitude': bins.latitudes,
+            'longitude': bins.longitudes,
+            'count': bins.counts,
+            'mean_price': bins.means.round(3),
+            'min_price': bins.minimums.round(3),
+        })
+        fig = px.density_mapbox(df,
+                                lat='latitude',
+                                lon='longitude',
+                                z='count',
+                                radius=HEATMAP_CELL_PIXELS,
+                                center=dict(lat=HEATMAP_CENTER[0], lon=HEATMAP_CENTER[1]),
+                                zoom=HEATMAP_ZOOM,
+                                mapbox_style="open-street-map",
+                                title=title,
+                                labels={'count': 'Nombre de stations', 'mean_price': 'Prix moyen (€)', 'min_price': 'Prix minimum (€)'},
+                                hover_data={'latitude': False, 'longitude': False, 'count': True,
+                                            'mean_price': True, 'min_price': True},
+                                )
+    else:
+        # Create a dataframe like a CSV with latitude, longitude, price, and opening_hours columns for each station
+        df = pd.DataFrame({
+            'latitude': price_cube.latitudes[stations],
+            'longitude': price_cube.longitudes[stations],
+            'price': prices[stations],
+            'opening_hours': price_cube.opening_hours_index.describe(selected_date.isoweekday())[stations],  # Hours of the selected day
+            'id': price_cube.ids[stations],
+            'name': price_cube.names[stations],  # Add the station name
+            'address': price_cube.addresses[stations],  # Add the address
+            'postal_code': price_cube.postal_codes[stations],  # Add the postal code
+            'city': price_cube.cities[stations],  # Add the city
+        })
+
+        fig = px.density_mapbox(df,
+                                lat='latitude',
+                                lon='longitude',
+                                z='price',
+                                radius=6,
+                                center=dict(lat=HEATMAP_CENTER[0], lon=HEATMAP_CENTER[1]),
+                                zoom=HEATMAP_ZOOM,
+                                mapbox_style="open-street-map",
+                                title=title,
+                                hover_name='id',
+                                labels={'price': 'Prix moyen (€)'},
+                                hover_data={'latitude': False, 'longitude': False, 'price': True, 'id': True,
+                                            'name': True, 'opening_hours': True, 'address': True,
+                                            'postal_code': True, 'city': True, 'opening_hours': True},
+                                custom_data=['latitude', 'longitude']
+                                )
+
+    # Keep the view of the user when the figure is replaced
+    fig.update_layout(uirevision='heatmap', meta={'points': points_key(df['latitude'], df['longitude'])})
+    return fig
+
+@app.callback(
+    [Output('markersmap', 'figure'), Output('markersmap-points', 'data')],
+    [Input('fuel-dropdown', 'value'), Input('date-picker', 'date'),
+     Input('center-latitude', 'value'), Input('center-longitude', 'value'), Input('radius-km', 'value'),
+     Input('open-filter', 'value'), Input('open-time', 'value')],
+    [State('markersmap-points', 'data')]
+)
+@metrics.timed('markersmap')
+def update_markersmap(selected_fuel, selected_date, center_latitude, center_longitude, radius_km, open_filter, open_time, displayed_points=None):
+    """
+    Update the scatter map based on the selected fuel type, date, area and opening time.
+
+    Parameters:
+    - selected_fuel (str): Selected fuel type.
+    - selected_date (str): Selected date in the format 'YYYY-MM-DD'.
+    - center_latitude (float): Latitude of the center of the area.
+    - center_longitude (float): Longitude of the center of the area.
+    - radius_km (float): Radius of the area in kilometers.
+    - open_filter (str): 'open' to keep only the stations open at `open_time`, 'all' to keep every station.
+    - open_time (str): Selected time in the format 'HH:MM'.
+    - displayed_points (str or None): The fingerprint of the stations of the displayed map.
+
+    Returns:
+    - tuple: The updated scatter map, as a Plotly figure or as a partial update when only the date changed, and
+      the fingerprint of its stations.
+    """
     
-    default_price = 0.0
-    bound_top_left = (48.90415749721205, 2.450568379885376)
-    bound_bottom_right = (48.79039931828495, 2.682282385717415)
+    fig = get_markersmap(selected_fuel, selected_date, center_latitude, center_longitude, radius_km, open_filter, open_time)
+    points = figure_points(fig)
+
+    # The stations of the area rarely change from one day to the next, so usually only their prices are sent
+    if only_date_changed():
+        fields = ['marker.color', 'marker.cmin', 'marker.cmax', 'text']
+        if points != displayed_points:
+            fields += ['lat', 'lon']
+        return patch_figure(fig, {0: fields, 1: ['lat', 'lon', 'text']}), points
+    return fig, points
+
+@figure_cache.memoize('markersmap')
+def get_markersmap(selected_fuel, selected_date, center_latitude, center_longitude, radius_km, open_filter, open_time):
+    """
+    Generate the scatter map of the stations of an area, colored by price.
 
-    limited_stations = []
+    Parameters:
+    - selected_fuel (str): Selected fuel type.
+    - selected_date (str): Selected date in the format 'YYYY-MM-DD'.
+    - center_latitude (float): Latitude of the center of the area.
+    - center_longitude (float): Longitude of the center of the area.
+    - radius_km (float): Radius of the area in kilometers.
+    - open_filter (str): 'open' to keep only the stations open at `open_time`, 'all' to keep every station.
+    - open_time (str): Selected time in the format 'HH:MM'.
 
-    for station in heatmap_dataframe['stations']:
-        if selected_fuel in station['carburants'] and len(station['carburants'][selected_fuel]) > selected_price_index:
-            if station['latitude'] <= bound_top_left[0] and station['latitude'] >= bound_bottom_right[0] and station['longitude'] >= bound_top_left[1] and station['longitude'] <= bound_bottom_right[1]:
-                limited_stations.append(station)
+    Returns:
+    - fig: Plotly figure object representing the scatter map.
+    """
+    
+    selected_date = datetime.strptime(selected_date, "%Y-%m-%d")
+    price_cube, selected_price_index = data_store.cube_for(selected_date)
 
-    df = pd.DataFrame(
-        [
-        [
-            station['latitude'] if station['latitude'] <= 90 and station['latitude'] >= -90 else 0,
-            station['longitude'] if station['longitude'] <= 180 and station['longitude'] >= -180 else 0,
-            station['carburants'][selected_fuel][selected_price_index] if selected_fuel in station['carburants'] and len(station['carburants'][selected_fuel]) > selected_price_index else default_price
-        ] for station in limited_stations
-    ],
-    columns=['latitude', 'longitude', 'price'])
+    # Fall back to the default area while the inputs are being edited
+    if center_latitude is None or center_longitude is None or not radius_km:
+        center_latitude, center_longitude, radius_km = DEFAULT_CENTER[0], DEFAULT_CENTER[1], DEFAULT_RADIUS_KM
+
+    # Closed stations are hidden like the stations without a price
+    prices = np.where(
+        get_open_stations(price_cube, selected_date, open_filter, open_time),
+        price_cube.prices_on(selected_fuel, selected_price_index), np.nan
+    )
+    opening_hours = price_cube.opening_hours_index.describe(selected_date.isoweekday())
+    limited_stations, _ = price_cube.spatial_index.radius(center_latitude, center_longitude, radius_km)
+    limited_stations = limited_stations[~np.isnan(prices[limited_stations])]
+    cheapest_stations, _ = price_cube.spatial_index.cheapest(center_latitude, center_longitude, radius_km, prices, CHEAPEST_LEN)
+
+    df = pd.DataFrame({
+        'latitude': price_cube.latitudes[limited_stations],
+        'longitude': price_cube.longitudes[limited_stations],
+        'price': prices[limited_stations],
+        'opening_hours': opening_hours[limited_stations],
+    })
 
     fig = go.Figure(go.Scattermapbox(
         lat=df['latitude'],
@@ -296,26 +617,72 @@ def update_markersmap(selected_fuel, selected_date):
             cmax=df['price'].max(),
             colorbar=dict(title=f'Prix du {selected_fuel}')
         ),
-        text=df['price']
+        text=df['price'].astype(str) + ' €<br>' + df['opening_hours'],
+        name='Stations'
+    ))
+
+    # Highlight the cheapest stations of the area
+    fig.add_trace(go.Scattermapbox(
+        lat=price_cube.latitudes[cheapest_stations],
+        lon=price_cube.longitudes[cheapest_stations],
+        mode='markers',
+        marker=go.scattermapbox.Marker(size=16, opacity=0.5, color='green'),
+        text=[f"{price} €<br>{hours}" for price, hours in zip(prices[cheapest_stations], opening_hours[cheapest_stations])],
+        name=f'Les {CHEAPEST_LEN} moins chères'
     ))
 
     fig.update_layout(
-        title='Carte des stations autour de ESIEE Paris, colorées par prix',
+        title=f'Carte des stations dans un rayon de {radius_km} km, colorées par prix',
         mapbox=dict(
             style="carto-positron",
-            center=dict(lat=48.847, lon=2.549),
-            zoom=12,
+            center=dict(lat=center_latitude, lon=center_longitude),
+            zoom=float(np.clip(14 - np.log2(radius_km), 1, 15)),
         ),
+        meta={'points': points_key(df['latitude'], df['longitude'])},
     )
 
     return fig
 
-heatmap_dataframe = pd.read_json("graph_data/data.json")
+# Initial view of the heatmap, over France; zones of the grid span HEATMAP_CELL_PIXELS pixels on screen and
+# every station is shown from DETAIL_ZOOM onwards
+HEATMAP_CENTER = (46.939, 2.945)
+HEATMAP_ZOOM = 4
+HEATMAP_CELL_PIXELS = 16
+DETAIL_ZOOM = 10
+
+# Default area of the markers map, around ESIEE Paris
+DEFAULT_CENTER = (48.847, 2.549)
+DEFAULT_RADIUS_KM = 8
+CHEAPEST_LEN = 5
 
 # Add a list of fuel types available in your dataset
 fuel_types = ["Gazole", "SP95", "E85", "E10", "SP98"]
 
-days_len = len(heatmap_dataframe['stations'][0]['carburants'][fuel_types[0]])
+# Year partitions are memory mapped when a date of their year is first selected
+data_store = DataStore(STORE_DIR)
+if not len(data_store):
+    json_file = "graph_data/data.json" if os.path.exists("graph_data/data.json") else "graph_data/data.json.gz"
+    data_store = DataStore.from_cube(PriceCube.from_json(json_file, fuel_types, datetime(2023, 1, 1)))
+
+def swap_data_store(new_data_store):
+    """
+    Replace the data store read by the callbacks, with a store reloaded by the StoreWatcher.
+
+    Callbacks already running keep the PriceCube they hold, the figures cached from the previous store are dropped.
+
+    Parameters:
+    - new_data_store (DataStore): The reloaded data store, preloaded.
+    """
+    
+    global data_store
+    data_store = new_data_store
+    figure_cache.invalidate()
+
+# Reload the data store in the background when get_datas.py writes it
+store_watcher = StoreWatcher(STORE_DIR, swap_data_store)
+
+# Read-only JSON API on the Flask server, reading the same data as the figures
+app.server.register_blueprint(create_api(lambda: data_store))
 
 # Create dropdown for fuel selection
 fuel_dropdown = dcc.Dropdown(
@@ -324,14 +691,33 @@ fuel_dropdown = dcc.Dropdown(
     value=fuel_types[0],  # Default value
 )
 
-# Create slider for selecting the index of the fuel prices list
-date_picker = dcc.DatePickerSingle(
-    id='date-picker',
-    min_date_allowed=datetime(2023, 1, 1),
-    max_date_allowed=datetime(2023, 12, 31),
-    initial_visible_month=datetime(2023, 12, 31),
-    date=datetime(2023, 12, 31).strftime("%Y-%m-%d")  # Use string representation
+def get_date_picker():
+    """
+    Create the date picker, over the dates of the current data store.
+
+    Returns:
+    - dcc.DatePickerSingle: The date picker, on the last day of the store.
+    """
+    
+    return dcc.DatePickerSingle(
+        id='date-picker',
+        min_date_allowed=data_store.min_date,
+        max_date_allowed=data_store.max_date,
+        initial_visible_month=data_store.max_date,
+        date=data_store.max_date.strftime("%Y-%m-%d")  # Use string representation
+    )
+
+# Filter the maps on the stations open on the selected day at a time
+open_filter = dcc.RadioItems(
+    id='open-filter',
+    options=[
+        {'label': 'Toutes les stations', 'value': 'all'},
+        {'label': 'Stations ouvertes à', 'value': 'open'},
+    ],
+    value='all',
+    inline=True
 )
+open_time = dcc.Input(id='open-time', type='text', value='12:00', placeholder='HH:MM', debounce=True)
 
 # Create dropdown for selecting the number of top stations to display
 stations_dropdown = dcc.Dropdown(
@@ -346,22 +732,55 @@ stations_dropdown = dcc.Dropdown(
     value=15  # Default value
 )
 
-app.layout = html.Div([
-    html.H1(children='Carburenta - Prix des carburants en France en 2023 🐀', style={'textAlign': 'center'}),
+def serve_layout():
+    """
+    Build the layout of the page, on every page load so that it follows the reloads of the data store.
+
+    Returns:
+    - html.Div: The layout.
+    """
     
-    # Add dropdown and date picker to the layout
-    fuel_dropdown,
-    date_picker,
+    return html.Div([
+        html.H1(children='Carburenta - Prix des carburants en France 🐀', style={'textAlign': 'center'}),
     
-    # Update the graph based on dropdown and date picker values
-    dcc.Graph(id='heatmap'),
-    dcc.Graph(id='histogram'),
-    dcc.Graph(id='piechartPriceStations'),
-    dcc.Graph(id='markersmap'),
-    stations_dropdown,
-    dcc.Graph(id='piechartNameStations', figure=get_piechart(15)) # Initialize the pie chart with 15 stations
-
-])
+        # Add dropdown and date picker to the layout
+        fuel_dropdown,
+        get_date_picker(),
+        html.Div([open_filter, open_time]),
+    
+        # Update the graph based on dropdown and date picker values
+        dcc.RadioItems(
+            id='heatmap-mode',
+            options=[
+                {'label': 'Stations regroupées par zone', 'value': 'cells'},
+                {'label': 'Toutes les stations', 'value': 'stations'},
+            ],
+            value='cells',
+            inline=True
+        ),
+        dcc.Graph(id='heatmap'),
+        dcc.Store(id='heatmap-points'),
+        dcc.Graph(id='histogram'),
+        dcc.Graph(id='departments'),
+        dcc.Graph(id='events'),
+        dcc.Graph(id='piechartPriceStations'),
+        html.Div([
+            html.Label('Latitude'),
+            dcc.Input(id='center-latitude', type='number', value=DEFAULT_CENTER[0], min=-90, max=90, step='any', debounce=True),
+            html.Label('Longitude'),
+            dcc.Input(id='center-longitude', type='number', value=DEFAULT_CENTER[1], min=-180, max=180, step='any', debounce=True),
+            html.Label('Rayon (km)'),
+            dcc.Input(id='radius-km', type='number', value=DEFAULT_RADIUS_KM, min=0.5, max=200, step='any', debounce=True),
+        ]),
+        dcc.Graph(id='markersmap'),
+        dcc.Store(id='markersmap-points'),
+        stations_dropdown,
+        dcc.Graph(id='piechartNameStations', figure=get_piechart(15)) # Initialize the pie chart with 15 stations
+
+    ])
+
+app.layout = serve_layout
 
 if __name__ == '__main__':
+    store_watcher.start()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,169 @@
+import re
+import numpy as np
+
+
+def normalize_brand(name):
+    """
+    Returns the key of a brand name, the same for its variants of case and spacing.
+
+    Parameters:
+    - name (str): The brand name.
+
+    Returns:
+    - str or None: The key, None for a missing or blank name.
+
+    >>> normalize_brand("  Total  Access "), normalize_brand("TOTAL ACCESS"), normalize_brand(" ")
+    ('total access', 'total access', None)
+    """
+    if name is None:
+        return None
+    key = re.sub(r"\s+", " ", str(name)).strip().casefold()
+    return key or None
+
+
+class BrandIndex:
+    """
+    Index of the stations by brand, built once from their names.
+
+    Names are grouped by normalize_brand, each brand being labelled with its most frequent spelling. Brands are
+    numbered by decreasing number of stations, so the N largest brands are the first N codes. The stations of each
+    brand are stored back to back in `stations`, from `offsets[code]` to `offsets[code + 1]`.
+
+    Attributes:
+    - brands (list[str]): The label of each brand, by code.
+    - codes (np.ndarray): The brand code of every station, -1 for the stations without a name.
+    - counts (np.ndarray): The number of stations of each brand, by code.
+    - stations (np.ndarray): The indexes of the stations, grouped by brand.
+    - offsets (np.ndarray): The start of each brand in `stations`, plus the total length.
+
+    Methods:
+    - from_names(cls, names): Build the index of the names of the stations.
+    - code(self, name: str): Returns the code of a brand from any variant of its name.
+    - top(self, n: int): Returns the labels and station counts of the N largest brands.
+    - stations_of(self, code: int): Returns the indexes of the stations of a brand.
+    - stats(self, prices: np.ndarray): Returns per brand statistics of a price of every station.
+    """
+
+    STATS = ["count", "mean", "min", "p50", "max"]
+
+    def __init__(self, brands: list, codes: np.ndarray):
+        self.brands = list(brands)
+        self.codes = codes
+        self.counts = np.bincount(codes[codes >= 0], minlength=len(self.brands))
+        self.stations = np.argsort(codes, kind="stable")[np.count_nonzero(codes < 0):]
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+        self.keys = {normalize_brand(brand): code for code, brand in enumerate(self.brands)}
+
+    def __len__(self):
+        return len(self.brands)
+
+    @classmethod
+    def from_names(cls, names):
+        """
+        Build the index of the names of the stations.
+
+        Parameters:
+        - names (iterable): The names of the stations, None when unknown.
+
+        Returns:
+        - BrandIndex: The index.
+
+        >>> index = BrandIndex.from_names(["Total", "TOTAL", "Esso", None, "total "])
+        >>> index.brands, index.codes.tolist(), index.counts.tolist()
+        (['Total', 'Esso'], [0, 0, 1, -1, 0], [3, 1])
+        """
+        names = list(names)
+        keys = np.array([normalize_brand(name) or "" for name in names], dtype=object)
+        unique_keys, key_codes, key_counts = np.unique(keys, return_inverse=True, return_counts=True)
+        key_codes = key_codes.reshape(-1)
+
+        # Label every key with its most frequent spelling, the first one in order of appearance on a tie
+        spellings, spelling_codes, spelling_counts = np.unique(
+            np.array([name if name is not None else "" for name in names], dtype=object), return_inverse=True, return_counts=True
+        )
+        spelling_codes = spelling_codes.reshape(-1)
+        labels = {}
+        for i in np.argsort(-spelling_counts[spelling_codes], kind="stable"):
+            labels.setdefault(key_codes[i], names[i])
+
+        # Number the brands by decreasing count, then by label
+        branded = [code for code, key in enumerate(unique_keys) if key]
+        branded.sort(key=lambda code: (-key_counts[code], labels[code]))
+        remap = np.full(len(unique_keys), -1, dtype=np.int32)
+        remap[branded] = np.arange(len(branded), dtype=np.int32)
+        return cls([labels[code] for code in branded], remap[key_codes])
+
+    def code(self, name: str):
+        """
+        Returns the code of a brand from any variant of its name.
+
+        Parameters:
+        - name (str): The brand name.
+
+        Returns:
+        - int or None: The code, None for an unknown brand.
+        """
+        return self.keys.get(normalize_brand(name))
+
+    def top(self, n: int) -> tuple:
+        """
+        Returns the labels and station counts of the N largest brands.
+
+        Parameters:
+        - n (int): The number of brands.
+
+        Returns:
+        - tuple: The labels (list[str]) and the numbers of stations (np.ndarray), largest first.
+        """
+        return self.brands[:n], self.counts[:n]
+
+    def stations_of(self, code: int) -> np.ndarray:
+        """
+        Returns the indexes of the stations of a brand.
+
+        Parameters:
+        - code (int): The code of the brand.
+
+        Returns:
+        - np.ndarray: The indexes of the stations, in increasing order.
+        """
+        return self.stations[self.offsets[code]:self.offsets[code + 1]]
+
+    def stats(self, prices: np.ndarray) -> np.ndarray:
+        """
+        Returns per brand statistics of a price of every station, e.g. of a fuel on a day.
+
+        Parameters:
+        - prices (np.ndarray): The price of every station, NaN when unknown.
+
+        Returns:
+        - np.ndarray: The statistics of STATS (the median being the nearest rank) shaped (brands, len(STATS)), NaN
+          for the brands without a known price.
+
+        >>> index = BrandIndex.from_names(["Total", "Esso", "total", "Total", None])
+        >>> index.stats(np.array([1.8, 1.9, 1.6, np.nan, 1.5])).round(2).tolist()
+        [[2.0, 1.7, 1.6, 1.6, 1.8], [1.0, 1.9, 1.9, 1.9, 1.9]]
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        known = (self.codes >= 0) & ~np.isnan(prices)
+        codes, values = self.codes[known], prices[known]
+
+        counts = np.bincount(codes, minlength=len(self.brands))
+        empty = counts == 0
+        result = np.full((len(self.brands), len(self.STATS)), np.nan)
+        result[:, self.STATS.index("count")] = counts
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[:, self.STATS.index("mean")] = np.bincount(codes, weights=values, minlength=len(self.brands)) / counts
+
+        # Sorted by brand then price, the prices of each brand are a sorted run starting at `starts`
+        order = np.lexsort((values, codes))
+        values = values[order]
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        last = np.maximum(starts + counts - 1, 0)
+        median = starts + (np.maximum(counts - 1, 0) // 2)
+        if len(values):
+            result[~empty, self.STATS.index("min")] = values[starts[~empty]]
+            result[~empty, self.STATS.index("max")] = values[last[~empty]]
+            result[~empty, self.STATS.index("p50")] = values[median[~empty]]
+        result[empty, self.STATS.index("mean")] = np.nan
+        return result
@@ -0,0 +1,172 @@
+import numpy as np
+from models.RollupTable import RollupTable
+
+
+def department_code(postal_code):
+    """
+    Returns the department of a postal code: its first two digits, 2A or 2B in Corsica and the first three digits
+    overseas.
+
+    Parameters:
+    - postal_code (str): The postal code.
+
+    Returns:
+    - str or None: The code of the department, None if the postal code is not valid.
+
+    >>> [department_code(code) for code in ("75001", "20090", "20250", "97411", "1000", None)]
+    ['75', '2A', '2B', '974', '01', None]
+    """
+    if postal_code is None:
+        return None
+    postal_code = str(postal_code).strip()
+    if not postal_code.isdigit() or len(postal_code) > 5:
+        return None
+    postal_code = postal_code.zfill(5)
+    if postal_code.startswith("20"):
+        return "2A" if int(postal_code) < 20200 else "2B"
+    if postal_code.startswith(("97", "98")):
+        return postal_code[:3]
+    return postal_code[:2]
+
+
+def department_order(code: str) -> str:
+    # Corsica (2A, 2B) sorts between 19 and 21
+    return code.replace("A", ".1").replace("B", ".2")
+
+
+class DepartmentRollups:
+    """
+    Aggregates of the station prices for every (department, day, fuel), the departments being derived from the
+    postal codes of the stations.
+
+    The statistics are those of RollupTable (count, sum, mean, min, max and the 10th, 50th and 90th percentiles),
+    computed over the stations of the department with a known price. Values are held in a float64 array shaped
+    (departments, days, fuels, statistics), NaN when no station of the department has a price, so any value is
+    read in constant time. Stations without a valid postal code are left out.
+
+    Attributes:
+    - fuel_types (list[str]): The fuel types, in the order of the third axis of `values`.
+    - departments (list[str]): The department codes, in the order of the first axis of `values`.
+    - values (np.ndarray): The statistics, shaped (departments, days, fuels, len(STATS)).
+
+    Methods:
+    - departments_of(postal_codes): Returns the department of every station and the sorted departments.
+    - from_prices(cls, prices: np.ndarray, fuel_types: list[str], postal_codes): Compute the table of a price cube.
+    - update(self, prices: np.ndarray, postal_codes, first_day: int): Compute again the statistics from a day onwards.
+    - get(self, stat: str, department: str, fuel_type: str, day_index: int): Returns a statistic of a department.
+    - series(self, stat: str, department: str, fuel_type: str): Returns a statistic of a department for every day.
+    - day(self, stat: str, fuel_type: str, day_index: int): Returns a statistic of every department on a day.
+    """
+
+    STATS = RollupTable.STATS
+
+    def __init__(self, fuel_types: list, departments: list, values: np.ndarray):
+        self.fuel_types = list(fuel_types)
+        self.departments = list(departments)
+        self.values = values
+        self.department_index = {department: i for i, department in enumerate(self.departments)}
+
+    @staticmethod
+    def departments_of(postal_codes) -> tuple:
+        """
+        Returns the department of every station and the sorted departments.
+
+        Parameters:
+        - postal_codes (iterable): The postal codes of the stations.
+
+        Returns:
+        - tuple: The index of the department of every station in the departments (-1 without department), and the
+          sorted department codes.
+        """
+        codes = [department_code(postal_code) for postal_code in postal_codes]
+        departments = sorted({code for code in codes if code is not None}, key=department_order)
+        index = {department: i for i, department in enumerate(departments)}
+        return np.array([index.get(code, -1) for code in codes], dtype=np.int64), departments
+
+    @classmethod
+    def from_prices(cls, prices: np.ndarray, fuel_types: list, postal_codes):
+        """
+        Compute the table of a price cube.
+
+        Parameters:
+        - prices (np.ndarray): The prices shaped (stations, days, fuels), NaN when unknown.
+        - fuel_types (list[str]): The fuel types, in the order of the last axis of `prices`.
+        - postal_codes (iterable): The postal codes of the stations.
+
+        Returns:
+        - DepartmentRollups: The aggregates of the prices.
+        """
+        _, departments = cls.departments_of(postal_codes)
+        table = cls(fuel_types, departments, np.full((len(departments), prices.shape[1], prices.shape[2], len(cls.STATS)), np.nan))
+        table.update(prices, postal_codes)
+        return table
+
+    def update(self, prices: np.ndarray, postal_codes, first_day: int = 0) -> None:
+        """
+        Compute again the statistics of the days from `first_day` to the end.
+
+        Parameters:
+        - prices (np.ndarray): The prices shaped (stations, days, fuels), NaN when unknown.
+        - postal_codes (iterable): The postal codes of the stations, whose departments must be `departments`.
+        - first_day (int): The index of the first day to compute.
+        """
+        station_departments, departments = self.departments_of(postal_codes)
+        if departments != self.departments:
+            raise ValueError("The departments of the stations changed, compute the table again with from_prices")
+
+        # Group the stations by department once, each block of days is then aggregated department by department
+        order = np.argsort(station_departments, kind="stable")
+        bounds = np.searchsorted(station_departments[order], np.arange(len(departments) + 1))
+
+        stations_len, days_len, fuels_len = prices.shape
+        chunk_days = max(1, RollupTable.BLOCK_SIZE // max(1, stations_len * fuels_len * prices.itemsize))
+        for start in range(first_day, days_len, chunk_days):
+            end = min(start + chunk_days, days_len)
+            block = np.asarray(prices[:, start:end, :])
+            for i in range(len(departments)):
+                self.values[i, start:end] = RollupTable._aggregate(block[order[bounds[i]:bounds[i + 1]]])
+
+    def get(self, stat: str, department: str, fuel_type: str, day_index: int) -> float:
+        """
+        Returns a statistic of a department for a fuel on a day.
+
+        Parameters:
+        - stat (str): The statistic, one of STATS.
+        - department (str): The department code.
+        - fuel_type (str): The fuel type.
+        - day_index (int): The index of the day.
+
+        Returns:
+        - float: The value of the statistic, NaN for an unknown department.
+        """
+        if department not in self.department_index:
+            return float("nan")
+        return float(self.values[self.department_index[department], day_index, self.fuel_types.index(fuel_type), self.STATS.index(stat)])
+
+    def series(self, stat: str, department: str, fuel_type: str) -> np.ndarray:
+        """
+        Returns a statistic of a department for a fuel for every day.
+
+        Parameters:
+        - stat (str): The statistic, one of STATS.
+        - department (str): The department code.
+        - fuel_type (str): The fuel type.
+
+        Returns:
+        - np.ndarray: The values of the statistic, one per day.
+        """
+        return self.values[self.department_index[department], :, self.fuel_types.index(fuel_type), self.STATS.index(stat)]
+
+    def day(self, stat: str, fuel_type: str, day_index: int) -> np.ndarray:
+        """
+        Returns a statistic of every department for a fuel on a day.
+
+        Parameters:
+        - stat (str): The statistic, one of STATS.
+        - fuel_type (str): The fuel type.
+        - day_index (int): The index of the day.
+
+        Returns:
+        - np.ndarray: The values of the statistic, one per department.
+        """
+        return self.values[:, day_index, self.fuel_types.index(fuel_type), self.STATS.index(stat)]
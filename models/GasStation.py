@@ -1,3 +1,5 @@
+from array import array
+from datetime import date
 from models.OpeningHours import OpeningHours
 from typing import Dict
 
@@ -5,6 +7,9 @@ class GasStation:
     """
     Represents a gas station with its details, including location, opening hours, and gas price history.
 
+    The price history is stored per fuel type as two compact arrays (date ordinals and prices) in the order the
+    prices were added; `gas_price_history` rebuilds the dictionary view of it on access.
+
     Attributes:
     - id (int): The unique identifier of the gas station.
     - name (str): The name of the gas station.
@@ -21,10 +26,15 @@ class GasStation:
     Methods:
     - __init__(self, id: int, name: str, address: str, latitude: float, longitude: float, postal_code: str, city: str,
                 is_always_open: bool = False, opening_hours: OpeningHours = None,
-                gas_price_history: Dict[str, Dict[str, float]] = {}): Initializes the GasStation object with the
+                gas_price_history: Dict[str, Dict[str, float]] = None): Initializes the GasStation object with the
                 provided attributes.
+    - add_price(self, fuel_type: str, day: int, price: float): Adds a price to the history.
+    - price_changes(self, fuel_type: str): Returns the price history of a fuel as sorted date ordinals and prices.
     - __str__(self): Returns a formatted string representation of the gas station.
     """
+    __slots__ = ("id", "name", "address", "latitude", "longitude", "postal_code", "city", "opening_hours",
+                 "is_always_open", "prices")
+
     id: int
     name: str
     address: str
@@ -34,10 +44,10 @@ class GasStation:
     city: str
     opening_hours: OpeningHours
     is_always_open: bool
-    gas_price_history: Dict[str, Dict[str, float]] # Dict[<fuel_type>, Dict[<date>, <price>]]
-    
-    
-    def __init__(self, id: int, name: str, address: str, latitude: float, longitude: float, postal_code: str, city: str, is_always_open: bool = False, opening_hours: OpeningHours = None, gas_price_history: Dict[str, Dict[str, float]] = {}):
+    prices: Dict[str, tuple] # Dict[<fuel_type>, (array(<date ordinal>), array(<price>))]
+
+
+    def __init__(self, id: int, name: str, address: str, latitude: float, longitude: float, postal_code: str, city: str, is_always_open: bool = False, opening_hours: OpeningHours = None, gas_price_history: Dict[str, Dict[str, float]] = None):
         self.id = id
         self.name = name
         self.address = address
@@ -47,8 +57,50 @@ class GasStation:
         self.city = city
         self.opening_hours = opening_hours
         self.is_always_open = is_always_open
-        self.gas_price_history = gas_price_history
-    
+        self.prices = {}
+        for fuel_type, price_history in (gas_price_history or {}).items():
+            for date_key, price in price_history.items():
+                self.add_price(fuel_type, date.fromisoformat(date_key).toordinal(), price)
+
+    def add_price(self, fuel_type: str, day: int, price: float) -> None:
+        """
+        Adds a price to the history. A later price of the same day replaces the previous one.
+
+        Parameters:
+        - fuel_type (str): The fuel type.
+        - day (int): The date of the price, as a proleptic Gregorian ordinal (see datetime.date.toordinal).
+        - price (float): The price.
+        """
+        if fuel_type not in self.prices:
+            self.prices[fuel_type] = (array("l"), array("d"))
+        days, prices = self.prices[fuel_type]
+        days.append(day)
+        prices.append(price)
+
+    def price_changes(self, fuel_type: str) -> tuple:
+        """
+        Returns the price history of a fuel, one price per day sorted by date.
+
+        Parameters:
+        - fuel_type (str): The fuel type.
+
+        Returns:
+        - tuple: The date ordinals (list[int]) and the prices (list[float]).
+        """
+        days, prices = self.prices[fuel_type]
+        last_prices = dict(zip(days, prices))  # The last price of each day wins
+        sorted_days = sorted(last_prices)
+        return sorted_days, [last_prices[day] for day in sorted_days]
+
+    @property
+    def gas_price_history(self) -> Dict[str, Dict[str, float]]:
+        gas_price_history = {}
+        for fuel_type, (days, prices) in self.prices.items():
+            gas_price_history[fuel_type] = {
+                date.fromordinal(day).strftime("%Y-%m-%d"): price for day, price in zip(days, prices)
+            }
+        return gas_price_history
+
     def __str__(self):
         """
         Returns a formatted string representation of the gas station.
@@ -56,4 +108,4 @@ class GasStation:
         Returns:
         - str: A formatted string showing the details of the gas station.
         """
-        return f"GasStation(id={self.id}, name={self.name}, address={self.address}, latitude={self.latitude}, longitude={self.longitude}, postal_code={self.postal_code}, city={self.city}, is_always_open={self.is_always_open}, opening_hours={self.opening_hours}, gas_price_history={self.gas_price_history})"
\ No newline at end of file
+        return f"GasStation(id={self.id}, name={self.name}, address={self.address}, latitude={self.latitude}, longitude={self.longitude}, postal_code={self.postal_code}, city={self.city}, is_always_open={self.is_always_open}, opening_hours={self.opening_hours}, gas_price_history={self.gas_price_history})"
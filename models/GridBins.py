@@ -0,0 +1,92 @@
+import numpy as np
+
+
+# Size of a web map tile in pixels at zoom 0, where it covers the 360 degrees of longitude
+TILE_SIZE = 256
+
+
+def cell_size_for_zoom(zoom: float, cell_pixels: int = 16) -> float:
+    """
+    Returns the width in degrees of longitude of a cell spanning `cell_pixels` pixels on a web map at a zoom level.
+
+    Parameters:
+    - zoom (float): The zoom level of the map.
+    - cell_pixels (int): The width of a cell in pixels.
+
+    Returns:
+    - float: The width of a cell in degrees.
+
+    >>> cell_size_for_zoom(4), cell_size_for_zoom(5)
+    (1.40625, 0.703125)
+    """
+    return cell_pixels * 360 / (TILE_SIZE * 2 ** zoom)
+
+
+class GridBins:
+    """
+    Stations aggregated into square cells of a grid, with the count, mean and minimum of their prices.
+
+    The cells are `cell_size` degrees of longitude wide and `cell_size * latitude_scale` degrees of latitude high,
+    a latitude scale of cos(latitude) giving cells that look square on a web map around that latitude. Only
+    the non-empty cells are kept, positioned at the mean location of their stations.
+
+    Attributes:
+    - latitudes (np.ndarray): The mean latitude of the stations of each cell.
+    - longitudes (np.ndarray): The mean longitude of the stations of each cell.
+    - counts (np.ndarray): The number of stations of each cell.
+    - means (np.ndarray): The mean price of each cell.
+    - minimums (np.ndarray): The minimum price of each cell.
+
+    Methods:
+    - from_points(cls, latitudes, longitudes, prices, cell_size: float, latitude_scale: float = 1.0): Aggregate
+      stations into cells.
+    """
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray, counts: np.ndarray, means: np.ndarray, minimums: np.ndarray):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.counts = counts
+        self.means = means
+        self.minimums = minimums
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def from_points(cls, latitudes: np.ndarray, longitudes: np.ndarray, prices: np.ndarray, cell_size: float, latitude_scale: float = 1.0):
+        """
+        Aggregate stations into cells. Stations without a price are ignored.
+
+        Parameters:
+        - latitudes (np.ndarray): The latitudes of the stations.
+        - longitudes (np.ndarray): The longitudes of the stations.
+        - prices (np.ndarray): The prices of the stations, NaN when unknown.
+        - cell_size (float): The width of a cell in degrees of longitude.
+        - latitude_scale (float): The height of a cell relative to its width.
+
+        Returns:
+        - GridBins: The non-empty cells.
+
+        >>> bins = GridBins.from_points(np.array([0.1, 0.2, 5.0]), np.array([0.1, 0.3, 5.0]), np.array([1.8, 1.6, 1.7]), 1.0)
+        >>> bins.counts.tolist(), bins.means.round(2).tolist(), bins.minimums.round(2).tolist()
+        ([2, 1], [1.7, 1.7], [1.6, 1.7])
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        prices = np.asarray(prices, dtype=np.float64)
+        known = ~np.isnan(prices) & np.isfinite(latitudes) & np.isfinite(longitudes)
+        latitudes, longitudes, prices = latitudes[known], longitudes[known], prices[known]
+
+        rows = np.floor((latitudes + 90) / (cell_size * latitude_scale)).astype(np.int64)
+        columns = np.floor((longitudes + 180) / cell_size).astype(np.int64)
+        cells, inverse = np.unique(rows * (int(np.ceil(360 / cell_size)) + 1) + columns, return_inverse=True)
+
+        counts = np.bincount(inverse, minlength=len(cells))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.bincount(inverse, weights=prices, minlength=len(cells)) / counts
+            mean_latitudes = np.bincount(inverse, weights=latitudes, minlength=len(cells)) / counts
+            mean_longitudes = np.bincount(inverse, weights=longitudes, minlength=len(cells)) / counts
+        minimums = np.full(len(cells), np.inf)
+        np.minimum.at(minimums, inverse, prices)
+
+        return cls(mean_latitudes, mean_longitudes, counts, means, minimums)
@@ -5,21 +5,50 @@ class HoursRange:
     """
     Represents a range of hours, indicating the start and end times.
 
+    The times are stored as minutes since midnight to keep the object small.
+
     Attributes:
+    - start_minute (int): The starting time of the hours range, in minutes since midnight.
+    - end_minute (int): The ending time of the hours range, in minutes since midnight.
     - hour_start (datetime.time): The starting time of the hours range.
     - hour_end (datetime.time): The ending time of the hours range.
 
     Methods:
     - __init__(self, hour_start: datetime.time, hour_end: datetime.time): Initializes the HoursRange object with
       the provided start and end times.
+    - from_minutes(cls, start_minute: int, end_minute: int): Creates a HoursRange from minutes since midnight.
     - __str__(self): Returns a formatted string representation of the hours range.
     """
-    hour_start: datetime.time
-    hour_end: datetime.time
+    __slots__ = ("start_minute", "end_minute")
 
     def __init__(self, hour_start: datetime.time, hour_end: datetime.time):
-        self.hour_start = hour_start
-        self.hour_end = hour_end
+        self.start_minute = hour_start.hour * 60 + hour_start.minute
+        self.end_minute = hour_end.hour * 60 + hour_end.minute
+
+    @classmethod
+    def from_minutes(cls, start_minute: int, end_minute: int):
+        """
+        Creates a HoursRange from minutes since midnight.
+
+        Parameters:
+        - start_minute (int): The starting time in minutes since midnight.
+        - end_minute (int): The ending time in minutes since midnight.
+
+        Returns:
+        - HoursRange: The hours range.
+        """
+        hours_range = cls.__new__(cls)
+        hours_range.start_minute = start_minute
+        hours_range.end_minute = end_minute
+        return hours_range
+
+    @property
+    def hour_start(self) -> datetime.time:
+        return datetime.time(*divmod(self.start_minute, 60))
+
+    @property
+    def hour_end(self) -> datetime.time:
+        return datetime.time(*divmod(self.end_minute, 60))
 
     def __str__(self):
         """
@@ -29,7 +58,7 @@ class HoursRange:
         - str: A formatted string showing the hours range in the format 'HH:MM - HH:MM'.
         """
         return f"{self.hour_start.strftime('%H:%M')} - {self.hour_end.strftime('%H:%M')}"
-    
+
     def serialize(self):
         """
         Serialize the HoursRange object to a format suitable for JSON.
@@ -40,4 +69,4 @@ class HoursRange:
         return {
             "hour_start": self.hour_start.strftime('%H:%M'),
             "hour_end": self.hour_end.strftime('%H:%M')
-        }
\ No newline at end of file
+        }
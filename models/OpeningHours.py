@@ -1,22 +1,64 @@
+from array import array
 from models.HoursRange import HoursRange
 
 
+MINUTES_PER_DAY = 24 * 60
+CLOSED = 0xFFFF
+
+
 class OpeningHours:
     """
     Represents the opening hours of a gas station for each day.
 
+    The hours are encoded in a compact array of unsigned 16-bit integers holding, for each day in order, the day
+    ID followed by the opening and closing times as minutes of the week ((day ID - 1) * 1440 + minutes since
+    midnight), or CLOSED twice if the station is closed on that day.
+
     Attributes:
-    - days (list[dict[HoursRange]]): A list containing dictionaries where keys are day IDs (int) and values are
-      instances of the `HoursRange` class representing the opening hours for that day.
+    - encoded (array): The encoded opening hours.
+    - days (dict[int, HoursRange]): A dictionary where keys are day IDs (int) and values are instances of the
+      `HoursRange` class representing the opening hours for that day, or None if closed. Built on access.
 
     Methods:
-    - __init__(self, days: list[dict[HoursRange]]): Initializes the OpeningHours object with the provided list of days.
+    - __init__(self, days: dict[int, HoursRange]): Initializes the OpeningHours object with the provided days.
+    - intervals(self): Returns the opening intervals as minutes of the week.
     - __str__(self): Returns a formatted string representation of the opening hours.
     """
-    days: list[dict[HoursRange]]
+    __slots__ = ("encoded",)
 
-    def __init__(self, days: list[dict[HoursRange]]):
-        self.days = days
+    def __init__(self, days: dict):
+        self.encoded = array("H")
+        for day_id, hours_range in days.items():
+            if hours_range is None:
+                self.encoded.extend((day_id, CLOSED, CLOSED))
+            else:
+                offset = (day_id - 1) * MINUTES_PER_DAY
+                self.encoded.extend((day_id, offset + hours_range.start_minute, offset + hours_range.end_minute))
+
+    @property
+    def days(self) -> dict:
+        days = {}
+        for i in range(0, len(self.encoded), 3):
+            day_id, start, end = self.encoded[i:i + 3]
+            if start == CLOSED:
+                days[day_id] = None
+            else:
+                offset = (day_id - 1) * MINUTES_PER_DAY
+                days[day_id] = HoursRange.from_minutes(start - offset, end - offset)
+        return days
+
+    def intervals(self) -> list:
+        """
+        Returns the opening intervals as minutes of the week.
+
+        Returns:
+        - list[tuple[int, int]]: The (opening, closing) minutes of the week of each open day.
+        """
+        return [
+            (self.encoded[i + 1], self.encoded[i + 2])
+            for i in range(0, len(self.encoded), 3)
+            if self.encoded[i + 1] != CLOSED
+        ]
 
     def __str__(self):
         """
@@ -25,18 +67,19 @@ class OpeningHours:
         Returns:
         - str: A formatted string showing the opening hours for each day.
         """
-        if not self.days:
+        days = self.days
+        if not days:
             return "OpeningHours: No opening hours available."
 
         formatted_days = "\n".join(
             f"Day {day_id}: {hours_range}" if hours_range else f"Day {day_id}: Closed"
-            for day_id, hours_range in self.days.items()
+            for day_id, hours_range in days.items()
         )
         return f"OpeningHours:\n{formatted_days}"
-    
+
     def serialize(self):
         serialized_days = {
             str(day_id): hours_range.serialize() if hasattr(hours_range, 'serialize') and callable(getattr(hours_range, 'serialize')) else None
             for day_id, hours_range in self.days.items()
         }
-        return serialized_days
\ No newline at end of file
+        return serialized_days
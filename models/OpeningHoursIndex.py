@@ -0,0 +1,153 @@
+import numpy as np
+from models.OpeningHours import MINUTES_PER_DAY
+
+
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def parse_minutes(value: str):
+    """
+    Parse a time in the format 'HH:MM' (or 'HH.MM') to minutes since midnight.
+
+    Parameters:
+    - value (str): The time.
+
+    Returns:
+    - int or None: The minutes since midnight, or None if the value is not a valid time.
+
+    >>> parse_minutes("07:30"), parse_minutes("21.05"), parse_minutes("25:00")
+    (450, 1265, None)
+    """
+    try:
+        hours, minutes = (int(part) for part in value.replace(".", ":").split(":"))
+    except (AttributeError, ValueError):
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+class OpeningHoursIndex:
+    """
+    Opening hours of every gas station as sorted minute-of-week intervals, to find the stations open at a given
+    time with a single vectorized comparison.
+
+    Minutes of the week start on monday at midnight, like the day IDs of the opening hours (1 for monday to
+    7 for sunday). A closing time earlier than the opening time is on the next day, and equal times mean that the
+    station is open the whole day. Stations without opening hours are only open if they are always open.
+
+    Attributes:
+    - stations (np.ndarray): The index of the station of each interval.
+    - starts (np.ndarray): The first minute of the week of each interval, sorted.
+    - ends (np.ndarray): The minute of the week after the end of each interval.
+    - is_always_open (np.ndarray): True for the stations open at any time.
+    - labels (np.ndarray): The opening hours of each station and day as text, shaped (stations, 7).
+
+    Methods:
+    - from_serialized(cls, opening_hours, is_always_open=None): Build the index from serialized opening hours.
+    - open_at(self, day_id: int, minute: int): Returns which stations are open at a time of the week.
+    - describe(self, day_id: int): Returns the opening hours of every station on a day as text.
+    """
+
+    def __init__(self, stations: np.ndarray, starts: np.ndarray, ends: np.ndarray, is_always_open: np.ndarray, labels: np.ndarray):
+        order = np.argsort(starts, kind="stable")
+        self.stations = stations[order]
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.is_always_open = is_always_open
+        self.labels = labels
+        # Longest interval, to bound the intervals that may contain a time
+        self.max_length = int((self.ends - self.starts).max()) if len(self.starts) else 0
+
+    def __len__(self):
+        return len(self.is_always_open)
+
+    @classmethod
+    def from_serialized(cls, opening_hours, is_always_open=None):
+        """
+        Build the index from serialized opening hours (see OpeningHours.serialize).
+
+        Parameters:
+        - opening_hours (list or np.ndarray): The serialized opening hours of each station, None if unknown.
+        - is_always_open (np.ndarray or None): True for the stations open at any time, all False if None.
+
+        Returns:
+        - OpeningHoursIndex: The index.
+        """
+        stations, starts, ends = [], [], []
+        labels = np.full((len(opening_hours), 7), "Non disponible", dtype=object)
+
+        for station, days in enumerate(opening_hours):
+            if not days:
+                continue
+            for day_id, hours in days.items():
+                day = int(day_id) - 1
+                if not 0 <= day < 7:
+                    continue
+                if hours is None:
+                    labels[station, day] = "Fermé"
+                    continue
+                start, end = parse_minutes(hours.get("hour_start")), parse_minutes(hours.get("hour_end"))
+                if start is None or end is None:
+                    continue
+                labels[station, day] = f"{hours['hour_start']} - {hours['hour_end']}"
+
+                start += day * MINUTES_PER_DAY
+                end += day * MINUTES_PER_DAY
+                if end <= start:
+                    end += MINUTES_PER_DAY
+                if end > MINUTES_PER_WEEK:
+                    # Open on sunday night until monday morning
+                    stations.append(station)
+                    starts.append(0)
+                    ends.append(end - MINUTES_PER_WEEK)
+                    end = MINUTES_PER_WEEK
+                stations.append(station)
+                starts.append(start)
+                ends.append(end)
+
+        if is_always_open is None:
+            is_always_open = np.zeros(len(opening_hours), dtype=bool)
+        is_always_open = np.asarray(is_always_open, dtype=bool)
+        labels[is_always_open] = "24h/24"
+
+        return cls(
+            np.array(stations, dtype=np.int64),
+            np.array(starts, dtype=np.int32),
+            np.array(ends, dtype=np.int32),
+            is_always_open,
+            labels,
+        )
+
+    def open_at(self, day_id: int, minute: int) -> np.ndarray:
+        """
+        Returns which stations are open at a time of the week.
+
+        Parameters:
+        - day_id (int): The day, from 1 for monday to 7 for sunday (see datetime.isoweekday).
+        - minute (int): The minutes since midnight.
+
+        Returns:
+        - np.ndarray: A boolean mask, True for the stations open at this time.
+        """
+        time = (day_id - 1) * MINUTES_PER_DAY + minute
+        # Only the intervals starting in the longest interval length before the time can contain it
+        first = np.searchsorted(self.starts, time - self.max_length, side="right")
+        last = np.searchsorted(self.starts, time, side="right")
+        candidates = slice(first, last)
+
+        is_open = self.is_always_open.copy()
+        is_open[self.stations[candidates][self.ends[candidates] > time]] = True
+        return is_open
+
+    def describe(self, day_id: int) -> np.ndarray:
+        """
+        Returns the opening hours of every station on a day as text.
+
+        Parameters:
+        - day_id (int): The day, from 1 for monday to 7 for sunday.
+
+        Returns:
+        - np.ndarray: The opening hours ('HH:MM - HH:MM', 'Fermé', '24h/24' or 'Non disponible').
+        """
+        return self.labels[:, day_id - 1]
@@ -0,0 +1,281 @@
+from datetime import datetime, timedelta
+from functools import cached_property
+import gzip
+import json
+import numpy as np
+from models.BrandIndex import BrandIndex
+from models.DepartmentRollups import DepartmentRollups
+from models.OpeningHoursIndex import OpeningHoursIndex
+from models.PriceEvents import PriceEvents
+from models.PriceHistory import PriceHistory
+from models.RollupTable import RollupTable
+from models.SpatialIndex import SpatialIndex
+
+
+def nanmean(values: np.ndarray, axis: int = 0) -> np.ndarray:
+    """
+    Compute the mean of an array along an axis, ignoring NaN values.
+
+    Unlike numpy.nanmean, slices holding only NaN values silently give NaN instead of raising a warning.
+
+    Parameters:
+    - values (np.ndarray): The values to average.
+    - axis (int): The axis along which the mean is computed.
+
+    Returns:
+    - np.ndarray: The mean values.
+
+    >>> nanmean(np.array([[1.0, np.nan], [3.0, np.nan]]))
+    array([ 2., nan])
+    """
+    known = ~np.isnan(values)
+    sums = np.where(known, values, 0).sum(axis=axis, dtype=np.float64)
+    counts = known.sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+class PriceCube:
+    """
+    Columnar representation of the gas stations and their daily prices.
+
+    Prices are held in a single float32 array shaped (stations, days, fuels), where NaN means that the station
+    has no known price for this fuel on this day. Station details are held in parallel arrays indexed by station.
+
+    Attributes:
+    - ids (np.ndarray): The IDs of the gas stations.
+    - names (np.ndarray): The names (brands) of the gas stations.
+    - addresses (np.ndarray): The addresses of the gas stations.
+    - latitudes (np.ndarray): The latitudes of the gas stations.
+    - longitudes (np.ndarray): The longitudes of the gas stations.
+    - postal_codes (np.ndarray): The postal codes of the gas stations.
+    - cities (np.ndarray): The cities of the gas stations.
+    - opening_hours (np.ndarray): The serialized opening hours of the gas stations.
+    - is_always_open (np.ndarray): True for the gas stations open at any time, all False if not given.
+    - fuel_types (list[str]): The fuel types, in the order of the last axis of `prices`.
+    - start_date (datetime): The date of the first day of the `prices` day axis.
+    - prices (np.ndarray): The daily prices, shaped (stations, days, fuels).
+    - rollups (RollupTable): The per (day, fuel) aggregates of the prices, computed if not given.
+    - department_rollups (DepartmentRollups): The per (department, day, fuel) aggregates of the prices, computed if
+      not given.
+    - spatial_index (SpatialIndex): The index of the station coordinates, built on first use.
+    - opening_hours_index (OpeningHoursIndex): The index of the opening hours, built on first use.
+    - price_events (PriceEvents): The price changes and anomalies, detected on first use if not given.
+    - brand_index (BrandIndex): The index of the stations by brand, built on first use.
+    - price_history (PriceHistory): The change points of the prices, built on first use.
+
+    Methods:
+    - from_json(cls, file_name: str, fuel_types: list[str], start_date: datetime = None): Build a PriceCube from a data.json file.
+    - day_index(self, date: datetime): Returns the index of a date on the day axis.
+    - fuel_index(self, fuel_type: str): Returns the index of a fuel type on the fuel axis.
+    - station_index(self, station_id: int): Returns the index of a station from its ID.
+    - build_indexes(self): Build the indexes built on first use.
+    - detect_events(self, stations: np.ndarray = None, first_day: int = 0): Detect the price changes and anomalies of
+      the prices.
+    - prices_on(self, fuel_type: str, day_index: int): Returns the price of every station for a fuel on a day.
+    - dates(self): Returns the dates of the day axis.
+    """
+
+    def __init__(self, ids, names, addresses, latitudes, longitudes, postal_codes, cities, opening_hours,
+                 fuel_types, start_date, prices, rollups=None, is_always_open=None, department_rollups=None,
+                 price_events=None):
+        self.ids = ids
+        self.names = names
+        self.addresses = addresses
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.postal_codes = postal_codes
+        self.cities = cities
+        self.opening_hours = opening_hours
+        self.is_always_open = is_always_open if is_always_open is not None else np.zeros(len(ids), dtype=bool)
+        self.fuel_types = list(fuel_types)
+        self.start_date = start_date
+        self.prices = prices
+        self.rollups = rollups if rollups is not None else RollupTable.from_prices(prices, fuel_types)
+        self.department_rollups = (
+            department_rollups if department_rollups is not None
+            else DepartmentRollups.from_prices(prices, fuel_types, postal_codes)
+        )
+        if price_events is not None:
+            self.price_events = price_events
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def days_len(self) -> int:
+        return self.prices.shape[1]
+
+    @cached_property
+    def spatial_index(self) -> SpatialIndex:
+        return SpatialIndex(self.latitudes, self.longitudes)
+
+    @cached_property
+    def opening_hours_index(self) -> OpeningHoursIndex:
+        return OpeningHoursIndex.from_serialized(self.opening_hours, self.is_always_open)
+
+    @cached_property
+    def price_events(self) -> PriceEvents:
+        return self.detect_events()
+
+    @cached_property
+    def brand_index(self) -> BrandIndex:
+        return BrandIndex.from_names(self.names)
+
+    @cached_property
+    def price_history(self) -> PriceHistory:
+        return PriceHistory.from_dense(self.prices, self.fuel_types, self.start_date)
+
+    @classmethod
+    def from_json(cls, file_name: str, fuel_types: list, start_date: datetime = None):
+        """
+        Build a PriceCube from a data.json file written by get_datas.create_json, with daily prices or change points.
+
+        Parameters:
+        - file_name (str): The path of the JSON file, compressed with gzip if it ends with '.gz'.
+        - fuel_types (list[str]): The fuel types to keep.
+        - start_date (datetime): The date of the first price of each list, if the file does not give it.
+
+        Returns:
+        - PriceCube: The columnar representation of the file.
+        """
+        with (gzip.open if file_name.endswith(".gz") else open)(file_name, "rt", encoding="utf-8") as infile:
+            data = json.load(infile)
+        stations = data["stations"]
+
+        if "start_date" in data:
+            # Date axis given once at the top level, with daily prices or change points
+            start_date = datetime.strptime(data["start_date"], "%Y-%m-%d")
+            days_len = data["days"]
+        else:
+            if stations and stations[0].get("opening_dates"):
+                start_date = datetime.strptime(stations[0]["opening_dates"][0], "%Y-%m-%d")
+            days_len = max(
+                (len(prices) for station in stations for prices in station["carburants"].values()),
+                default=0
+            )
+        prices = np.full((len(stations), days_len, len(fuel_types)), np.nan, dtype=np.float32)
+
+        for i, station in enumerate(stations):
+            for j, fuel_type in enumerate(fuel_types):
+                if fuel_type in station["carburants"]:
+                    history = station["carburants"][fuel_type]
+                    if isinstance(history, dict):
+                        for day_index, price in zip(history["days"], history["prices"]):
+                            prices[i, day_index:, j] = price
+                    else:
+                        prices[i, :len(history), j] = history
+
+        # A price of 0 means that no price was known yet for this day
+        prices[prices == 0] = np.nan
+
+        return cls(
+            ids=np.array([station["id"] for station in stations], dtype=np.int64),
+            names=np.array([station["name"] for station in stations], dtype=object),
+            addresses=np.array([station.get("address") for station in stations], dtype=object),
+            latitudes=np.array([station["latitude"] for station in stations], dtype=np.float64),
+            longitudes=np.array([station["longitude"] for station in stations], dtype=np.float64),
+            postal_codes=np.array([station.get("postal_code") for station in stations], dtype=object),
+            cities=np.array([station.get("city") for station in stations], dtype=object),
+            opening_hours=np.array([station.get("opening_hours") for station in stations], dtype=object),
+            is_always_open=np.array([bool(station.get("is_always_open")) for station in stations], dtype=bool),
+            fuel_types=fuel_types,
+            start_date=start_date,
+            prices=prices,
+        )
+
+    def day_index(self, date: datetime) -> int:
+        """
+        Returns the index of a date on the day axis.
+
+        Parameters:
+        - date (datetime): The date.
+
+        Returns:
+        - int: The index of the date.
+        """
+        return (date - self.start_date).days
+
+    def fuel_index(self, fuel_type: str) -> int:
+        """
+        Returns the index of a fuel type on the fuel axis.
+
+        Parameters:
+        - fuel_type (str): The fuel type.
+
+        Returns:
+        - int: The index of the fuel type.
+        """
+        return self.fuel_types.index(fuel_type)
+
+    @cached_property
+    def id_order(self) -> np.ndarray:
+        return np.argsort(self.ids, kind="stable")
+
+    def station_index(self, station_id: int):
+        """
+        Returns the index of a station from its ID.
+
+        Parameters:
+        - station_id (int): The ID of the station.
+
+        Returns:
+        - int or None: The index of the station, None if it is not in the cube.
+        """
+        position = int(np.searchsorted(self.ids, station_id, sorter=self.id_order))
+        if position < len(self.ids) and self.ids[self.id_order[position]] == station_id:
+            return int(self.id_order[position])
+        return None
+
+    def build_indexes(self) -> None:
+        """
+        Build the indexes built on first use, e.g. before forking worker processes so that they share them.
+        """
+        self.spatial_index
+        self.opening_hours_index
+        self.id_order
+        self.brand_index
+
+    def detect_events(self, stations: np.ndarray = None, first_day: int = 0) -> PriceEvents:
+        """
+        Detect the price changes and anomalies of the prices, the neighborhood of a station being its department.
+
+        Given the stations whose prices changed, only the events that the changes may affect are detected again,
+        the others are taken from `price_events` (see PriceEvents.update).
+
+        Parameters:
+        - stations (np.ndarray or None): The indexes of the stations whose prices changed, None to detect every event.
+        - first_day (int): The index of the first day whose prices changed.
+
+        Returns:
+        - PriceEvents: The events.
+        """
+        station_departments, departments = DepartmentRollups.departments_of(self.postal_codes)
+        medians = self.department_rollups.values[..., DepartmentRollups.STATS.index("p50")]
+        if departments != self.department_rollups.departments:
+            medians, station_departments = None, None
+        if stations is not None:
+            return self.price_events.update(self.prices, stations, first_day, medians, station_departments)
+        return PriceEvents.detect(self.prices, self.fuel_types, medians, station_departments)
+
+    def prices_on(self, fuel_type: str, day_index: int) -> np.ndarray:
+        """
+        Returns the price of every station for a fuel on a day.
+
+        Parameters:
+        - fuel_type (str): The fuel type.
+        - day_index (int): The index of the day.
+
+        Returns:
+        - np.ndarray: The prices, NaN for the stations without a known price.
+        """
+        return self.prices[:, day_index, self.fuel_index(fuel_type)]
+
+    def dates(self) -> list:
+        """
+        Returns the dates of the day axis.
+
+        Returns:
+        - list[str]: The dates in the format 'YYYY-MM-DD'.
+        """
+        return [(self.start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(self.days_len)]
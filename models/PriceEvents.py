@@ -0,0 +1,281 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Prices outside of this range (in € per liter) cannot be real
+MIN_PRICE = 0.3
+MAX_PRICE = 4.0
+# A change is a jump when the new price differs from the median of the previous ROLLING_DAYS days of the station
+# by more than JUMP_THRESHOLD, or from the median of its department on the day by more than NEIGHBORHOOD_THRESHOLD
+ROLLING_DAYS = 7
+JUMP_THRESHOLD = 0.15
+NEIGHBORHOOD_THRESHOLD = 0.25
+# Number of consecutive changes in the same direction making a streak
+STREAK_LENGTH = 5
+
+EVENTS_DTYPE = np.dtype([
+    ("day", "<i4"), ("fuel", "<i2"), ("kind", "u1"), ("station", "<i4"),
+    ("price", "<f4"), ("reference", "<f4"), ("value", "<f4"),
+])
+
+
+class PriceEvents:
+    """
+    Price changes and anomalies detected over the prices of a cube, in bulk array operations.
+
+    The events are held in a structured array sorted by day then fuel, one row per event:
+    - INVALID: first day of a run of impossible prices (0 or outside MIN_PRICE..MAX_PRICE), `value` is the
+      length of the run in days.
+    - JUMP: change of more than JUMP_THRESHOLD from the median price of the station over the previous
+      ROLLING_DAYS days (`reference`), `value` is the relative difference.
+    - NEIGHBORHOOD: change to a price further than NEIGHBORHOOD_THRESHOLD from the median price of the department
+      of the station on the day (`reference`), `value` is the relative difference.
+    - STREAK: last change of a run of at least STREAK_LENGTH consecutive changes in the same direction,
+      `reference` is the price before the run and `value` its number of changes (negative for decreases).
+    The price changes themselves are too many to be listed, they are counted for every (day, fuel) instead.
+
+    Attributes:
+    - fuel_types (list[str]): The fuel types, indexed by the `fuel` field of the events.
+    - events (np.ndarray): The events, with the fields of EVENTS_DTYPE.
+    - changes (np.ndarray): The number of price increases and decreases, shaped (days, fuels, 2).
+
+    Methods:
+    - detect(cls, prices: np.ndarray, fuel_types: list[str], department_medians: np.ndarray = None,
+      station_departments: np.ndarray = None): Detect the events of a price cube.
+    - update(self, prices: np.ndarray, stations: np.ndarray, first_day: int, department_medians: np.ndarray = None,
+      station_departments: np.ndarray = None): Returns the events once the prices of some stations changed.
+    - on_day(self, day_index: int, fuel_type: str = None, kind: str = None): Returns the events of a day.
+    - for_station(self, station: int): Returns the events of a station.
+    - daily_counts(self, kind: str, fuel_type: str): Returns the number of events of a kind for every day.
+    """
+
+    KINDS = ["INVALID", "JUMP", "NEIGHBORHOOD", "STREAK"]
+    # Kinds of events computed from the prices of their station only
+    STATION_KINDS = ["INVALID", "JUMP", "STREAK"]
+
+    # Maximum size in bytes of the block of prices processed at once
+    BLOCK_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, fuel_types: list, events: np.ndarray, changes: np.ndarray):
+        self.fuel_types = list(fuel_types)
+        self.events = events
+        self.changes = changes
+
+    def __len__(self):
+        return len(self.events)
+
+    @classmethod
+    def detect(cls, prices: np.ndarray, fuel_types: list, department_medians: np.ndarray = None, station_departments: np.ndarray = None):
+        """
+        Detect the events of a price cube, a block of stations at a time.
+
+        Parameters:
+        - prices (np.ndarray): The prices shaped (stations, days, fuels), NaN when unknown.
+        - fuel_types (list[str]): The fuel types, in the order of the last axis of `prices`.
+        - department_medians (np.ndarray or None): The median price of every (department, day, fuel), None to skip
+          the NEIGHBORHOOD events.
+        - station_departments (np.ndarray or None): The index of the department of every station, -1 without one.
+
+        Returns:
+        - PriceEvents: The events.
+        """
+        stations_len, days_len, fuels_len = prices.shape
+        changes = np.zeros((days_len, fuels_len, 2), dtype=np.int64)
+        blocks = []
+        chunk_stations = max(1, cls.BLOCK_SIZE // max(1, days_len * fuels_len * prices.itemsize * (ROLLING_DAYS + 2)))
+        for start in range(0, stations_len, chunk_stations):
+            end = min(start + chunk_stations, stations_len)
+            departments = station_departments[start:end] if station_departments is not None else None
+            blocks.append(cls._detect_block(np.asarray(prices[start:end], dtype=np.float32), start, changes, department_medians, departments))
+
+        return cls(fuel_types, cls._sorted(blocks), changes)
+
+    def update(self, prices: np.ndarray, stations: np.ndarray, first_day: int, department_medians: np.ndarray = None,
+               station_departments: np.ndarray = None):
+        """
+        Returns the events once the prices of some stations changed from a day onwards, detecting again only what
+        the changes may affect.
+
+        The events of STATION_KINDS are detected again over every day, for the changed stations only. The
+        NEIGHBORHOOD events, whose department medians move with the changes, and the counts of price changes are
+        detected again for every station, from `first_day` onwards. The other events are kept.
+
+        Parameters:
+        - prices (np.ndarray): The new prices shaped (stations, days, fuels), NaN when unknown.
+        - stations (np.ndarray): The indexes of the stations whose prices changed.
+        - first_day (int): The index of the first day whose prices changed.
+        - department_medians (np.ndarray or None): The median price of every (department, day, fuel), None to skip
+          the NEIGHBORHOOD events.
+        - station_departments (np.ndarray or None): The index of the department of every station, -1 without one.
+
+        Returns:
+        - PriceEvents: The events of the new prices.
+        """
+        stations = np.unique(np.asarray(stations, dtype=np.int64))
+        stations_len, days_len, fuels_len = prices.shape
+        events = np.asarray(self.events)
+        changes = np.array(self.changes, dtype=np.int64)
+        neighborhood = events["kind"] == self.KINDS.index("NEIGHBORHOOD")
+        kept = (
+            ~(np.isin(events["kind"], [self.KINDS.index(kind) for kind in self.STATION_KINDS]) & np.isin(events["station"], stations))
+            & ~(neighborhood & ((events["day"] >= first_day) | (department_medians is None)))
+        )
+        blocks = [events[kept]]
+
+        # Every station from the day before the first change, for the changes and the NEIGHBORHOOD events
+        start = max(first_day - 1, 0)
+        window_changes = np.zeros((days_len - start, fuels_len, 2), dtype=np.int64)
+        chunk_stations = max(1, self.BLOCK_SIZE // max(1, (days_len - start) * fuels_len * prices.itemsize * 2))
+        medians = department_medians[:, start:] if department_medians is not None else None
+        for block_start in range(0, stations_len, chunk_stations):
+            end = min(block_start + chunk_stations, stations_len)
+            departments = station_departments[block_start:end] if station_departments is not None else None
+            found = self._detect_block(np.asarray(prices[block_start:end, start:], dtype=np.float32), block_start,
+                                       window_changes, medians, departments, ["NEIGHBORHOOD"])
+            found["day"] += start
+            blocks.append(found)
+        changes[first_day:] = window_changes[first_day - start:]
+
+        # The changed stations over every day, for the other events
+        chunk_stations = max(1, self.BLOCK_SIZE // max(1, days_len * fuels_len * prices.itemsize * (ROLLING_DAYS + 2)))
+        for block_start in range(0, len(stations), chunk_stations):
+            selected = stations[block_start:block_start + chunk_stations]
+            found = self._detect_block(np.asarray(prices[selected], dtype=np.float32), 0,
+                                       np.zeros((days_len, fuels_len, 2), dtype=np.int64), None, None, self.STATION_KINDS)
+            found["station"] = selected[found["station"]]
+            blocks.append(found)
+
+        return PriceEvents(self.fuel_types, self._sorted(blocks), changes)
+
+    @staticmethod
+    def _sorted(blocks) -> np.ndarray:
+        events = np.concatenate(blocks) if blocks else np.empty(0, dtype=EVENTS_DTYPE)
+        return events[np.lexsort((events["kind"], events["station"], events["fuel"], events["day"]))]
+
+    @classmethod
+    def _detect_block(cls, block, first_station, changes, department_medians, departments, kinds=KINDS) -> np.ndarray:
+        stations_len, days_len, fuels_len = block.shape
+        found = [np.empty(0, dtype=EVENTS_DTYPE)]
+
+        # Impossible prices, reported on the first day of each run
+        invalid = ~np.isnan(block) & ((block < MIN_PRICE) | (block > MAX_PRICE))
+        run_start = invalid & ~np.concatenate([np.zeros((stations_len, 1, fuels_len), dtype=bool), invalid[:, :-1]], axis=1)
+        stations, days, fuels = np.nonzero(run_start)
+        if "INVALID" in kinds and len(stations):
+            # Length of each run: days until the next valid price, or until the end of the day axis
+            valid_after = np.where(invalid, days_len, np.arange(days_len)[np.newaxis, :, np.newaxis])
+            next_valid = np.minimum.accumulate(valid_after[:, ::-1], axis=1)[:, ::-1]
+            found.append(cls._events("INVALID", stations + first_station, days, fuels, block[stations, days, fuels],
+                                     np.nan, next_valid[stations, days, fuels] - days))
+
+        # Price changes between two valid prices
+        usable = np.where(invalid, np.nan, block)
+        previous, current = usable[:, :-1], usable[:, 1:]
+        with np.errstate(invalid="ignore"):
+            changed = ~np.isnan(previous) & ~np.isnan(current) & (current != previous)
+            increases = changed & (current > previous)
+        changes[1:, :, 0] += increases.sum(axis=0)
+        changes[1:, :, 1] += (changed & ~increases).sum(axis=0)
+        stations, days, fuels = np.nonzero(changed)
+        days = days + 1
+        if not len(stations):
+            return np.concatenate(found)
+        new_prices = usable[stations, days, fuels]
+        old_prices = usable[stations, days - 1, fuels]
+
+        # Jumps from the rolling median of the station, over the days before the change
+        if "JUMP" in kinds:
+            padded = np.concatenate([np.full((stations_len, ROLLING_DAYS, fuels_len), np.nan, dtype=np.float32), usable], axis=1)
+            windows = sliding_window_view(padded, ROLLING_DAYS, axis=1)  # (stations, days + 1, fuels, ROLLING_DAYS)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                medians = np.nanmedian(windows[stations, days, fuels], axis=1)
+                deviations = (new_prices - medians) / medians
+            jumps = np.abs(deviations) > JUMP_THRESHOLD
+            found.append(cls._events("JUMP", stations[jumps] + first_station, days[jumps], fuels[jumps], new_prices[jumps],
+                                     medians[jumps], deviations[jumps]))
+
+        # Prices far from the median of the department on the day of the change
+        if "NEIGHBORHOOD" in kinds and department_medians is not None and departments is not None:
+            with_department = departments[stations] >= 0
+            references = np.full(len(stations), np.nan)
+            references[with_department] = department_medians[departments[stations[with_department]], days[with_department], fuels[with_department]]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                deviations = (new_prices - references) / references
+            outliers = np.abs(deviations) > NEIGHBORHOOD_THRESHOLD
+            found.append(cls._events("NEIGHBORHOOD", stations[outliers] + first_station, days[outliers], fuels[outliers],
+                                     new_prices[outliers], references[outliers], deviations[outliers]))
+
+        # Streaks: runs of consecutive changes of a series in the same direction
+        if "STREAK" not in kinds:
+            return np.concatenate(found)
+        order = np.lexsort((days, fuels, stations))
+        series = stations[order] * fuels_len + fuels[order]
+        directions = np.where(new_prices[order] > old_prices[order], 1, -1)
+        boundaries = np.flatnonzero(np.diff(series) | np.diff(directions)) + 1
+        starts = np.concatenate([[0], boundaries])
+        lengths = np.diff(np.concatenate([starts, [len(order)]]))
+        streaks = lengths >= STREAK_LENGTH
+        first, last = order[starts[streaks]], order[starts[streaks] + lengths[streaks] - 1]
+        found.append(cls._events("STREAK", stations[last] + first_station, days[last], fuels[last], new_prices[last],
+                                 old_prices[first], lengths[streaks] * directions[starts[streaks]]))
+
+        return np.concatenate(found)
+
+    @classmethod
+    def _events(cls, kind, stations, days, fuels, prices, references, values) -> np.ndarray:
+        events = np.empty(len(stations), dtype=EVENTS_DTYPE)
+        events["day"] = days
+        events["fuel"] = fuels
+        events["kind"] = cls.KINDS.index(kind)
+        events["station"] = stations
+        events["price"] = prices
+        events["reference"] = references
+        events["value"] = values
+        return events
+
+    def on_day(self, day_index: int, fuel_type: str = None, kind: str = None) -> np.ndarray:
+        """
+        Returns the events of a day.
+
+        Parameters:
+        - day_index (int): The index of the day.
+        - fuel_type (str or None): The fuel type, None for every fuel.
+        - kind (str or None): The kind of events, one of KINDS, None for every kind.
+
+        Returns:
+        - np.ndarray: The events of the day.
+        """
+        start, end = np.searchsorted(self.events["day"], [day_index, day_index + 1])
+        events = self.events[start:end]
+        if fuel_type is not None:
+            start, end = np.searchsorted(events["fuel"], [self.fuel_types.index(fuel_type), self.fuel_types.index(fuel_type) + 1])
+            events = events[start:end]
+        if kind is not None:
+            events = events[events["kind"] == self.KINDS.index(kind)]
+        return events
+
+    def for_station(self, station: int) -> np.ndarray:
+        """
+        Returns the events of a station.
+
+        Parameters:
+        - station (int): The index of the station in the cube.
+
+        Returns:
+        - np.ndarray: The events of the station, sorted by day.
+        """
+        return self.events[self.events["station"] == station]
+
+    def daily_counts(self, kind: str, fuel_type: str) -> np.ndarray:
+        """
+        Returns the number of events of a kind for a fuel on every day.
+
+        Parameters:
+        - kind (str): The kind of events, one of KINDS.
+        - fuel_type (str): The fuel type.
+
+        Returns:
+        - np.ndarray: The number of events, one per day.
+        """
+        selected = (self.events["kind"] == self.KINDS.index(kind)) & (self.events["fuel"] == self.fuel_types.index(fuel_type))
+        return np.bincount(self.events["day"][selected], minlength=self.changes.shape[0])
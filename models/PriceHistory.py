@@ -0,0 +1,206 @@
+from datetime import datetime
+import numpy as np
+
+
+class PriceHistory:
+    """
+    Run-length encoded daily prices: only the (day index, price) change points of every (station, fuel) series.
+
+    Series are numbered `station * len(fuel_types) + fuel` and their change points are stored back to back,
+    sorted by series then day, in the `days` and `prices` arrays; `offsets` gives where each series starts. A price
+    holds from its day until the next change point of the series, and is unknown (NaN) before the first one.
+    PriceCube builds it from its dense prices on first use, to read the prices of a few stations over many days
+    (see the station prices of the API), and the compact JSON export writes the change points of each station.
+
+    >>> prices = np.full((3, 6, 2), np.nan, dtype=np.float32)
+    >>> prices[0, 1:, 0] = 1.8; prices[0, 4:, 0] = 1.9; prices[1, :, 1] = 2.0; prices[1, 3:, 1] = np.nan
+    >>> history = PriceHistory.from_dense(prices, ["Gazole", "E10"], datetime(2023, 1, 1))
+    >>> len(history), history.series(0, "Gazole")
+    (3, (array([1, 4], dtype=int32), array([1.8, 1.9], dtype=float32)))
+    >>> all(np.array_equal(history.as_of(fuel, day), prices[:, day, i], equal_nan=True) for i, fuel in enumerate(history.fuel_types) for day in range(6))
+    True
+    >>> all(np.array_equal(history.expand_range(fuel, 2, 6), prices[:, 2:6, i], equal_nan=True) for i, fuel in enumerate(history.fuel_types))
+    True
+    >>> history.expand_range("E10", 1, 5, stations=[1]), np.array_equal(history.to_dense(), prices, equal_nan=True)
+    (array([[ 2.,  2., nan, nan]], dtype=float32), True)
+
+    Attributes:
+    - fuel_types (list[str]): The fuel types.
+    - start_date (datetime): The date of the day index 0.
+    - days_len (int): The number of days covered.
+    - offsets (np.ndarray): The start of each series in `days` and `prices`, plus the total length.
+    - days (np.ndarray): The day index of each change point.
+    - prices (np.ndarray): The price of each change point.
+
+    Methods:
+    - change_points(dates: list[int], prices: list[float], start_date: datetime, days_len: int): Compute the change
+      points of a price history.
+    - from_dense(cls, prices: np.ndarray, fuel_types: list[str], start_date: datetime): Encode a dense price cube.
+    - series(self, station: int, fuel_type: str): Returns the change points of a series.
+    - as_of(self, fuel_type: str, day_index: int, stations: np.ndarray = None): Returns the price of the stations
+      for a fuel on a day.
+    - expand_range(self, fuel_type: str, start: int, end: int, stations: np.ndarray = None): Returns the daily
+      prices of the stations for a fuel over a range of days.
+    - to_dense(self): Returns the dense prices shaped (stations, days, fuels).
+    """
+
+    def __init__(self, fuel_types: list, start_date: datetime, days_len: int, offsets: np.ndarray, days: np.ndarray, prices: np.ndarray):
+        self.fuel_types = list(fuel_types)
+        self.start_date = start_date
+        self.days_len = days_len
+        self.offsets = offsets
+        self.days = days
+        self.prices = prices
+        # Keys sorted like the change points, to search every series at once
+        series = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+        self.keys = series * (days_len + 1) + days
+
+    # Maximum size in bytes of the block of prices encoded at once
+    BLOCK_SIZE = 64 * 1024 * 1024
+
+    def __len__(self):
+        return (len(self.offsets) - 1) // max(len(self.fuel_types), 1)
+
+    @staticmethod
+    def change_points(dates: list, prices: list, start_date: datetime, days_len: int) -> tuple:
+        """
+        Compute the change points of a price history on the day axis.
+
+        Changes before the first day set the initial price, changes after the last day are ignored and
+        consecutive equal prices are merged.
+
+        Parameters:
+        - dates (list[int]): The sorted dates of the prices, as ordinals (see datetime.date.toordinal).
+        - prices (list[float]): The prices.
+        - start_date (datetime): The date of the day index 0.
+        - days_len (int): The number of days.
+
+        Returns:
+        - tuple: The day indexes (np.ndarray of int32) and the prices (np.ndarray of float64).
+
+        >>> dates = [datetime(2022, 12, 30), datetime(2023, 1, 3), datetime(2023, 1, 5), datetime(2024, 1, 2)]
+        >>> PriceHistory.change_points([date.toordinal() for date in dates], [1.8, 1.8, 1.9, 2.0], datetime(2023, 1, 1), 365)
+        (array([0, 4], dtype=int32), array([1.8, 1.9]))
+        """
+        start_ordinal = start_date.toordinal()
+        days = []
+        changes = []
+        for date, price in zip(dates, prices):
+            day_index = max(date - start_ordinal, 0)
+            if day_index >= days_len:
+                break
+            if days and days[-1] == day_index:
+                changes[-1] = price
+            else:
+                days.append(day_index)
+                changes.append(price)
+            if len(changes) > 1 and changes[-1] == changes[-2]:
+                days.pop()
+                changes.pop()
+        return np.array(days, dtype=np.int32), np.array(changes, dtype=np.float64)
+
+    @classmethod
+    def from_dense(cls, prices: np.ndarray, fuel_types: list, start_date: datetime):
+        """
+        Encode a dense price cube.
+
+        Parameters:
+        - prices (np.ndarray): The prices shaped (stations, days, fuels), NaN when unknown.
+        - fuel_types (list[str]): The fuel types, in the order of the last axis of `prices`.
+        - start_date (datetime): The date of the day index 0.
+
+        Returns:
+        - PriceHistory: The change points of the prices.
+        """
+        stations_len, days_len, fuels_len = prices.shape
+        all_series, all_days, all_prices = [], [], []
+        chunk_stations = max(1, cls.BLOCK_SIZE // max(1, days_len * fuels_len * prices.itemsize))
+        for start in range(0, stations_len, chunk_stations):
+            end = min(start + chunk_stations, stations_len)
+            values = np.ascontiguousarray(np.asarray(prices[start:end]).transpose(0, 2, 1)).reshape((end - start) * fuels_len, days_len)
+
+            changed = np.empty(values.shape, dtype=bool)
+            if days_len:
+                changed[:, 0] = ~np.isnan(values[:, 0])
+                previous, current = values[:, :-1], values[:, 1:]
+                changed[:, 1:] = (current != previous) & ~(np.isnan(current) & np.isnan(previous))
+
+            series, days = np.nonzero(changed)
+            all_series.append(series + start * fuels_len)
+            all_days.append(days.astype(np.int32))
+            all_prices.append(values[series, days])
+
+        series = np.concatenate(all_series) if all_series else np.empty(0, dtype=np.int64)
+        offsets = np.zeros(stations_len * fuels_len + 1, dtype=np.int64)
+        np.cumsum(np.bincount(series, minlength=stations_len * fuels_len), out=offsets[1:])
+        return cls(
+            fuel_types, start_date, days_len, offsets,
+            np.concatenate(all_days) if all_days else np.empty(0, dtype=np.int32),
+            np.concatenate(all_prices) if all_prices else np.empty(0, dtype=prices.dtype),
+        )
+
+    def series(self, station: int, fuel_type: str) -> tuple:
+        """
+        Returns the change points of a series.
+
+        Parameters:
+        - station (int): The index of the station.
+        - fuel_type (str): The fuel type.
+
+        Returns:
+        - tuple: The day indexes and the prices of the change points.
+        """
+        index = station * len(self.fuel_types) + self.fuel_types.index(fuel_type)
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.days[start:end], self.prices[start:end]
+
+    def _lookup(self, series: np.ndarray, days: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(self.keys, series * (self.days_len + 1) + days, side="right") - 1
+        # A position before the start of its series means that no change happened yet
+        found = positions >= self.offsets[series]
+        return np.where(found, self.prices[np.maximum(positions, 0)] if len(self.prices) else np.nan, np.nan).astype(np.float32)
+
+    def _series_of(self, fuel_type: str, stations) -> np.ndarray:
+        stations = np.arange(len(self), dtype=np.int64) if stations is None else np.asarray(stations, dtype=np.int64)
+        return stations * len(self.fuel_types) + self.fuel_types.index(fuel_type)
+
+    def as_of(self, fuel_type: str, day_index: int, stations: np.ndarray = None) -> np.ndarray:
+        """
+        Returns the price of the stations for a fuel on a day.
+
+        Parameters:
+        - fuel_type (str): The fuel type.
+        - day_index (int): The index of the day.
+        - stations (np.ndarray or None): The indexes of the stations, None for every station.
+
+        Returns:
+        - np.ndarray: The prices, NaN when no price is known yet.
+        """
+        series = self._series_of(fuel_type, stations)
+        return self._lookup(series, np.full(len(series), day_index, dtype=np.int64))
+
+    def expand_range(self, fuel_type: str, start: int, end: int, stations: np.ndarray = None) -> np.ndarray:
+        """
+        Returns the daily prices of the stations for a fuel over a range of days.
+
+        Parameters:
+        - fuel_type (str): The fuel type.
+        - start (int): The index of the first day.
+        - end (int): The index after the last day.
+        - stations (np.ndarray or None): The indexes of the stations, None for every station.
+
+        Returns:
+        - np.ndarray: The prices shaped (stations, end - start), NaN when no price is known yet.
+        """
+        series = self._series_of(fuel_type, stations)
+        days = np.arange(start, end, dtype=np.int64)
+        return self._lookup(series[:, np.newaxis], days[np.newaxis, :])
+
+    def to_dense(self) -> np.ndarray:
+        """
+        Returns the dense prices.
+
+        Returns:
+        - np.ndarray: The prices shaped (stations, days, fuels), NaN when no price is known yet.
+        """
+        return np.stack([self.expand_range(fuel_type, 0, self.days_len) for fuel_type in self.fuel_types], axis=2)
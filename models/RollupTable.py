@@ -0,0 +1,125 @@
+import numpy as np
+
+
+class RollupTable:
+    """
+    Aggregates of the station prices for every (day, fuel) pair.
+
+    The statistics are computed over the stations with a known price: count, sum, mean, min, max and the
+    10th, 50th and 90th percentiles (nearest rank). Values are held in a float64 array shaped
+    (days, fuels, statistics), NaN when no station has a price.
+
+    Attributes:
+    - fuel_types (list[str]): The fuel types, in the order of the second axis of `values`.
+    - values (np.ndarray): The statistics, shaped (days, fuels, len(STATS)).
+
+    Methods:
+    - from_prices(cls, prices: np.ndarray, fuel_types: list[str]): Compute the table of a price cube.
+    - update(self, prices: np.ndarray, first_day: int): Compute again the statistics from a day onwards.
+    - get(self, stat: str, fuel_type: str, day_index: int): Returns a statistic of a fuel on a day.
+    - series(self, stat: str, fuel_type: str): Returns a statistic of a fuel for every day.
+    - day(self, stat: str, day_index: int): Returns a statistic of every fuel on a day.
+    """
+
+    STATS = ["count", "sum", "mean", "min", "max", "p10", "p50", "p90"]
+    PERCENTILES = {"p10": 0.1, "p50": 0.5, "p90": 0.9}
+
+    # Maximum size in bytes of the block of prices processed at once
+    BLOCK_SIZE = 256 * 1024 * 1024
+
+    def __init__(self, fuel_types: list, values: np.ndarray):
+        self.fuel_types = list(fuel_types)
+        self.values = values
+
+    @classmethod
+    def from_prices(cls, prices: np.ndarray, fuel_types: list):
+        """
+        Compute the table of a price cube.
+
+        Parameters:
+        - prices (np.ndarray): The prices shaped (stations, days, fuels), NaN when unknown.
+        - fuel_types (list[str]): The fuel types, in the order of the last axis of `prices`.
+
+        Returns:
+        - RollupTable: The aggregates of the prices.
+        """
+        table = cls(fuel_types, np.full((prices.shape[1], prices.shape[2], len(cls.STATS)), np.nan))
+        table.update(prices)
+        return table
+
+    def update(self, prices: np.ndarray, first_day: int = 0) -> None:
+        """
+        Compute again the statistics of the days from `first_day` to the end.
+
+        Parameters:
+        - prices (np.ndarray): The prices shaped (stations, days, fuels), NaN when unknown.
+        - first_day (int): The index of the first day to compute.
+        """
+        stations_len, days_len, fuels_len = prices.shape
+        chunk_days = max(1, self.BLOCK_SIZE // max(1, stations_len * fuels_len * prices.itemsize))
+        for start in range(first_day, days_len, chunk_days):
+            end = min(start + chunk_days, days_len)
+            self.values[start:end] = self._aggregate(np.asarray(prices[:, start:end, :]))
+
+    @classmethod
+    def _aggregate(cls, block: np.ndarray) -> np.ndarray:
+        known = ~np.isnan(block)
+        counts = known.sum(axis=0)
+        sums = np.where(known, block, 0).sum(axis=0, dtype=np.float64)
+        empty = counts == 0
+
+        result = np.empty(counts.shape + (len(cls.STATS),))
+        result[..., cls.STATS.index("count")] = counts
+        result[..., cls.STATS.index("sum")] = sums
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[..., cls.STATS.index("mean")] = np.where(empty, np.nan, sums / np.maximum(counts, 1))
+        result[..., cls.STATS.index("min")] = np.where(empty, np.nan, np.where(known, block, np.inf).min(axis=0))
+        result[..., cls.STATS.index("max")] = np.where(empty, np.nan, np.where(known, block, -np.inf).max(axis=0))
+
+        # NaN values are sorted last, so the known prices of each (day, fuel) come first
+        ordered = np.sort(block, axis=0)
+        for stat, quantile in cls.PERCENTILES.items():
+            ranks = np.floor(quantile * np.maximum(counts - 1, 0)).astype(np.int64)
+            values = np.take_along_axis(ordered, ranks[np.newaxis], axis=0)[0]
+            result[..., cls.STATS.index(stat)] = np.where(empty, np.nan, values)
+        return result
+
+    def get(self, stat: str, fuel_type: str, day_index: int) -> float:
+        """
+        Returns a statistic of a fuel on a day.
+
+        Parameters:
+        - stat (str): The statistic, one of STATS.
+        - fuel_type (str): The fuel type.
+        - day_index (int): The index of the day.
+
+        Returns:
+        - float: The value of the statistic.
+        """
+        return float(self.values[day_index, self.fuel_types.index(fuel_type), self.STATS.index(stat)])
+
+    def series(self, stat: str, fuel_type: str) -> np.ndarray:
+        """
+        Returns a statistic of a fuel for every day.
+
+        Parameters:
+        - stat (str): The statistic, one of STATS.
+        - fuel_type (str): The fuel type.
+
+        Returns:
+        - np.ndarray: The values of the statistic, one per day.
+        """
+        return self.values[:, self.fuel_types.index(fuel_type), self.STATS.index(stat)]
+
+    def day(self, stat: str, day_index: int) -> np.ndarray:
+        """
+        Returns a statistic of every fuel on a day.
+
+        Parameters:
+        - stat (str): The statistic, one of STATS.
+        - day_index (int): The index of the day.
+
+        Returns:
+        - np.ndarray: The values of the statistic, one per fuel type.
+        """
+        return self.values[day_index, :, self.STATS.index(stat)]
@@ -0,0 +1,163 @@
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Compute the great-circle distance between a point and an array of points.
+
+    Parameters:
+    - latitude (float): The latitude of the point.
+    - longitude (float): The longitude of the point.
+    - latitudes (np.ndarray): The latitudes of the other points.
+    - longitudes (np.ndarray): The longitudes of the other points.
+
+    Returns:
+    - np.ndarray: The distances in kilometers.
+
+    >>> round(float(haversine(48.8566, 2.3522, np.array([45.764]), np.array([4.8357]))[0]))
+    391
+    """
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """
+    Grid bucket index over station coordinates.
+
+    Stations are bucketed into square cells of `cell_size` degrees and sorted by cell, so the stations of a row of
+    cells are a contiguous slice of the sorted order: a bounding box query only reads the slices of the rows it
+    covers and then filters the candidates exactly. Stations with invalid coordinates are not indexed.
+
+    Attributes:
+    - latitudes (np.ndarray): The latitudes of the stations.
+    - longitudes (np.ndarray): The longitudes of the stations.
+    - cell_size (float): The size of a cell in degrees.
+
+    Methods:
+    - bbox(self, south: float, west: float, north: float, east: float): Returns the stations inside a bounding box.
+    - radius(self, latitude: float, longitude: float, radius_km: float): Returns the stations within a distance.
+    - nearest(self, latitude: float, longitude: float, k: int): Returns the k nearest stations.
+    - cheapest(self, latitude: float, longitude: float, radius_km: float, prices: np.ndarray, k: int): Returns the
+      k cheapest stations within a distance.
+    """
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray, cell_size: float = 0.05):
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.cell_size = cell_size
+        self.columns = int(np.ceil(360 / cell_size)) + 1
+        self.rows = int(np.ceil(180 / cell_size)) + 1
+
+        valid = (
+            np.isfinite(self.latitudes) & np.isfinite(self.longitudes) &
+            (np.abs(self.latitudes) <= 90) & (np.abs(self.longitudes) <= 180)
+        )
+        indexed = np.flatnonzero(valid)
+        cells = self._row(self.latitudes[indexed]) * self.columns + self._column(self.longitudes[indexed])
+        order = np.argsort(cells, kind="stable")
+        self.order = indexed[order]
+        self.sorted_cells = cells[order]
+
+    def _row(self, latitudes):
+        return np.clip(np.floor((np.asarray(latitudes) + 90) / self.cell_size).astype(np.int64), 0, self.rows - 1)
+
+    def _column(self, longitudes):
+        return np.clip(np.floor((np.asarray(longitudes) + 180) / self.cell_size).astype(np.int64), 0, self.columns - 1)
+
+    def bbox(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """
+        Returns the stations inside a bounding box.
+
+        Parameters:
+        - south (float): The minimum latitude.
+        - west (float): The minimum longitude.
+        - north (float): The maximum latitude.
+        - east (float): The maximum longitude.
+
+        Returns:
+        - np.ndarray: The indexes of the stations, in ascending order.
+        """
+        if south > north or west > east or not len(self.order):
+            return np.empty(0, dtype=np.int64)
+
+        rows = np.arange(self._row(south), self._row(north) + 1)
+        starts = np.searchsorted(self.sorted_cells, rows * self.columns + self._column(west), side="left")
+        ends = np.searchsorted(self.sorted_cells, rows * self.columns + self._column(east), side="right")
+        candidates = np.concatenate([self.order[start:end] for start, end in zip(starts, ends)])
+
+        latitudes = self.latitudes[candidates]
+        longitudes = self.longitudes[candidates]
+        inside = (latitudes >= south) & (latitudes <= north) & (longitudes >= west) & (longitudes <= east)
+        return np.sort(candidates[inside])
+
+    def radius(self, latitude: float, longitude: float, radius_km: float) -> tuple:
+        """
+        Returns the stations within a distance of a point.
+
+        Parameters:
+        - latitude (float): The latitude of the point.
+        - longitude (float): The longitude of the point.
+        - radius_km (float): The distance in kilometers.
+
+        Returns:
+        - tuple: The indexes of the stations, in ascending order, and their distances in kilometers.
+        """
+        delta_latitude = radius_km / KM_PER_DEGREE
+        delta_longitude = delta_latitude / max(np.cos(np.radians(latitude)), 1e-6)
+        candidates = self.bbox(latitude - delta_latitude, longitude - delta_longitude,
+                               latitude + delta_latitude, longitude + delta_longitude)
+        distances = haversine(latitude, longitude, self.latitudes[candidates], self.longitudes[candidates])
+        inside = distances <= radius_km
+        return candidates[inside], distances[inside]
+
+    def nearest(self, latitude: float, longitude: float, k: int, max_radius_km: float = 1000.0) -> tuple:
+        """
+        Returns the k nearest stations of a point.
+
+        The search radius starts at the size of a cell and doubles until k stations are found.
+
+        Parameters:
+        - latitude (float): The latitude of the point.
+        - longitude (float): The longitude of the point.
+        - k (int): The number of stations.
+        - max_radius_km (float): The maximum search distance in kilometers.
+
+        Returns:
+        - tuple: The indexes of the stations, nearest first, and their distances in kilometers.
+        """
+        radius_km = self.cell_size * KM_PER_DEGREE
+        while True:
+            indexes, distances = self.radius(latitude, longitude, min(radius_km, max_radius_km))
+            if len(indexes) >= k or radius_km >= max_radius_km:
+                break
+            radius_km *= 2
+        order = np.argsort(distances, kind="stable")[:k]
+        return indexes[order], distances[order]
+
+    def cheapest(self, latitude: float, longitude: float, radius_km: float, prices: np.ndarray, k: int) -> tuple:
+        """
+        Returns the k cheapest stations within a distance of a point, the nearest first on equal prices.
+
+        Parameters:
+        - latitude (float): The latitude of the point.
+        - longitude (float): The longitude of the point.
+        - radius_km (float): The distance in kilometers.
+        - prices (np.ndarray): The price of every station, NaN when unknown.
+        - k (int): The number of stations.
+
+        Returns:
+        - tuple: The indexes of the stations, cheapest first, and their distances in kilometers.
+        """
+        indexes, distances = self.radius(latitude, longitude, radius_km)
+        station_prices = np.asarray(prices)[indexes]
+        known = ~np.isnan(station_prices)
+        indexes, distances, station_prices = indexes[known], distances[known], station_prices[known]
+        order = np.lexsort((distances, station_prices))[:k]
+        return indexes[order], distances[order]
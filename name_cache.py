@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import time
+
+
+DEFAULT_TTL = 30 * 24 * 3600  # Brands almost never change
+NEGATIVE_TTL = 24 * 3600  # Retry the stations without a name sooner
+
+
+class NameCache:
+    """
+    Persistent cache of gas station names, stored in a SQLite file.
+
+    Every entry has its own expiration time. Stations for which no name was found are cached too
+    (negative caching) with a shorter time to live, so they are not requested again on every run.
+
+    Attributes:
+    - path (str): The path of the SQLite file.
+    - ttl (int): Time to live in seconds of the entries holding a name.
+    - negative_ttl (int): Time to live in seconds of the entries without a name.
+
+    Methods:
+    - get_many(self, station_ids: list[int]): Returns the fresh cached entries of the stations.
+    - set_many(self, names: dict[int, str or None]): Store the names of the stations.
+    - close(self): Close the SQLite connection.
+    """
+
+    def __init__(self, path: str, ttl: int = DEFAULT_TTL, negative_ttl: int = NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS station_names ("
+            "id INTEGER PRIMARY KEY, name TEXT, fetched_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _select(self, station_ids: list, now: float) -> dict:
+        entries = {}
+        ids = list(station_ids)
+        # Stay below the SQLite limit of bound parameters
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT id, name FROM station_names WHERE expires_at > ? AND id IN ({placeholders})",
+                [now] + chunk,
+            )
+            entries.update(rows)
+        return entries
+
+    def get_many(self, station_ids: list) -> dict:
+        """
+        Returns the fresh cached entries of the stations.
+
+        Parameters:
+        - station_ids (list[int]): The IDs of the gas stations.
+
+        Returns:
+        - dict[int, str or None]: The names of the stations found in the cache, None for negative entries.
+        """
+        return self._select(station_ids, time.time())
+
+    def set_many(self, names: dict) -> None:
+        """
+        Store the names of the stations.
+
+        Parameters:
+        - names (dict[int, str or None]): The names of the stations, None if no name was found.
+        """
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO station_names (id, name, fetched_at, expires_at) VALUES (?, ?, ?, ?)",
+            [
+                (station_id, name, now, now + (self.ttl if name is not None else self.negative_ttl))
+                for station_id, name in names.items()
+            ],
+        )
+        self.connection.commit()
+
+    def close(self) -> None:
+        """
+        Close the SQLite connection.
+        """
+        self.connection.close()
@@ -0,0 +1,192 @@
+import asyncio
+import random
+import re
+import time
+import aiohttp
+from tqdm import tqdm
+
+
+NAME_URL = "https://www.prix-carburants.gouv.fr/map/recuperer_infos_pdv/{id}"
+NAME_PATTERN = re.compile(r'<strong>(.*?)</strong>', re.DOTALL)
+
+
+class FetchStats:
+    """
+    Counters of a NameFetcher.
+
+    Attributes:
+    - success (int): Number of stations whose page was retrieved, with or without a name.
+    - failure (int): Number of stations given up after the last retry or a non retryable error.
+    - retries (int): Number of requests sent again after a failure.
+    """
+
+    def __init__(self):
+        self.success = 0
+        self.failure = 0
+        self.retries = 0
+
+    def __str__(self):
+        return f"FetchStats(success={self.success}, failure={self.failure}, retries={self.retries})"
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter for coroutines.
+
+    Attributes:
+    - rate (float): Number of tokens added per second.
+    - capacity (float): Maximum number of tokens, i.e. the allowed burst.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Wait until a token is available and take it.
+        """
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class NameFetcher:
+    """
+    Retrieve gas station names concurrently with asyncio.
+
+    Requests are limited both in concurrency and in rate (token bucket). Timeouts, connection errors,
+    429 and 5xx responses are retried with exponential backoff; the stations still failing afterwards are
+    reported as failed instead of being mistaken for stations without a name.
+
+    Against a NameStubServer answering every request with a 503 error, each station is given up after its retries,
+    and once it answers again every name is retrieved, at most 20 requests per second after a burst of 20:
+
+    >>> from name_stub_server import BRANDS, NameStubServer
+    >>> server = NameStubServer(("127.0.0.1", 0), failure_rate=1.0, nameless_every=5, seed=1)
+    >>> _ = server.start()
+    >>> fetcher = NameFetcher(server.url, concurrency=4, rate=20, retries=2, backoff=0.01)
+    >>> names, failed = fetcher.fetch_names([1, 2, 3, 4, 5])
+    >>> print(fetcher.stats), names, sorted(failed), server.requests_count, server.failures_count
+    FetchStats(success=0, failure=5, retries=10)
+    (None, {}, [1, 2, 3, 4, 5], 15, 15)
+    >>> server.failure_rate, server.requests_count = 0.0, 0
+    >>> fetcher, start = NameFetcher(server.url, concurrency=4, rate=20, retries=2, backoff=0.01), time.monotonic()
+    >>> names, failed = fetcher.fetch_names(list(range(1, 41)))
+    >>> elapsed = time.monotonic() - start
+    >>> print(fetcher.stats), failed, [names[station_id] for station_id in (1, 2, 5, 9)]
+    FetchStats(success=40, failure=0, retries=0)
+    (None, [], ['Esso', 'Intermarché', None, 'TotalEnergies'])
+    >>> elapsed >= (server.requests_count - fetcher.rate) / fetcher.rate - 0.05
+    True
+
+    With 30% of failures, the stations are retrieved, retried or given up in any order, but every request is a
+    success, a retry or a failure, and every failure injected is retried or reported:
+
+    >>> server.failure_rate, server.requests_count, server.failures_count = 0.3, 0, 0
+    >>> fetcher = NameFetcher(server.url, concurrency=8, retries=2, backoff=0.01)
+    >>> names, failed = fetcher.fetch_names(list(range(1, 201)))
+    >>> len(names) + len(failed), fetcher.stats.success == len(names), fetcher.stats.failure == len(failed)
+    (200, True, True)
+    >>> all(name == (None if station_id % 5 == 0 else BRANDS[station_id % len(BRANDS)]) for station_id, name in names.items())
+    True
+    >>> server.requests_count == fetcher.stats.success + fetcher.stats.retries + fetcher.stats.failure
+    True
+    >>> server.failures_count == fetcher.stats.retries + fetcher.stats.failure > 0
+    True
+    >>> server.shutdown()
+
+    Attributes:
+    - url (str): The URL template of the name endpoint, with an {id} placeholder.
+    - concurrency (int): Maximum number of requests in flight.
+    - rate (float or None): Maximum number of requests per second, None for no limit.
+    - retries (int): Maximum number of retries per station.
+    - backoff (float): Delay in seconds before the first retry, doubled on each retry.
+    - timeout (float): Timeout in seconds of each request.
+    - stats (FetchStats): The success/failure/retry counters, accumulated over every call.
+
+    Methods:
+    - fetch_names(self, station_ids: list[int], progress: bool = False): Retrieve the names of the stations.
+    """
+
+    def __init__(self, url: str = NAME_URL, concurrency: int = 50, rate: float = None, retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 10.0):
+        self.url = url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.stats = FetchStats()
+
+    async def _fetch_one(self, session, semaphore, bucket, station_id):
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats.retries += 1
+                # Exponential backoff with jitter so that retries do not come back in bursts
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+            async with semaphore:
+                if bucket is not None:
+                    await bucket.acquire()
+                try:
+                    async with session.get(
+                        self.url.format(id=station_id),
+                        headers={"x-requested-with": "XMLHttpRequest"},
+                        timeout=aiohttp.ClientTimeout(total=self.timeout),
+                    ) as response:
+                        if response.status == 200:
+                            match = NAME_PATTERN.search(await response.text())
+                            self.stats.success += 1
+                            return station_id, True, match.group(1) if match else None
+                        if response.status != 429 and response.status < 500:
+                            break  # Not worth retrying
+                except (asyncio.TimeoutError, aiohttp.ClientError):
+                    pass
+
+        self.stats.failure += 1
+        return station_id, False, None
+
+    async def _fetch_many(self, station_ids, progress):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = TokenBucket(self.rate) if self.rate else None
+        names = {}
+        failed = []
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks = [self._fetch_one(session, semaphore, bucket, station_id) for station_id in station_ids]
+            with tqdm(total=len(tasks), disable=not progress) as pbar:
+                for task in asyncio.as_completed(tasks):
+                    station_id, found, name = await task
+                    if found:
+                        names[station_id] = name
+                    else:
+                        failed.append(station_id)
+                    pbar.update(1)
+        return names, failed
+
+    def fetch_names(self, station_ids: list, progress: bool = False) -> tuple:
+        """
+        Retrieve the names of the stations.
+
+        Parameters:
+        - station_ids (list[int]): The IDs of the gas stations.
+        - progress (bool): True to display a progress bar.
+
+        Returns:
+        - tuple: A dict of the retrieved names by station ID (None if the station has no name) and the list
+          of station IDs that could not be retrieved.
+        """
+        if not station_ids:
+            return {}, []
+        return asyncio.run(self._fetch_many(station_ids, progress))
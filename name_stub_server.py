@@ -0,0 +1,125 @@
+"""
+Local stub of the prix-carburants.gouv.fr station name endpoint, to run the ingestion without the live website.
+
+Usage:
+    python name_stub_server.py --port 8765 --failure-rate 0.1
+
+then run get_datas.py with --names-url "http://127.0.0.1:8765/map/recuperer_infos_pdv/{id}".
+"""
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+BRANDS = ["TotalEnergies", "Esso", "Intermarché", "Carrefour", "Leclerc", "Auchan", "Système U", "BP", "Avia"]
+
+
+class NameStubServer(ThreadingHTTPServer):
+    """
+    HTTP server answering like the station name endpoint, with injected failures.
+
+    Responses are deterministic for a given station ID: the brand is picked from BRANDS and the station
+    has no name when its ID is a multiple of `nameless_every`.
+
+    Attributes:
+    - failure_rate (float): Probability of answering a request with a 503 error.
+    - timeout_rate (float): Probability of answering a request only after `slow_delay` seconds.
+    - slow_delay (float): Delay in seconds of the slow responses.
+    - latency (float): Delay in seconds added to every response.
+    - nameless_every (int): Stations whose ID is a multiple of this value have no name, 0 to disable.
+    - requests_count (int): Number of requests received.
+    - failures_count (int): Number of failures injected.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, failure_rate=0.0, timeout_rate=0.0, slow_delay=30.0, latency=0.0, nameless_every=0, seed=0):
+        super().__init__(address, NameStubHandler)
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.slow_delay = slow_delay
+        self.latency = latency
+        self.nameless_every = nameless_every
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests_count = 0
+        self.failures_count = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/map/recuperer_infos_pdv/{{id}}"
+
+    def draw(self) -> float:
+        with self.lock:
+            self.requests_count += 1
+            return self.random.random()
+
+    def start(self) -> threading.Thread:
+        """
+        Serve in a background thread.
+
+        Returns:
+        - threading.Thread: The thread of the server.
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class NameStubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        prefix = "/map/recuperer_infos_pdv/"
+        if not self.path.startswith(prefix) or not self.path[len(prefix):].isdigit():
+            self.send_error(404)
+            return
+        station_id = int(self.path[len(prefix):])
+
+        draw = server.draw()
+        if server.latency:
+            time.sleep(server.latency)
+        if draw < server.failure_rate:
+            with server.lock:
+                server.failures_count += 1
+            self.send_error(503)
+            return
+        if draw < server.failure_rate + server.timeout_rate:
+            with server.lock:
+                server.failures_count += 1
+            time.sleep(server.slow_delay)
+
+        if server.nameless_every and station_id % server.nameless_every == 0:
+            body = "<div class=\"pdv\"></div>"
+        else:
+            body = f"<div class=\"pdv\"><strong>{BRANDS[station_id % len(BRANDS)]}</strong><br/>Station {station_id}</div>"
+
+        encoded = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub of the station name endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability of a 503 response")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Probability of a response slower than the client timeout")
+    parser.add_argument("--slow-delay", type=float, default=30.0, help="Delay in seconds of the slow responses")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay in seconds added to every response")
+    parser.add_argument("--nameless-every", type=int, default=0, help="Stations whose ID is a multiple of this value have no name")
+    args = parser.parse_args()
+
+    server = NameStubServer((args.host, args.port), args.failure_rate, args.timeout_rate, args.slow_delay,
+                            args.latency, args.nameless_every)
+    print(f"Serving {server.url}")
+    server.serve_forever()
@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+
+from data_store import METADATA_FILE, DataStore
+
+
+logger = logging.getLogger("carburenta.store_watcher")
+
+DEFAULT_INTERVAL = 5.0
+
+
+def scan_store(directory: str):
+    """
+    Returns the state of the partitions of a data store, to detect when it is written.
+
+    Parameters:
+    - directory (str): The root directory of the store.
+
+    Returns:
+    - tuple or None: The sorted (partition, metadata modification time) pairs, or None while a partition is
+      being written (its directory exists without a metadata file).
+    """
+    partitions = [directory]
+    if not os.path.exists(os.path.join(directory, METADATA_FILE)) and os.path.isdir(directory):
+        partitions = [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.isdigit()]
+
+    state = []
+    for partition in partitions:
+        try:
+            state.append((partition, os.stat(os.path.join(partition, METADATA_FILE)).st_mtime_ns))
+        except FileNotFoundError:
+            if os.path.isdir(partition):
+                return None
+    return tuple(state)
+
+
+class StoreWatcher:
+    """
+    Watch a data store from a background thread and reload it when it is written.
+
+    The new DataStore is opened and preloaded (partitions memory mapped, indexes built) in the background, then
+    handed to `on_reload`, which swaps it in. Callbacks already running keep the PriceCube they hold, so they
+    finish on the previous version. A store being written (a partition without its metadata file) is only
+    reloaded once complete, and a reload that fails is tried again on the next check.
+
+    Attributes:
+    - directory (str): The root directory of the store.
+    - on_reload (callable): Called with the new DataStore.
+    - interval (float): Seconds between two checks.
+    - max_partitions (int): Maximum number of partitions kept loaded by the new stores.
+    - state: The state of the store last loaded, see scan_store.
+    - reloads (int): Number of reloads.
+
+    Methods:
+    - pending(self): Returns the state of the store if it changed since the last reload, without reloading it.
+    - check(self): Reload the store if it changed since the last check.
+    - start(self): Start watching in a daemon thread.
+    - stop(self): Stop watching.
+    """
+
+    def __init__(self, directory: str, on_reload, interval: float = DEFAULT_INTERVAL, max_partitions: int = 2):
+        self.directory = directory
+        self.on_reload = on_reload
+        self.interval = interval
+        self.max_partitions = max_partitions
+        self.state = scan_store(directory)
+        self.reloads = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def pending(self):
+        """
+        Returns the state of the store if it changed since the last reload and is complete, without reloading it.
+
+        Returns:
+        - tuple or None: The new state (see scan_store), None if there is nothing to reload.
+        """
+        state = scan_store(self.directory)
+        return state if state is not None and state != self.state else None
+
+    def check(self) -> bool:
+        """
+        Reload the store if it changed since the last check.
+
+        Returns:
+        - bool: True if a new store was swapped in.
+        """
+        state = self.pending()
+        if state is None:
+            return False
+
+        try:
+            data_store = DataStore(self.directory, self.max_partitions)
+            if not len(data_store):
+                return False
+            data_store.preload()
+        except (OSError, ValueError) as error:
+            # Partly written files, try again on the next check
+            logger.warning("Reloading the data store failed: %s", error)
+            return False
+
+        self.on_reload(data_store)
+        self.state = state
+        self.reloads += 1
+        logger.info("Data store reloaded, partitions: %s", data_store.keys)
+        return True
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Unexpected error while watching the data store")
+
+    def start(self) -> None:
+        """
+        Start watching in a daemon thread.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="store-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop watching.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,24 @@
+"""
+WSGI entry point of the dashboard, to serve it with several worker processes.
+
+Usage:
+    gunicorn wsgi:server
+
+With the settings of gunicorn.conf.py, the app is imported once in the master process (preload_app) and the
+workers are forked from it. The price arrays of the store are memory mapped, so every worker reads the same page
+cache, and the partitions loaded here, with their indexes, are inherited copy-on-write instead of being loaded
+again by each worker. The workers never reload the store themselves: the master reloads it and forks new workers
+when it is written (see gunicorn.conf.py). Only the figure cache and the partitions of other years loaded on demand
+are per worker.
+"""
+import gc
+
+from main import app, data_store
+
+
+# Load the data before the workers are forked
+data_store.preload()
+# Keep the garbage collector of the workers from writing to the inherited objects, which would copy their pages
+gc.freeze()
+
+server = app.server